@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from api.cache import ResponseCacheKeyMixin, get_response_cache, is_cache_enabled
+from api.renderers import FastJSONRenderer
+
+
+class AsyncReadView(ResponseCacheKeyMixin, View):
+    """
+    Base class for async JSON read endpoints, served under ASGI without
+    tying up a worker thread while the database answers.
+
+    DRF views are sync, so these are plain Django views: the request is
+    wrapped in a DRF Request for query_params, authenticated with the
+    configured DRF authentication classes (their `aauthenticate` when they
+    have one) and `aget_data()` returns the data to render. DRF exceptions
+    become the same JSON error responses DRF sends. Views that return
+    namespaces from `get_cache_namespaces()` use the response cache with
+    the same keys, versions and TTL as CachedResponseMixin.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    requires_authentication = False
+    renderer_class = FastJSONRenderer
+
+    async def get(self, request, *args, **kwargs):
+        drf_request = Request(request)
+        try:
+            drf_request.user, drf_request.auth = await self.aauthenticate(drf_request)
+            if self.requires_authentication and not drf_request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            key = None
+            namespaces = self.get_cache_namespaces()
+            if namespaces and is_cache_enabled():
+                # the version lookup is a query, so it runs in a thread
+                key, payload = await sync_to_async(self.get_cached_payload)(drf_request, namespaces)
+                if payload is not None:
+                    return self.build_cached_response(payload, 'HIT')
+            data = await self.aget_data(drf_request, *args, **kwargs)
+        except Http404 as exc:
+            return self.error_response(exceptions.NotFound(*exc.args), drf_request)
+        except exceptions.APIException as exc:
+            return self.error_response(exc, drf_request)
+
+        payload = self.renderer_class().render(data)
+        if key is None:
+            return HttpResponse(payload, content_type='application/json')
+        await sync_to_async(get_response_cache().set)(key, payload)
+        return self.build_cached_response(payload, 'MISS')
+
+    def get_cached_payload(self, request, namespaces):
+        key = self.get_cache_key(request, namespaces)
+        return key, get_response_cache().get(key)
+
+    async def aget_data(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def aauthenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            authenticator = authentication_class()
+            if hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(request)
+            if result is not None:
+                return result
+        return AnonymousUser(), None
+
+    def error_response(self, exc, request):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = HttpResponse(
+            self.renderer_class().render(detail), content_type='application/json', status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            if self.authentication_classes:
+                response['WWW-Authenticate'] = self.authentication_classes[0]().authenticate_header(request)
+            else:
+                response.status_code = 403
+        return response
+
+
+async def aget_object_or_404(queryset, **filters):
+    """rest_framework.generics.get_object_or_404 with the async ORM."""
+    try:
+        return await queryset.aget(**filters)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    except (TypeError, ValueError, DjangoValidationError):
+        raise Http404
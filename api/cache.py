@@ -0,0 +1,272 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from api.models import ResponseCacheVersion
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL.
+
+    `max_size` bounds the sum of entry sizes; pass `size=len(payload)` to
+    make it a memory budget, or leave the default of 1 to bound the
+    number of entries.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=1, ttl=None):
+        if size > self.max_size:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'size': self._size,
+                'max_size': self.max_size,
+            }
+
+
+class LocalResponseCacheBackend:
+    """
+    Per-process LRU store for payloads, with namespace versions kept in
+    the ResponseCacheVersion table. An invalidation from any process, a web
+    worker or a management command, orphans the matching entries in every
+    worker, at the cost of one primary key lookup per cached request.
+    """
+    def __init__(self, ttl, max_bytes, **options):
+        self.entries = LRUCache(max_size=max_bytes, ttl=ttl)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, payload):
+        self.entries.set(key, payload, size=len(payload))
+
+    def get_versions(self, namespaces):
+        versions = dict(ResponseCacheVersion.objects.filter(
+            namespace__in=namespaces).values_list('namespace', 'version'))
+        return [versions.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespaces):
+        """Increment every namespace's version in one INSERT ... ON CONFLICT DO UPDATE."""
+        namespaces = sorted(set(namespaces))
+        if not namespaces:
+            return
+        meta = ResponseCacheVersion._meta
+        quote = connection.ops.quote_name
+        table = quote(meta.db_table)
+        namespace, version = (quote(meta.get_field(name).column) for name in ('namespace', 'version'))
+        sql = (
+            f'INSERT INTO {table} ({namespace}, {version}) '
+            f'VALUES {", ".join(["(%s, 1)"] * len(namespaces))} '
+            f'ON CONFLICT ({namespace}) DO UPDATE SET {version} = {table}.{version} + 1'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, namespaces)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class DjangoResponseCacheBackend:
+    """Stores payloads and version counters in a Django cache alias, so a
+    shared cache (e.g. Redis or Memcached) invalidates across workers."""
+    def __init__(self, ttl, max_bytes, alias='default', **options):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        payload = self.cache.get(f'response:{key}')
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def set(self, key, payload):
+        if len(payload) <= self.max_bytes:
+            self.cache.set(f'response:{key}', payload, self.ttl)
+
+    def get_versions(self, namespaces):
+        keys = [f'response-version:{namespace}' for namespace in namespaces]
+        found = self.cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, namespaces):
+        for namespace in namespaces:
+            key = f'response-version:{namespace}'
+            self.cache.add(key, 0, None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = {
+                    'BACKEND': 'api.cache.LocalResponseCacheBackend',
+                    'TTL': 60,
+                    'MAX_BYTES': 32 * 1024 * 1024,
+                    'OPTIONS': {},
+                    **getattr(settings, 'RESPONSE_CACHE', {}),
+                }
+                backend_class = import_string(config['BACKEND'])
+                _backend = backend_class(
+                    ttl=config['TTL'], max_bytes=config['MAX_BYTES'], **config['OPTIONS'])
+    return _backend
+
+
+def invalidate(*namespaces):
+    """Bump the version of each namespace once the current transaction
+    commits, orphaning every cached response that depended on it."""
+    transaction.on_commit(lambda: get_response_cache().bump(namespaces))
+
+
+def is_cache_enabled():
+    return getattr(settings, 'RESPONSE_CACHE', {}).get('ENABLED', True)
+
+
+class ResponseCacheKeyMixin:
+    """
+    Response cache keys, shared by CachedResponseMixin and the async read
+    views.
+
+    Entries are keyed on path, query string, auth class (anonymous, user
+    or staff) and the current version of every namespace returned by
+    `get_cache_namespaces()`, so bumping a namespace invalidates exactly
+    the responses built from it.
+    """
+    def get_cache_namespaces(self):
+        return []
+
+    def get_auth_class(self, request):
+        user = request.user
+        if user and user.is_staff:
+            return 'staff'
+        if user and user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+    def get_cache_key(self, request, namespaces):
+        cache = get_response_cache()
+        query = sorted(request.query_params.lists())
+        versions = cache.get_versions(namespaces)
+        raw = f'{request.path}|{query}|{self.get_auth_class(request)}|{list(zip(namespaces, versions))}'
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def build_cached_response(self, payload, status):
+        response = HttpResponse(payload, content_type='application/json')
+        response['X-Cache'] = status
+        return response
+
+
+class CachedResponseMixin(ResponseCacheKeyMixin):
+    """Serve `list`/`retrieve` from the response cache, see ResponseCacheKeyMixin."""
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not is_cache_enabled() or not isinstance(request.accepted_renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        # Versions are read before building the response: a write racing
+        # with us bumps past this key, so we can never pin stale data.
+        key = self.get_cache_key(request, self.get_cache_namespaces())
+        payload = cache.get(key)
+        if payload is not None:
+            return self.build_cached_response(payload, 'HIT')
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        payload = request.accepted_renderer.render(
+            response.data, request.accepted_media_type, self.get_renderer_context())
+        cache.set(key, payload)
+        return self.build_cached_response(payload, 'MISS')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,75 @@
+FIELDS_PARAM = 'fields'
+
+
+def get_requested_fields(request):
+    """
+    The field names asked for with `?fields=`, or None when the client
+    wants the full representation.
+    """
+    if request is None or FIELDS_PARAM not in request.query_params:
+        return None
+    names = set()
+    for value in request.query_params.getlist(FIELDS_PARAM):
+        names.update(name.strip() for name in value.split(',') if name.strip())
+    return names
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin that drops every field not requested through
+    `?fields=` from read responses. Only the top-level
+    serializer is pruned; nested serializers keep their own fields. Writes
+    keep every field, so `?fields=` can never drop submitted data.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        requested = get_requested_fields(request)
+        if requested is None:
+            return
+        for name in set(self.fields) - requested:
+            self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin that prunes the queryset to the requested fields, so
+    unrequested columns are deferred with only() and unrequested relations
+    are never joined or prefetched.
+
+    - `sparse_fieldset_always`: model fields every response needs, e.g. the
+      pk and cursor pagination keys
+    - `sparse_fieldset_sources`: serializer field -> model fields it reads;
+      fields not listed read the model field of the same name
+    - `sparse_fieldset_relations`: serializer field -> function adding its
+      select_related/prefetch_related to a queryset
+    """
+    sparse_fieldset_always = ['id']
+    sparse_fieldset_sources = {}
+    sparse_fieldset_relations = {}
+
+    def get_sparse_fields(self):
+        if self.request.method not in ('GET', 'HEAD') or self.action not in ('list', 'retrieve'):
+            return None
+        return get_requested_fields(self.request)
+
+    def apply_sparse_fieldset(self, queryset):
+        requested = self.get_sparse_fields()
+        if requested is None:
+            for relation in self.sparse_fieldset_relations.values():
+                queryset = relation(queryset)
+            return queryset
+
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = set(self.sparse_fieldset_always)
+        for name in requested:
+            sources = self.sparse_fieldset_sources.get(name, [name])
+            columns.update(source for source in sources if source in model_fields)
+        queryset = queryset.only(*columns)
+
+        for name, relation in self.sparse_fieldset_relations.items():
+            if name in requested:
+                queryset = relation(queryset)
+        return queryset
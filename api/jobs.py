@@ -0,0 +1,179 @@
+"""
+Database-backed background jobs.
+
+A job is a call of a function decorated with `@job`, stored as a Job row
+by `enqueue()` in the caller's transaction, so it only runs if that
+transaction commits. `manage.py run_jobs` claims due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, runs them in a thread pool and retries
+failures with exponential backoff.
+"""
+import contextlib
+import random
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.models import Job
+
+
+def job(shared=None):
+    """
+    Mark a function as runnable through the queue. It is called as
+    `func(payload)`, or `func(payload, resource)` when `shared` is given:
+    a factory returning a context manager whose value is opened once per
+    claimed batch and handed to every job of that function in it.
+    """
+    def decorator(func):
+        func.job_shared = shared
+        return func
+    return decorator
+
+
+def job_setting(name, default):
+    return getattr(settings, 'JOBS', {}).get(name, default)
+
+
+def enqueue(func, payload=None, delay=0, max_attempts=None):
+    """Queue `func(payload)`; `payload` must be JSON serialisable."""
+    if not hasattr(func, 'job_shared'):
+        raise ValueError(f'{func.__qualname__} is not decorated with @job')
+    return Job.objects.create(
+        name=f'{func.__module__}.{func.__qualname__}',
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or job_setting('MAX_ATTEMPTS', 5),
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`: doubling, capped, with jitter."""
+    base = job_setting('RETRY_BACKOFF', 30)
+    delay = min(base * 2 ** (attempts - 1), job_setting('RETRY_BACKOFF_MAX', 60 * 60))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(batch_size):
+    """
+    Lock up to `batch_size` due jobs with SKIP LOCKED, so concurrent
+    workers never claim the same row, mark them running and return them.
+    Running jobs whose worker died are claimed again after LOCK_TIMEOUT.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=job_setting('LOCK_TIMEOUT', 10 * 60))
+    with transaction.atomic():
+        due = Job.objects.filter(
+            Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+        ).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        jobs = list(due[:batch_size])
+        if jobs:
+            Job.objects.filter(pk__in=[item.pk for item in jobs]).update(
+                status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    for item in jobs:
+        item.attempts += 1
+    return jobs
+
+
+def run_batch(batch_size=50):
+    """Claim and run one batch of jobs, returning how many were claimed."""
+    jobs = claim(batch_size)
+    with contextlib.ExitStack() as stack:
+        resources = {}
+        for item in jobs:
+            try:
+                func = import_string(item.name)
+                shared = getattr(func, 'job_shared', None)
+                if shared is None:
+                    func(item.payload)
+                else:
+                    if item.name not in resources:
+                        resources[item.name] = stack.enter_context(shared())
+                    func(item.payload, resources[item.name])
+            except Exception:
+                failed(item, traceback.format_exc())
+            else:
+                item.delete()
+    return len(jobs)
+
+
+def failed(item, error):
+    if item.attempts < item.max_attempts:
+        Job.objects.filter(pk=item.pk).update(
+            status=Job.QUEUED, locked_at=None, last_error=error,
+            run_at=timezone.now() + timedelta(seconds=backoff(item.attempts)))
+    else:
+        Job.objects.filter(pk=item.pk).update(status=Job.FAILED, locked_at=None, last_error=error)
+
+
+def run_worker(threads=None, batch_size=50, interval=1, once=False):
+    """
+    Run batches in `threads` threads until the queue is empty (`once`) or
+    forever, each thread sleeping `interval` seconds whenever it finds no
+    due job. Returns the number of jobs claimed.
+    """
+    threads = threads or job_setting('WORKER_THREADS', 4)
+
+    def loop():
+        claimed = 0
+        try:
+            while True:
+                handled = run_batch(batch_size)
+                claimed += handled
+                if not handled:
+                    if once:
+                        return claimed
+                    time.sleep(interval)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+        futures = [pool.submit(loop) for _ in range(threads)]
+        return sum(future.result() for future in futures)
+
+
+# email backends open their connection on __enter__ and close it on __exit__
+@job(shared=mail.get_connection)
+def send_email(payload, backend):
+    """Send an email queued with queue_email over the batch's SMTP connection."""
+    message = mail.EmailMultiAlternatives(
+        subject=payload['subject'],
+        body=payload['body'],
+        from_email=payload['from_email'],
+        to=payload['to'],
+        cc=payload.get('cc'),
+        bcc=payload.get('bcc'),
+        reply_to=payload.get('reply_to'),
+        alternatives=[tuple(alternative) for alternative in payload.get('alternatives', [])],
+        connection=backend,
+    )
+    message.content_subtype = payload.get('content_subtype', 'plain')
+    message.send()
+
+
+def queue_email(message):
+    """Queue an EmailMessage; attachments are not supported."""
+    return enqueue(send_email, {
+        'subject': str(message.subject),
+        'body': str(message.body),
+        'from_email': message.from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'content_subtype': message.content_subtype,
+    })
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """django.core.mail.send_mail, sent by the job worker."""
+    return queue_email(mail.EmailMessage(subject, message, from_email, recipient_list))
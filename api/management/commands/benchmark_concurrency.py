@@ -0,0 +1,129 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class HTTPConnection:
+    """A minimal keep-alive HTTP/1.1 client, so the load generator itself never needs a thread per request."""
+
+    def __init__(self, host, port, headers):
+        self.host, self.port = host, port
+        self.headers = ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: application/json\r\n'
+            f'{self.headers}\r\n'.encode())
+        await self.writer.drain()
+
+        status_line, *header_lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readuntil(b'\r\n')
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return int(status_line.split()[1])
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Load running WSGI and ASGI servers with the same read endpoints at rising concurrency '
+        'and compare throughput and latency; the ASGI server gets the /api/v1/async/ variants'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', help='Base URL of a server running phul_bazar.wsgi:app')
+        parser.add_argument('--asgi-url', help='Base URL of a server running phul_bazar.asgi:application')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Endpoint below /api/v1/, repeatable (default: flowers/ and category/)')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 200])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per path and concurrency level')
+        parser.add_argument('--token', help='JWT access token, for cart and has_ordered paths')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        servers = [(name, options[f'{name}_url']) for name in ('wsgi', 'asgi') if options[f'{name}_url']]
+        if not servers:
+            raise CommandError('Give --wsgi-url, --asgi-url or both')
+        headers = {'Authorization': f"JWT {options['token']}"} if options['token'] else {}
+
+        for path in options['paths'] or ['flowers/', 'category/']:
+            path = path.lstrip('/')
+            for concurrency in options['concurrency']:
+                for name, url in servers:
+                    prefix = '/api/v1/async/' if name == 'asgi' else '/api/v1/'
+                    result = asyncio.run(self.run_level(
+                        url, prefix + path, headers, concurrency, options['requests'], options['timeout']))
+                    self.stdout.write(
+                        f'{name} {path} c={concurrency}: {result["rps"]:.0f} req/s, '
+                        f'p50 {result["p50"]:.1f} ms, p99 {result["p99"]:.1f} ms, errors {result["errors"]}')
+
+    async def run_level(self, base_url, path, headers, concurrency, total, timeout):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise CommandError(f'{base_url}: only plain http URLs are supported')
+        latencies, errors = [], 0
+        remaining = total
+
+        async def client():
+            nonlocal remaining, errors
+            connection = HTTPConnection(parts.hostname, parts.port or 80, headers)
+            try:
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    try:
+                        status = await asyncio.wait_for(connection.get(path), timeout)
+                    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                        errors += 1
+                        await connection.close()
+                        continue
+                    if status >= 400:
+                        errors += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                await connection.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'rps': total / elapsed,
+            'p50': self.percentile(latencies, 50),
+            'p99': self.percentile(latencies, 99),
+            'errors': errors,
+        }
+
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
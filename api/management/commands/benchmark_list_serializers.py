@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.renderers import FastJSONRenderer
+from flower.models import Flower
+from flower.serializers import FlowerSerializer, FlowerListReader
+from order.models import Order
+from order.serializers import OrderSerializer, OrderListReader
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-row cost of list pages built by ModelSerializer and by values() readers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get('/api/v1/'))
+        context = {'request': request}
+        cases = [
+            ('flowers', Flower.objects.prefetch_related('images__variants'), FlowerSerializer, FlowerListReader),
+            ('orders', Order.objects.select_related('user').prefetch_related('items__flower'), OrderSerializer, OrderListReader),
+        ]
+        for name, queryset, serializer_class, reader_class in cases:
+            queryset = queryset.order_by('pk')[:options['rows']]
+            reader = reader_class(context)
+
+            def serializer_page():
+                data = serializer_class(list(queryset.all()), many=True, context=context).data
+                return JSONRenderer().render(data)
+
+            def reader_page():
+                rows = list(reader.get_rows(queryset.model.objects.order_by('pk'))[:options['rows']])
+                return FastJSONRenderer().render(reader.to_representation(rows))
+
+            expected, actual = serializer_page(), reader_page()
+            count = queryset.count()
+            if not count:
+                self.stdout.write(f'{name}: no rows to benchmark')
+                continue
+
+            before = self.time_per_row(serializer_page, options['repeat'], count)
+            after = self.time_per_row(reader_page, options['repeat'], count)
+            self.stdout.write(
+                f'{name}: {count} rows, serializer {before:.1f} us/row, '
+                f'reader {after:.1f} us/row ({before / after:.1f}x)')
+            if expected != actual:
+                self.stdout.write(self.style.ERROR(f'{name}: reader output differs from the serializer'))
+
+    @staticmethod
+    def time_per_row(build_page, repeat, count):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            build_page()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best / count * 1_000_000
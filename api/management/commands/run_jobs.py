@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from api.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (emails and other slow side effects) in a thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Worker threads, JOBS["WORKER_THREADS"] by default')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds a thread sleeps when no job is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        claimed = run_worker(threads=options['threads'], batch_size=options['batch_size'],
+                             interval=options['interval'], once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {claimed} jobs'))
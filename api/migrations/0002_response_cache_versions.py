@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseCacheVersion',
+            fields=[
+                ('namespace', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
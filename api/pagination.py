@@ -0,0 +1,206 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Full precision on purpose: DjangoJSONEncoder drops microseconds,
+    # which would skip or repeat rows sharing the same millisecond.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+
+    Plain `?page=N` requests behave exactly like PageNumberPagination.
+    `?pagination=cursor` (or any request carrying a `cursor`) switches to
+    keyset mode: rows are ordered by a stable composite key such as
+    (`updated_at`, `id`) and each page is fetched with a `WHERE key > last`
+    predicate instead of `COUNT(*)` + `OFFSET`, so page N costs the same as
+    page 1.
+
+    `keyset_orderings` maps an `ordering` query value to the composite key
+    used for it; unknown or missing values fall back to
+    `default_keyset_ordering`.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    keyset_orderings = {}
+    default_keyset_ordering = None
+
+    def is_keyset_request(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.is_keyset_request(request)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_keyset_ordering(self, request):
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '')
+        ordering = ordering.split(',')[0].strip()
+        if ordering not in self.keyset_orderings:
+            ordering = self.default_keyset_ordering
+        return ordering, self.keyset_orderings[ordering]
+
+    def paginate_keyset(self, queryset, request, view=None):
+        return self.finish_keyset_page(list(self.keyset_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, fetching the page with the async ORM."""
+        self.keyset_mode = self.is_keyset_request(request)
+        if self.keyset_mode:
+            queryset = self.keyset_page_queryset(queryset, request)
+            return self.finish_keyset_page([row async for row in queryset])
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached_property; fill it without a sync query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def keyset_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_name, self.fields = self.get_keyset_ordering(request)
+        self.cursor = self.decode_cursor(request, queryset.model)
+
+        self.reverse = bool(self.cursor and self.cursor.get('r'))
+        order = [self._flip(field) for field in self.fields] if self.reverse else list(self.fields)
+
+        queryset = queryset.order_by(*order)
+        if self.cursor:
+            queryset = queryset.filter(self._after(order, self.cursor['v']))
+        return queryset[:self.page_size + 1]
+
+    def finish_keyset_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.next_position = None
+        self.previous_position = None
+        if rows:
+            if has_more or self.reverse:
+                self.next_position = self._position(rows[-1])
+            if (self.reverse and has_more) or (self.cursor and not self.reverse):
+                self.previous_position = self._position(rows[0])
+        return rows
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset_mode:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'o': self.ordering_name, 'v': position, 'r': int(reverse)})
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        """
+        The cursor in `request`, with its values converted by the ordering
+        fields of `model`; a tampered or stale cursor is a 404.
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            values = cursor['v']
+            if cursor.get('o') != self.ordering_name or not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError(cursor)
+            cursor['v'] = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, KeyError, AttributeError, ValidationError):
+            raise NotFound('Invalid cursor')
+        return cursor
+
+    def _position(self, obj):
+        # rows are model instances, or dicts for values() querysets
+        if isinstance(obj, dict):
+            return [_encode_value(obj[field.lstrip('-')]) for field in self.fields]
+        return [_encode_value(getattr(obj, field.lstrip('-'))) for field in self.fields]
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(order, values):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), per-column direction
+        condition = Q()
+        for index, field in enumerate(order):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(order[:index], values):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
@@ -0,0 +1,70 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from api.fieldsets import get_requested_fields
+
+_datetime_field = serializers.DateTimeField()
+
+
+def decimal_value(value):
+    """A DecimalField as JSONRenderer writes it (COERCE_DECIMAL_TO_STRING is off)."""
+    return None if value is None else float(value)
+
+
+def datetime_value(value):
+    return _datetime_field.to_representation(value)
+
+
+class ValuesReader:
+    """
+    Read-only list serializer building representations straight from
+    `values()` rows, skipping ModelSerializer's per-row field machinery.
+
+    A reader stands in for one serializer and must return exactly what it
+    would, key order included. `columns` are the `values()` columns of the
+    root rows; related rows are fetched per page in `to_representation`.
+    """
+    columns = []
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+
+    def get_rows(self, queryset):
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def to_representation(self, rows):
+        raise NotImplementedError
+
+    async def ato_representation(self, rows):
+        """to_representation for async views; override to fetch related rows with the async ORM."""
+        return await sync_to_async(self.to_representation)(rows)
+
+
+class ValuesReaderListMixin:
+    """
+    View mixin serving `list` through `values_reader_class` instead of the
+    serializer. Sparse fieldset requests, and every request when
+    FAST_LIST_SERIALIZERS is off, take the regular serializer path.
+    """
+    values_reader_class = None
+
+    def get_values_reader(self):
+        if self.values_reader_class is None or not getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            return None
+        if get_requested_fields(self.request) is not None:
+            return None
+        return self.values_reader_class(self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_values_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = reader.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.to_representation(page))
+        return Response(reader.to_representation(list(rows)))
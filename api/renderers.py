@@ -0,0 +1,39 @@
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes 1e16 / 1.5e-05 as `1e16` / `0.000015`, json as `1e+16` /
+# `1.5e-05`. Any match (strings included) re-renders with json.
+EXPONENT_RE = re.compile(rb'[0-9]e[-+0-9]')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+
+    Output is byte-identical to JSONRenderer: types orjson does not know
+    (Decimal, datetimes, lazy strings, ...) go through DRF's encoder, and
+    anything orjson would format differently (pretty printing, ASCII
+    escaping, exponent floats, out of range integers) falls back to json.
+    """
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT_RE.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
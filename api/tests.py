@@ -1,3 +1,147 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from api.cache import get_response_cache
+from api.jobs import enqueue, job, run_batch
+from api.models import Job
+from flower.models import Category, Flower
+from order.models import Cart, CartItem
+from order.services import OrderService
+from users.authentication import revocations, user_cache
+from users.models import User
+
+
+@job()
+def explode(payload):
+    raise RuntimeError(payload['message'])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class JobTests(TestCase):
+    def test_contact_emails_are_queued(self):
+        response = APIClient().post('/api/v1/contact/', {
+            'email': 'customer@example.com', 'phone_number': '01700000000', 'comment': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.count(), 2)
+
+        self.assertEqual(run_batch(), 2)
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        self.assertEqual(mail.outbox[1].body, 'customer@example.com send you message\n\nHello')
+        self.assertFalse(Job.objects.exists())
+
+    def test_activation_email_is_queued(self):
+        response = APIClient().post('/api/v1/auth/users/', {
+            'email': 'new@example.com', 'password': 'a-Long-pass-123', 'first_name': 'New', 'last_name': 'User'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(run_batch(), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        self.assertIn('activate/', mail.outbox[0].body)
+
+    def test_failures_back_off_then_fail(self):
+        queued = enqueue(explode, {'message': 'boom'}, max_attempts=2)
+
+        self.assertEqual(run_batch(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.QUEUED, 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('boom', queued.last_error)
+        # not due yet
+        self.assertEqual(run_batch(), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_batch(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+        self.assertEqual(run_batch(), 0)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        user_cache.clear()
+        revocations.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.category = Category.objects.create(name='Roses')
+        self.flowers = [
+            Flower.objects.create(name=f'Rose {number}', description='', price=number, stock=10, category=self.category)
+            for number in range(1, 8)
+        ]
+        self.client = APIClient()
+
+    def assertSameResponse(self, path):
+        sync = self.client.get(f'/api/v1/{path}', HTTP_ACCEPT='application/json')
+        response = self.client.get(f'/api/v1/async/{path}')
+        self.assertEqual(response.status_code, sync.status_code, path)
+        # pagination links point at the endpoint that was called
+        self.assertEqual(response.content.replace(b'/api/v1/async/', b'/api/v1/'), sync.content, path)
+
+    def test_flowers(self):
+        for path in ['flowers/', 'flowers/?page=2', 'flowers/?page=9', 'flowers/?price__gt=3&ordering=-price',
+                     'flowers/?pagination=cursor&ordering=price', 'flowers/?search=Rose 2', 'flowers/?facets=category',
+                     f'flowers/?category_id={self.category.id}', 'flowers/?category_id=0',
+                     f'flowers/{self.flowers[0].id}/', 'flowers/0/', 'category/']:
+            self.assertSameResponse(path)
+
+        cursor = self.client.get('/api/v1/async/flowers/?pagination=cursor&ordering=price').json()['next']
+        self.assertSameResponse(cursor.split('/api/v1/async/')[1])
+
+    def test_cart_and_has_ordered(self):
+        self.assertEqual(self.client.get('/api/v1/async/orders/has_ordered/').status_code, 401)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, flower=self.flowers[0], quantity=1)
+        OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, flower=self.flowers[1], quantity=2)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.user).access_token}')
+        ids = ','.join(str(flower.id) for flower in self.flowers[:3])
+        for path in [f'carts/{cart.id}/', 'carts/not-a-cart/', f'orders/has_ordered/{self.flowers[0].id}/',
+                     f'orders/has_ordered/?flower_ids={ids}', 'orders/has_ordered/?flower_ids=x']:
+            self.assertSameResponse(path)
+        self.assertEqual(self.client.get(f'/api/v1/async/orders/has_ordered/{self.flowers[0].id}/').json(),
+                         {'has_ordered': True})
+
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(other).access_token}')
+        self.assertSameResponse(f'carts/{cart.id}/')
+
+    def test_response_cache(self):
+        for path, namespace in [('flowers/', 'flowers'), (f'flowers/{self.flowers[0].id}/', f'flower:{self.flowers[0].id}'),
+                                ('category/', 'categories')]:
+            first = self.client.get(f'/api/v1/async/{path}')
+            # only the namespace versions are read on a hit
+            with self.assertNumQueries(1):
+                second = self.client.get(f'/api/v1/async/{path}')
+            self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'), path)
+            self.assertEqual(second.content, first.content, path)
+
+            get_response_cache().bump([namespace])
+            self.assertEqual(self.client.get(f'/api/v1/async/{path}')['X-Cache'], 'MISS', path)
+
+        self.assertNotIn('X-Cache', self.client.get('/api/v1/async/flowers/0/'))
+
+    def export(self, path, token):
+        return b''.join(self.client.get(path, HTTP_AUTHORIZATION=f'JWT {token}').streaming_content)
+
+    async def test_exports_stream_asynchronously_under_asgi(self):
+        # more rows than one batch pulled from the sync thread
+        await Flower.objects.abulk_create([
+            Flower(name=f'Tulip {number}', description='', price=1, stock=1, category=self.category)
+            for number in range(250)
+        ])
+        staff = await sync_to_async(User.objects.create_user)(
+            email='staff@example.com', password='pass12345', is_staff=True)
+        token = RefreshToken.for_user(staff).access_token
+        for path in ['/api/v1/catalog/export/?type=ndjson', '/api/v1/orders/export/?type=csv']:
+            response = await AsyncClient().get(path, headers={'Authorization': f'JWT {token}'})
+            self.assertEqual(response.status_code, 200, path)
+            self.assertTrue(response.is_async, path)
+            content = b''.join([part async for part in response.streaming_content])
+            self.assertEqual(content, await sync_to_async(self.export)(path, token), path)
@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework_nested import routers
-from flower.views import FlowerViewSet, CategoryViewSet, ReviewViewSet, FlowerImageViewSet
-from order.views import CartViewSet, CartItemViewSet, OrderViewSet, initiate_payment, payment_success, payment_cancel, payment_fail, HasOrderedProduct
-from users.views import ContactViewSet
+from flower.views import FlowerViewSet, CategoryViewSet, ReviewViewSet, FlowerImageViewSet, FlowerImageUploadViewSet, CatalogImportView, CatalogExportView
+from order.views import CartViewSet, CartItemViewSet, OrderViewSet, initiate_payment, payment_success, payment_cancel, payment_fail, HasOrderedProduct, SalesAnalyticsView
+from users.views import ContactViewSet, LogoutView
+from api.views import ResponseCacheStatsView
+from flower.async_views import FlowerListView, FlowerDetailView, CategoryListView
+from order.async_views import CartDetailView, HasOrderedView
 
 router = routers.DefaultRouter()
 router.register('flowers', FlowerViewSet, basename='flowers')
@@ -14,6 +17,7 @@ router.register('contact', ContactViewSet, basename='contact')
 flower_router = routers.NestedDefaultRouter(router, 'flowers', lookup = 'flower')
 flower_router.register('reviews', ReviewViewSet, basename='flower-review')
 flower_router.register('images', FlowerImageViewSet, basename='product-image')
+flower_router.register('uploads', FlowerImageUploadViewSet, basename='product-image-upload')
 
 cart_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 cart_router.register('items', CartItemViewSet, basename='cart-items')
@@ -24,9 +28,21 @@ urlpatterns = [
     path('', include(cart_router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
+    path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('payment/initiate/', initiate_payment, name="initiate-payment"),
     path('payment/success/', payment_success, name="payment-success"),
     path('payment/cancel/', payment_cancel, name="payment-cancel"),
     path('payment/fail/', payment_fail, name="payment-fail"),
-    path("orders/has_ordered/<int:flower_id>/", HasOrderedProduct.as_view())
+    path("orders/has_ordered/<int:flower_id>/", HasOrderedProduct.as_view()),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+    path('catalog/import/', CatalogImportView.as_view(), name='catalog-import'),
+    path('catalog/export/', CatalogExportView.as_view(), name='catalog-export'),
+    path('analytics/sales/', SalesAnalyticsView.as_view(), name='sales-analytics'),
+    # async versions of the hottest reads, for ASGI deployments
+    path('async/flowers/', FlowerListView.as_view(), name='async-flower-list'),
+    path('async/flowers/<int:pk>/', FlowerDetailView.as_view(), name='async-flower-detail'),
+    path('async/category/', CategoryListView.as_view(), name='async-category-list'),
+    path('async/carts/<str:pk>/', CartDetailView.as_view(), name='async-cart-detail'),
+    path('async/orders/has_ordered/', HasOrderedView.as_view(), name='async-has-ordered'),
+    path('async/orders/has_ordered/<int:flower_id>/', HasOrderedView.as_view(), name='async-has-ordered-flower'),
 ]
@@ -1,3 +1,14 @@
-from django.shortcuts import render
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from api.cache import get_response_cache
 
-# Create your views here.
+
+class ResponseCacheStatsView(APIView):
+    """
+    - Only admin can view response cache hit and miss counters
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_response_cache().stats())
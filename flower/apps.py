@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FlowerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flower'
+
+    def ready(self):
+        import flower.signals  # noqa: F401
@@ -0,0 +1,61 @@
+from asgiref.sync import sync_to_async
+from api.async_views import AsyncReadView, aget_object_or_404
+from flower.facets import get_facets
+from flower.serializers import CategorySerializer
+from flower.views import CategoryViewSet, FlowerViewSet
+
+
+class FlowerListView(AsyncReadView):
+    """
+    - Async version of GET `flowers/` with the same filters, search,
+      ordering, pagination, facets, output and response cache
+    """
+    def get_cache_namespaces(self):
+        return ['catalog', 'flowers']
+
+    async def aget_data(self, request):
+        view = FlowerViewSet(request=request, args=(), kwargs={}, action='list', format_kwarg=None)
+        # filters may query, e.g. search expands its terms and category_id
+        # validates the category, so filtering always runs in a thread
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+        reader = view.get_values_reader()
+        if reader is not None:
+            queryset = reader.get_rows(queryset)
+        rows = await view.paginator.apaginate_queryset(queryset, request, view)
+        if reader is not None:
+            results = await reader.ato_representation(rows)
+        else:
+            results = view.get_serializer(rows, many=True).data
+
+        data = view.paginator.get_paginated_response(results).data
+        if request.query_params.get('facets'):
+            facets = await sync_to_async(get_facets)(request, view.filtered_queryset)
+            if facets is not None:
+                data['facets'] = facets
+        return data
+
+
+class FlowerDetailView(AsyncReadView):
+    """
+    - Async version of GET `flowers/<id>/`
+    """
+    def get_cache_namespaces(self):
+        return ['catalog', f"flower:{self.kwargs.get('pk')}"]
+
+    async def aget_data(self, request, pk):
+        view = FlowerViewSet(request=request, args=(), kwargs={'pk': pk}, action='retrieve', format_kwarg=None)
+        flower = await aget_object_or_404(view.get_queryset(), pk=pk)
+        return view.get_serializer(flower).data
+
+
+class CategoryListView(AsyncReadView):
+    """
+    - Async version of GET `category/`
+    """
+    def get_cache_namespaces(self):
+        return ['catalog', 'categories']
+
+    async def aget_data(self, request):
+        categories = [category async for category in CategoryViewSet.queryset.all()]
+        return CategorySerializer(categories, many=True).data
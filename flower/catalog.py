@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import invalidate
+from flower.models import Category, Flower
+from flower.search import index_flowers
+from flower.serializers import CatalogRowSerializer
+
+CATALOG_FIELDS = ['name', 'category', 'description', 'price', 'stock']
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CatalogImporter:
+    """
+    Upserts flowers from parsed records in batches.
+
+    Categories are matched by name and flowers by (category, name), the
+    catalog's natural key. Each batch is validated, then written with one
+    bulk_create and one bulk_update inside its own transaction. Invalid rows
+    are reported by line number and skipped.
+    """
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def run(self, records):
+        for batch in batched(records, self.batch_size):
+            rows = self.validate(batch)
+            if rows:
+                self.write(rows)
+        invalidate('catalog', 'flowers', 'categories')
+        return self.report()
+
+    def report(self):
+        return {'created': self.created, 'updated': self.updated, 'errors': self.errors}
+
+    def validate(self, batch):
+        rows = {}
+        for line, record in batch:
+            if not isinstance(record, dict):
+                self.errors.append({'row': line, 'errors': {'non_field_errors': [str(record)]}})
+                continue
+            serializer = CatalogRowSerializer(data=record)
+            if not serializer.is_valid():
+                self.errors.append({'row': line, 'errors': serializer.errors})
+                continue
+            data = serializer.validated_data
+            # a later row for the same flower wins
+            rows[(data['category'], data['name'])] = data
+        return list(rows.values())
+
+    @transaction.atomic
+    def write(self, rows):
+        categories = self.resolve_categories({row['category'] for row in rows})
+        existing = {
+            (flower.category_id, flower.name): flower
+            for flower in Flower.objects.filter(
+                category_id__in=categories.values(),
+                name__in={row['name'] for row in rows},
+            ).only('id', 'name', 'category_id')
+        }
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for row in rows:
+            category_id = categories[row['category']]
+            flower = existing.get((category_id, row['name']))
+            if flower is None:
+                flower = Flower(name=row['name'], category_id=category_id)
+                to_create.append(flower)
+            else:
+                to_update.append(flower)
+            flower.description = row['description']
+            flower.price = row['price']
+            flower.stock = row['stock']
+            flower.updated_at = now
+
+        Flower.objects.bulk_create(to_create)
+        Flower.objects.bulk_update(to_update, ['description', 'price', 'stock', 'updated_at'])
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        index_flowers([flower.pk for flower in to_create + to_update])
+
+    def resolve_categories(self, names):
+        categories = {}
+        # names are not unique; the oldest category with a name wins
+        for category in Category.objects.filter(name__in=names).order_by('-id'):
+            categories[category.name] = category.id
+        missing = [Category(name=name) for name in names if name not in categories]
+        for category in Category.objects.bulk_create(missing):
+            categories[category.name] = category.id
+        return categories
+
+
+def export_catalog_rows(chunk_size=1000):
+    """Catalog rows in CATALOG_FIELDS order, read in bounded chunks."""
+    return Flower.objects.order_by('id').values_list(
+        'name', 'category__name', 'description', 'price', 'stock'
+    ).iterator(chunk_size=chunk_size)
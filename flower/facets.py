@@ -0,0 +1,102 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from api.cache import LRUCache, get_response_cache
+from flower.models import Flower
+
+FACETS = ('category', 'price', 'stock')
+DEFAULT_PRICE_BUCKETS = [Decimal(edge) for edge in (0, 100, 250, 500, 1000)]
+MAX_PRICE_BUCKETS = 20
+# Query parameters that change the page but not the matching set
+NON_FILTER_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'format', 'facets', 'price_buckets'}
+
+_facet_cache = LRUCache(max_size=1024, ttl=getattr(settings, 'FLOWER_FACETS_CACHE_TTL', 30))
+
+
+def parse_facets(value):
+    if value in ('true', '1', 'all'):
+        return list(FACETS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(names) - set(FACETS)
+    if unknown:
+        raise ValidationError({'facets': f"Unknown facet(s): {', '.join(sorted(unknown))}"})
+    return names
+
+
+def parse_price_buckets(value):
+    if not value:
+        return DEFAULT_PRICE_BUCKETS
+    try:
+        edges = sorted({Decimal(edge.strip()) for edge in value.split(',') if edge.strip()})
+    except InvalidOperation:
+        raise ValidationError({'price_buckets': 'Bucket edges must be numbers'})
+    if not edges or len(edges) > MAX_PRICE_BUCKETS:
+        raise ValidationError({'price_buckets': f'Give between 1 and {MAX_PRICE_BUCKETS} edges'})
+    return edges
+
+
+def get_cache_key(query_params, names, edges):
+    params = sorted(
+        (key, sorted(values)) for key, values in query_params.lists()
+        if key not in NON_FILTER_PARAMS
+    )
+    versions = get_response_cache().get_versions(['catalog', 'flowers'])
+    return f'{params}|{sorted(names)}|{edges}|{versions}'
+
+
+def compute_facets(queryset, names, edges):
+    """Count the filtered flowers per category, price bucket and stock state
+    with at most two grouped aggregate queries."""
+    matching = Flower.objects.filter(pk__in=queryset.order_by().values('pk'))
+    facets = {}
+
+    if 'category' in names:
+        facets['category'] = [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in matching.values('category_id', 'category__name')
+            .annotate(count=Count('id')).order_by('category_id')
+        ]
+
+    aggregates = {}
+    buckets = list(zip(edges, edges[1:] + [None]))
+    if 'price' in names:
+        for index, (low, high) in enumerate(buckets):
+            condition = Q(price__gte=low)
+            if high is not None:
+                condition &= Q(price__lt=high)
+            aggregates[f'price_{index}'] = Count('id', filter=condition)
+    if 'stock' in names:
+        aggregates['in_stock'] = Count('id', filter=Q(stock__gt=0))
+        aggregates['out_of_stock'] = Count('id', filter=Q(stock=0))
+
+    if aggregates:
+        counts = matching.aggregate(**aggregates)
+        if 'price' in names:
+            facets['price'] = [
+                {'min': low, 'max': high, 'count': counts[f'price_{index}']}
+                for index, (low, high) in enumerate(buckets)
+            ]
+        if 'stock' in names:
+            facets['stock'] = {'in_stock': counts['in_stock'], 'out_of_stock': counts['out_of_stock']}
+    return facets
+
+
+def get_facets(request, queryset):
+    """Facets for `?facets=` on the flower list, or None when not requested."""
+    value = request.query_params.get('facets')
+    if not value:
+        return None
+    names = parse_facets(value)
+    edges = parse_price_buckets(request.query_params.get('price_buckets'))
+
+    if _facet_cache.ttl <= 0:
+        return compute_facets(queryset, names, edges)
+    key = get_cache_key(request.query_params, names, edges)
+    facets = _facet_cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, names, edges)
+        _facet_cache.set(key, facets)
+    return facets
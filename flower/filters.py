@@ -1,5 +1,7 @@
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 from flower.models import Flower
+from flower.search import search_flowers
 
 class FlowerFilter(FilterSet):
     class Meta:
@@ -7,4 +9,15 @@ class FlowerFilter(FilterSet):
         fields = {
             'category_id': ['exact'],
             'price': ['gt', 'lt']
-        }
\ No newline at end of file
+        }
+
+class FlowerSearchFilter(SearchFilter):
+    """
+    `?search=` backed by the indexed search documents instead of `icontains`
+    scans. Results come back ranked unless `?ordering=` is given.
+    """
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_flowers(queryset, text)
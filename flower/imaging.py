@@ -0,0 +1,172 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from api.cache import invalidate
+from flower.models import FlowerImage, FlowerImageVariant
+
+logger = logging.getLogger(__name__)
+
+# Bounding box (longest side) per variant, largest first so each size is
+# resampled from the previous one instead of from the full original.
+VARIANT_SIZES = [
+    (FlowerImageVariant.DETAIL, 1200),
+    (FlowerImageVariant.CARD, 480),
+    (FlowerImageVariant.THUMB, 160),
+]
+FORMAT_OPTIONS = {
+    FlowerImageVariant.WEBP: ('WEBP', {'quality': 80, 'method': 4}),
+    FlowerImageVariant.JPEG: ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DOWNLOAD_TIMEOUT = 10
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class LocalVariantStorage:
+    """Writes variants under MEDIA_ROOT, served from MEDIA_URL; needs no network."""
+    def __init__(self, location=None, base_url=None):
+        self.storage = FileSystemStorage(
+            location=location or os.path.join(settings.MEDIA_ROOT, 'flowers', 'variants'),
+            base_url=base_url or f'{settings.MEDIA_URL}flowers/variants/',
+        )
+
+    def save(self, path, content):
+        if self.storage.exists(path):
+            self.storage.delete(path)
+        return self.storage.save(path, ContentFile(content))
+
+    def url(self, path):
+        return self.storage.url(path)
+
+
+class DefaultStorageVariantStorage:
+    """Stores variants through Django's configured default file storage."""
+    prefix = 'flowers/variants/'
+
+    def save(self, path, content):
+        return default_storage.save(f'{self.prefix}{path}', ContentFile(content))
+
+    def url(self, path):
+        return default_storage.url(path)
+
+
+_storage = None
+
+
+def get_variant_storage():
+    global _storage
+    if _storage is None:
+        backend = getattr(settings, 'FLOWER_IMAGE_VARIANT_STORAGE', 'flower.imaging.LocalVariantStorage')
+        _storage = import_string(backend)()
+    return _storage
+
+
+def render_variants(source):
+    """Yield (name, format, width, height, bytes) for every variant of the
+    image at `source` (a path or a binary file object)."""
+    with Image.open(source) as original:
+        # lets the JPEG decoder skip detail we are about to throw away
+        original.draft('RGB', (VARIANT_SIZES[0][1], VARIANT_SIZES[0][1]))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for name, bound in VARIANT_SIZES:
+            image = image.copy()
+            image.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+            for image_format, (pil_format, options) in FORMAT_OPTIONS.items():
+                frame = image.convert('RGB') if pil_format == 'JPEG' and image.mode != 'RGB' else image
+                buffer = io.BytesIO()
+                frame.save(buffer, pil_format, **options)
+                yield name, image_format, image.width, image.height, buffer.getvalue()
+
+
+def download_source(flower_image):
+    """Copy the original from its public URL into a temporary file."""
+    handle = tempfile.NamedTemporaryFile(suffix='.img', delete=False)
+    with handle, urlopen(flower_image.image.url, timeout=DOWNLOAD_TIMEOUT) as response:
+        shutil.copyfileobj(response, handle, COPY_BUFFER_SIZE)
+    return handle.name
+
+
+def generate_variants(image_id, source_path=None):
+    """Render, store and record every variant of one FlowerImage."""
+    flower_image = FlowerImage.objects.filter(pk=image_id).first()
+    if flower_image is None:
+        return []
+
+    downloaded = source_path is None
+    if downloaded:
+        source_path = download_source(flower_image)
+    try:
+        storage = get_variant_storage()
+        variants = []
+        for name, image_format, width, height, content in render_variants(source_path):
+            path = storage.save(f'{image_id}/{name}.{image_format}', content)
+            variants.append(FlowerImageVariant(
+                image_id=image_id, name=name, format=image_format,
+                width=width, height=height, size=len(content), path=path))
+    finally:
+        if downloaded:
+            os.remove(source_path)
+
+    FlowerImageVariant.objects.bulk_create(
+        variants,
+        update_conflicts=True,
+        unique_fields=['image', 'name', 'format'],
+        update_fields=['width', 'height', 'size', 'path'],
+    )
+    invalidate('flowers', f'flower:{flower_image.flower_id}')
+    return variants
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'FLOWER_IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants')
+    return _executor
+
+
+def _run_in_background(image_id, source_path, cleanup):
+    try:
+        generate_variants(image_id, source_path)
+    except Exception:
+        logger.exception('Could not generate variants for flower image %s', image_id)
+    finally:
+        if cleanup and source_path:
+            os.remove(source_path)
+        close_old_connections()
+
+
+def spool_upload(upload):
+    """Copy an uploaded file to a temporary path the background job can read
+    after the request is gone, without holding it in memory."""
+    handle = tempfile.NamedTemporaryFile(suffix='.img', delete=False)
+    with handle:
+        upload.seek(0)
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    upload.seek(0)
+    return handle.name
+
+
+def schedule_variants(image_id, source_path=None, cleanup=True):
+    """Generate variants off the request path once the transaction commits."""
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_background, image_id, source_path, cleanup))
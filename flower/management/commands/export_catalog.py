@@ -0,0 +1,25 @@
+import sys
+from django.core.management.base import BaseCommand
+from api.streaming import STREAM_WRITERS, guess_stream_format
+from flower.catalog import CATALOG_FIELDS, export_catalog_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream the flower catalog to a CSV or NDJSON file ("-" for stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=sorted(STREAM_WRITERS))
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_type = options['type'] or guess_stream_format(path)
+        chunks = STREAM_WRITERS[file_type](
+            CATALOG_FIELDS, export_catalog_rows(chunk_size=options['chunk_size']))
+
+        if path == '-':
+            sys.stdout.writelines(chunks)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
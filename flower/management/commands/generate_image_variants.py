@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from flower.imaging import generate_variants
+from flower.models import FlowerImage
+
+
+class Command(BaseCommand):
+    help = 'Render thumb/card/detail variants for flower images from their originals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate images that already have variants')
+
+    def handle(self, *args, **options):
+        images = FlowerImage.objects.order_by('id')
+        if not options['all']:
+            images = images.filter(variants__isnull=True)
+
+        done = failed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                generate_variants(image_id)
+                done += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'image {image_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} images, {failed} failed'))
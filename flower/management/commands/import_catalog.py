@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.streaming import STREAM_READERS, guess_stream_format
+from flower.catalog import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Upsert flowers and categories from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=sorted(STREAM_READERS))
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        file_type = options['type'] or guess_stream_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                report = CatalogImporter(batch_size=options['batch_size']).run(
+                    STREAM_READERS[file_type](lines))
+        except OSError as error:
+            raise CommandError(error)
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, "
+            f"rejected {len(report['errors'])} rows"))
@@ -0,0 +1,26 @@
+import os
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from flower.models import ImageUpload
+from flower.uploads import upload_path
+
+
+class Command(BaseCommand):
+    help = 'Delete unfinished image uploads (and their partial files) older than --hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ImageUpload.objects.exclude(status=ImageUpload.COMPLETE).filter(updated_at__lt=cutoff)
+        removed = 0
+        for upload in stale.iterator():
+            try:
+                os.remove(upload_path(upload))
+            except FileNotFoundError:
+                pass
+            upload.delete()
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} stale uploads'))
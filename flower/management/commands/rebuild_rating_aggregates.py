@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.cache import invalidate
+from flower.services import RatingService
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg and rating_count for every flower from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = RatingService.rebuild(batch_size=options['batch_size'])
+            invalidate('catalog')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} flowers'))
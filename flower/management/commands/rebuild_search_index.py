@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from flower.models import Flower
+from flower.search import index_flowers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the flower search documents and index in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Flower.objects.order_by('id').values_list('id', flat=True)
+        batch = []
+        total = 0
+        for flower_id in ids.iterator(chunk_size=batch_size):
+            batch.append(flower_id)
+            if len(batch) == batch_size:
+                index_flowers(batch)
+                total += len(batch)
+                batch = []
+        index_flowers(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} flowers'))
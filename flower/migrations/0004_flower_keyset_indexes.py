@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0003_alter_flowerimage_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['updated_at', 'id'], name='flower_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['price', 'id'], name='flower_price_id_idx'),
+        ),
+    ]
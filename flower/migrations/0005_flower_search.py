@@ -0,0 +1,114 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:44
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+from flower.search import FIELD_WEIGHTS, tokenize
+
+
+POSTGRES_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS flower_search_vector_gin '
+    'ON flower_flowersearchdocument USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS flower_search_name_trgm '
+    'ON flower_flowersearchdocument USING gin (name gin_trgm_ops)',
+]
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in POSTGRES_INDEXES:
+        schema_editor.execute(statement)
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS flower_search_vector_gin')
+    schema_editor.execute('DROP INDEX IF EXISTS flower_search_name_trgm')
+
+
+def backfill(apps, schema_editor):
+    # mirrors flower.search.index_flowers with the historical models
+    Flower = apps.get_model('flower', 'Flower')
+    FlowerSearchDocument = apps.get_model('flower', 'FlowerSearchDocument')
+    FlowerSearchTerm = apps.get_model('flower', 'FlowerSearchTerm')
+    backend = getattr(settings, 'FLOWER_SEARCH_BACKEND', None)
+    if backend is None:
+        backend = 'postgres' if schema_editor.connection.vendor == 'postgresql' else 'inverted_index'
+
+    flowers = Flower.objects.select_related('category').order_by('id').only(
+        'id', 'name', 'description', 'category__name')
+    batch = []
+    for flower in flowers.iterator(chunk_size=500):
+        batch.append(FlowerSearchDocument(
+            flower_id=flower.id, name=flower.name,
+            category_name=flower.category.name, description=flower.description))
+        if len(batch) == 500:
+            index_documents(backend, FlowerSearchDocument, FlowerSearchTerm, batch)
+            batch = []
+    index_documents(backend, FlowerSearchDocument, FlowerSearchTerm, batch)
+
+
+def index_documents(backend, FlowerSearchDocument, FlowerSearchTerm, documents):
+    if not documents:
+        return
+    FlowerSearchDocument.objects.bulk_create(documents)
+    if backend == 'postgres':
+        FlowerSearchDocument.objects.filter(
+            flower_id__in=[document.flower_id for document in documents]
+        ).update(search_vector=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector('category_name', weight='B', config='english')
+            + SearchVector('description', weight='C', config='english')
+        ))
+        return
+    rows = []
+    for document in documents:
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(getattr(document, field)):
+                weights[term] = weights.get(term, 0) + weight
+        rows.extend(
+            FlowerSearchTerm(term=term, flower_id=document.flower_id, weight=weight)
+            for term, weight in weights.items()
+        )
+    FlowerSearchTerm.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0004_flower_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowerSearchDocument',
+            fields=[
+                ('flower', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='flower.flower')),
+                ('name', models.CharField(max_length=100)),
+                ('category_name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlowerSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('flower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='flower.flower')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'flower'], name='flower_search_term_idx')],
+            },
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
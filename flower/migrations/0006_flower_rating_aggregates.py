@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:46
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Flower = apps.get_model('flower', 'Flower')
+    Review = apps.get_model('flower', 'Review')
+    totals = Review.objects.values('flower_id').annotate(count=Count('id'), total=Sum('ratings'))
+    flowers = [
+        Flower(
+            id=row['flower_id'], rating_count=row['count'], rating_sum=row['total'],
+            rating_avg=(Decimal(row['total']) / row['count']).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP))
+        for row in totals
+    ]
+    Flower.objects.bulk_update(flowers, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0005_flower_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flower',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['rating_avg', 'id'], name='flower_rating_avg_id_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
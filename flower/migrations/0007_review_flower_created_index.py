@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0006_flower_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['flower', 'created_at', 'id'], name='review_flower_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0007_review_flower_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowerImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('thumb', 'Thumbnail'), ('card', 'Card'), ('detail', 'Detail')], max_length=10)),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='flower.flowerimage')),
+            ],
+            options={
+                'unique_together': {('image', 'name', 'format')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0009_flower_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageupload',
+            name='status',
+            field=models.CharField(choices=[('in_progress', 'In progress'), ('finalizing', 'Finalizing'), ('complete', 'Complete')], default='in_progress', max_length=20),
+        ),
+    ]
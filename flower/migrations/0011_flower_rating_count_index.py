@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0010_image_upload_finalizing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['rating_count', 'id'], name='flower_rating_count_id_idx'),
+        ),
+    ]
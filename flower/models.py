@@ -1,8 +1,10 @@
 from django.db import models
+from uuid import uuid4
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from flower.validators import validate_file_size
 from cloudinary.models import CloudinaryField
+from django.contrib.postgres.search import SearchVectorField
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -19,6 +21,18 @@ class Flower(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='flowers')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained incrementally from Review writes, see flower.services.RatingService
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='flower_updated_at_id_idx'),
+            models.Index(fields=['price', 'id'], name='flower_price_id_idx'),
+            models.Index(fields=['rating_avg', 'id'], name='flower_rating_avg_id_idx'),
+            models.Index(fields=['rating_count', 'id'], name='flower_rating_count_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,6 +41,63 @@ class FlowerImage(models.Model):
     flower = models.ForeignKey(
         Flower, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('image')
+    # sha256 of the original bytes, used to de-duplicate resumable uploads
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+class ImageUpload(models.Model):
+    """A resumable, chunked upload that becomes a FlowerImage on finalize."""
+    IN_PROGRESS = 'in_progress'
+    FINALIZING = 'finalizing'
+    COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (IN_PROGRESS, 'In progress'),
+        (FINALIZING, 'Finalizing'),
+        (COMPLETE, 'Complete'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    flower = models.ForeignKey(Flower, on_delete=models.CASCADE, related_name='uploads')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=IN_PROGRESS)
+    image = models.ForeignKey(FlowerImage, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.total_size})"
+
+class FlowerImageVariant(models.Model):
+    """A resized rendition of a FlowerImage, see flower.imaging."""
+    THUMB = 'thumb'
+    CARD = 'card'
+    DETAIL = 'detail'
+    NAME_CHOICES = [
+        (THUMB, 'Thumbnail'),
+        (CARD, 'Card'),
+        (DETAIL, 'Detail'),
+    ]
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    FORMAT_CHOICES = [
+        (WEBP, 'WebP'),
+        (JPEG, 'JPEG'),
+    ]
+    image = models.ForeignKey(FlowerImage, on_delete=models.CASCADE, related_name='variants')
+    name = models.CharField(max_length=10, choices=NAME_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    path = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [['image', 'name', 'format']]
+
+    def __str__(self):
+        return f"{self.name} {self.format} of image {self.image_id}"
     
 class Review(models.Model):
     flower = models.ForeignKey(Flower, on_delete=models.CASCADE)
@@ -37,5 +108,31 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['flower', 'created_at', 'id'], name='review_flower_created_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user.first_name} on {self.flower.name}"
+
+class FlowerSearchDocument(models.Model):
+    """Denormalised text that the catalog search runs against."""
+    flower = models.OneToOneField(
+        Flower, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=100)
+    category_name = models.CharField(max_length=100)
+    description = models.TextField()
+    # Only populated on PostgreSQL, where it carries a GIN index.
+    search_vector = SearchVectorField(null=True)
+
+class FlowerSearchTerm(models.Model):
+    """Inverted index rows used by the search backend on non-PostgreSQL databases."""
+    term = models.CharField(max_length=64)
+    flower = models.ForeignKey(Flower, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'flower'], name='flower_search_term_idx'),
+        ]
@@ -1,4 +1,29 @@
-from rest_framework.pagination import PageNumberPagination
+from api.pagination import KeysetPagination
 
-class DefaultPagination(PageNumberPagination):
-    page_size = 5
\ No newline at end of file
+class DefaultPagination(KeysetPagination):
+    page_size = 5
+    keyset_orderings = {
+        'updated_at': ('updated_at', 'id'),
+        '-updated_at': ('-updated_at', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'rating_avg': ('rating_avg', 'id'),
+        '-rating_avg': ('-rating_avg', '-id'),
+        'rating_count': ('rating_count', 'id'),
+        '-rating_count': ('-rating_count', '-id'),
+    }
+    default_keyset_ordering = '-updated_at'
+
+
+class ReviewCursorPagination(KeysetPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    keyset_orderings = {
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+    }
+    default_keyset_ordering = '-created_at'
+
+    def is_keyset_request(self, request):
+        return True
@@ -0,0 +1,194 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Max, Q, Sum, Value, When
+
+from flower.models import Flower, FlowerSearchDocument, FlowerSearchTerm
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'this', 'to', 'with',
+}
+# (suffix, replacement), tried longest first
+SUFFIXES = [
+    ('ational', 'ate'), ('fulness', 'ful'), ('ousness', 'ous'), ('iveness', 'ive'),
+    ('ement', ''), ('ments', ''), ('ment', ''), ('ness', ''), ('ings', ''),
+    ('ing', ''), ('edly', ''), ('ies', 'y'), ('ied', 'y'), ('ers', ''), ('er', ''),
+    ('ed', ''), ('ly', ''), ('s', ''),
+]
+FIELD_WEIGHTS = {'name': 1.0, 'category_name': 0.4, 'description': 0.1}
+TRIGRAM_THRESHOLD = 0.3
+
+
+def stem(word):
+    """A light suffix-stripping stemmer; indexing and querying share it, so
+    "roses" and "rose" land on the same term."""
+    if word.endswith('ss'):
+        return word
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text):
+    return [
+        stem(word)[:64] for word in TOKEN_RE.findall((text or '').lower())
+        if word not in STOP_WORDS
+    ]
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_similarity(first, second):
+    a, b = trigrams(first), trigrams(second)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def build_documents(flower_ids):
+    flowers = Flower.objects.filter(pk__in=flower_ids).select_related('category').only(
+        'id', 'name', 'description', 'category__name')
+    documents = [
+        FlowerSearchDocument(
+            flower_id=flower.id,
+            name=flower.name,
+            category_name=flower.category.name,
+            description=flower.description,
+        )
+        for flower in flowers
+    ]
+    FlowerSearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['flower'],
+        update_fields=['name', 'category_name', 'description'],
+    )
+    return documents
+
+
+class PostgresSearchBackend:
+    """Full-text search on a GIN-indexed tsvector, with pg_trgm word
+    similarity on the name as a typo fallback."""
+    config = 'english'
+
+    def index(self, documents):
+        FlowerSearchDocument.objects.filter(
+            flower_id__in=[document.flower_id for document in documents]
+        ).update(search_vector=(
+            SearchVector('name', weight='A', config=self.config)
+            + SearchVector('category_name', weight='B', config=self.config)
+            + SearchVector('description', weight='C', config=self.config)
+        ))
+
+    def search(self, queryset, text):
+        query = SearchQuery(text, config=self.config, search_type='websearch')
+        return queryset.filter(
+            Q(search_document__search_vector=query)
+            | Q(search_document__name__trigram_word_similar=text)
+        ).annotate(
+            search_rank=SearchRank(F('search_document__search_vector'), query)
+            + TrigramWordSimilarity(text, 'search_document__name')
+        ).order_by('-search_rank', 'id')
+
+
+class InvertedIndexSearchBackend:
+    """Pure-Python inverted index kept in `FlowerSearchTerm`.
+
+    Every query term is looked up through the (term, flower) index, never
+    through the flower rows themselves. Terms missing from the vocabulary
+    are expanded to trigram-similar terms sharing their first letter.
+    """
+
+    def index(self, documents):
+        FlowerSearchTerm.objects.filter(
+            flower_id__in=[document.flower_id for document in documents]).delete()
+        rows = []
+        for document in documents:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(getattr(document, field)):
+                    weights[term] = weights.get(term, 0) + weight
+            rows.extend(
+                FlowerSearchTerm(term=term, flower_id=document.flower_id, weight=weight)
+                for term, weight in weights.items()
+            )
+        FlowerSearchTerm.objects.bulk_create(rows, batch_size=500)
+
+    def expand(self, token):
+        """Return {term: score factor} for one query token."""
+        if FlowerSearchTerm.objects.filter(term=token).exists():
+            return {token: 1.0}
+        candidates = FlowerSearchTerm.objects.filter(
+            term__startswith=token[0]).values_list('term', flat=True).distinct()
+        expansions = {}
+        for term in candidates:
+            similarity = trigram_similarity(token, term)
+            if similarity >= TRIGRAM_THRESHOLD:
+                expansions[term] = similarity
+        return expansions
+
+    def search(self, queryset, text):
+        tokens = list(dict.fromkeys(tokenize(text)))
+        if not tokens:
+            return queryset.none()
+        expansions = [self.expand(token) for token in tokens]
+        if not all(expansions):
+            return queryset.none()
+
+        factors = {}
+        for expansion in expansions:
+            for term, factor in expansion.items():
+                factors[term] = max(factor, factors.get(term, 0))
+
+        rank = Sum(Case(
+            *[When(search_terms__term=term, then=F('search_terms__weight') * Value(factor))
+              for term, factor in factors.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+        # 1 per query token that at least one of its expansions matched
+        matched = sum(
+            Max(Case(
+                When(search_terms__term__in=list(expansion), then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            for expansion in expansions
+        )
+        return queryset.filter(
+            search_terms__term__in=list(factors)
+        ).annotate(
+            search_rank=rank, search_matched=matched
+        ).filter(search_matched=len(tokens)).order_by('-search_rank', 'id')
+
+
+BACKENDS = {
+    'postgres': PostgresSearchBackend,
+    'inverted_index': InvertedIndexSearchBackend,
+}
+
+
+def get_search_backend():
+    name = getattr(settings, 'FLOWER_SEARCH_BACKEND', None)
+    if name is None:
+        name = 'postgres' if connection.vendor == 'postgresql' else 'inverted_index'
+    return BACKENDS[name]()
+
+
+def index_flowers(flower_ids):
+    flower_ids = list(flower_ids)
+    if not flower_ids:
+        return
+    with transaction.atomic():
+        documents = build_documents(flower_ids)
+        get_search_backend().index(documents)
+
+
+def search_flowers(queryset, text):
+    return get_search_backend().search(queryset, text)
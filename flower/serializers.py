@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from flower.models import Flower, Category, Review, FlowerImage
+from flower.models import Flower, Category, Review, FlowerImage, FlowerImageVariant, ImageUpload
+from flower.validators import validate_size
+from django.core.exceptions import ValidationError as DjangoValidationError
+from flower.imaging import get_variant_storage
+from api.fieldsets import SparseFieldsMixin
+from api.readers import ValuesReader, decimal_value
 from decimal import Decimal
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth import get_user_model
@@ -12,29 +17,171 @@ class CategorySerializer(serializers.ModelSerializer):
     flower_count = serializers.IntegerField(
         read_only=True, help_text="Return the number product in this category")
     
+def variant_url(variant, request=None):
+    url = get_variant_storage().url(variant.path)
+    return request.build_absolute_uri(url) if request else url
+
+def build_srcset(variants, request=None):
+    """{format: "url 160w, url 480w, ..."} from an image's variants"""
+    srcset = {}
+    for variant in sorted(variants, key=lambda variant: variant.width):
+        srcset.setdefault(variant.format, []).append(f"{variant_url(variant, request)} {variant.width}w")
+    return {image_format: ', '.join(entries) for image_format, entries in srcset.items()}
+
+def select_thumbnail(image, variants, request=None):
+    for variant in variants:
+        if variant.name == FlowerImageVariant.THUMB and variant.format == FlowerImageVariant.JPEG:
+            return variant_url(variant, request)
+    return image.url if image else None
+
+def thumbnail_url(flower_image, request=None):
+    return select_thumbnail(flower_image.image, flower_image.variants.all(), request)
+
+def image_url(image, request=None):
+    """What serializers.ImageField returns for a stored image"""
+    if not image:
+        return None
+    try:
+        url = image.url
+    except AttributeError:
+        return None
+    return request.build_absolute_uri(url) if request is not None else url
+
+def price_with_tax(price):
+    return round(price * Decimal(1.1), 2)
+
 class FlowerImageSerializer(serializers.ModelSerializer):
     image = serializers.ImageField()
+    srcset = serializers.SerializerMethodField(method_name='get_srcset')
     class Meta:
         model = FlowerImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'srcset']
+
+    def get_srcset(self, flower_image):
+        return build_srcset(flower_image.variants.all(), self.context.get('request'))
 
-class FlowerSerializer(serializers.ModelSerializer):
+class ImageUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'flower', 'filename', 'total_size', 'received', 'status', 'image']
+        read_only_fields = ['flower', 'received', 'status', 'image']
+
+    def validate_total_size(self, total_size):
+        if total_size <= 0:
+            raise serializers.ValidationError("Size must be positive")
+        try:
+            validate_size(total_size)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return total_size
+
+class FlowerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = FlowerImageSerializer(many=True, read_only=True)
     class Meta:
         model = Flower
-        fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'price_with_tax', 'images']
+        fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'price_with_tax', 'images', 'rating_avg', 'rating_count', 'thumbnail', 'srcset']
+        read_only_fields = ['rating_avg', 'rating_count']
 
     price_with_tax = serializers.SerializerMethodField(
         method_name='calculate_tax')
+    thumbnail = serializers.SerializerMethodField(method_name='get_thumbnail')
+    srcset = serializers.SerializerMethodField(method_name='get_srcset')
+
+    def get_cover_image(self, product):
+        images = product.images.all()
+        return images[0] if images else None
+
+    def get_thumbnail(self, product):
+        cover = self.get_cover_image(product)
+        return thumbnail_url(cover, self.context.get('request')) if cover else None
+
+    def get_srcset(self, product):
+        cover = self.get_cover_image(product)
+        return build_srcset(cover.variants.all(), self.context.get('request')) if cover else {}
 
     def calculate_tax(self, product):
-        return round(product.price * Decimal(1.1), 2)
+        return price_with_tax(product.price)
 
     def validate_price(self, price):
         if price < 0:
             raise serializers.ValidationError("Price could not be negative")
         return price
     
+class FlowerListReader(ValuesReader):
+    """FlowerSerializer output for list pages, built from values() rows"""
+    columns = ['id', 'name', 'description', 'price', 'stock', 'category', 'rating_avg', 'rating_count', 'updated_at']
+
+    def image_rows(self, flower_ids):
+        return FlowerImage.objects.filter(flower_id__in=flower_ids).order_by('pk').values('id', 'flower_id', 'image')
+
+    def variant_rows(self, images):
+        return FlowerImageVariant.objects.filter(
+            image_id__in=[image['id'] for image in images]
+        ).order_by('pk').values_list('image_id', 'name', 'format', 'width', 'path', named=True)
+
+    def get_images(self, flower_ids):
+        images = list(self.image_rows(flower_ids))
+        return self.group_images(images, list(self.variant_rows(images)) if images else [])
+
+    async def aget_images(self, flower_ids):
+        images = [image async for image in self.image_rows(flower_ids)]
+        variants = [variant async for variant in self.variant_rows(images)] if images else []
+        return self.group_images(images, variants)
+
+    def group_images(self, images, variant_rows):
+        variants = {}
+        for variant in variant_rows:
+            variants.setdefault(variant.image_id, []).append(variant)
+
+        by_flower = {}
+        for image in images:
+            image_variants = variants.get(image['id'], [])
+            by_flower.setdefault(image['flower_id'], []).append((image, image_variants, {
+                'id': image['id'],
+                'image': image_url(image['image'], self.request),
+                'srcset': build_srcset(image_variants, self.request),
+            }))
+        return by_flower
+
+    def to_representation(self, rows):
+        return self.build(rows, self.get_images([row['id'] for row in rows]))
+
+    async def ato_representation(self, rows):
+        return self.build(rows, await self.aget_images([row['id'] for row in rows]))
+
+    def build(self, rows, images):
+        data = []
+        for row in rows:
+            flower_images = images.get(row['id'], [])
+            if flower_images:
+                cover, cover_variants, cover_data = flower_images[0]
+                thumbnail = select_thumbnail(cover['image'], cover_variants, self.request)
+                srcset = cover_data['srcset']
+            else:
+                thumbnail, srcset = None, {}
+            data.append({
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'price': decimal_value(row['price']),
+                'stock': row['stock'],
+                'category': row['category'],
+                'price_with_tax': decimal_value(price_with_tax(row['price'])),
+                'images': [image_data for _, _, image_data in flower_images],
+                'rating_avg': decimal_value(row['rating_avg']),
+                'rating_count': row['rating_count'],
+                'thumbnail': thumbnail,
+                'srcset': srcset,
+            })
+        return data
+
+class CatalogRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    category = serializers.CharField(max_length=100)
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal(0))
+    stock = serializers.IntegerField(min_value=0)
+
 class SimpleUserSerializer(serializers.ModelSerializer):
     name = serializers.SerializerMethodField(
         method_name='get_current_user_name')
@@ -47,15 +194,12 @@ class SimpleUserSerializer(serializers.ModelSerializer):
         return obj.get_full_name()
     
 class ReviewSerializer(serializers.ModelSerializer):
-    user = serializers.SerializerMethodField(method_name='get_user')
+    user = SimpleUserSerializer(read_only=True)
     class Meta:
         model = Review
         fields = ['id', 'flower', 'user', 'ratings', 'comment']
         read_only_fields = ['user', 'flower']
 
-    def get_user(self, obj):
-        return SimpleUserSerializer(obj.user).data
-
     def create(self, validated_data):
         flower_id = self.context.get('flower_id')
         
@@ -66,4 +210,11 @@ class ReviewSerializer(serializers.ModelSerializer):
         except Flower.DoesNotExist:
             raise ValidationError({"flower_id": f"Flower with ID {flower_id} does not exist."})
 
-        return Review.objects.create(flower=flower, **validated_data)
\ No newline at end of file
+        return Review.objects.create(flower=flower, **validated_data)
+
+class ReviewSummarySerializer(serializers.Serializer):
+    flower_id = serializers.IntegerField()
+    count = serializers.IntegerField()
+    average = serializers.DecimalField(max_digits=3, decimal_places=2, allow_null=True)
+    histogram = serializers.DictField(child=serializers.IntegerField())
+    latest = ReviewSerializer(many=True)
@@ -0,0 +1,61 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from flower.models import Flower, Review
+
+
+class RatingService:
+    @staticmethod
+    def apply_delta(flower_id, count_delta, sum_delta):
+        """Shift a flower's rating aggregates in a single UPDATE; the new
+        average is computed by the database from the same row."""
+        rating_count = F('rating_count') + count_delta
+        rating_sum = F('rating_sum') + sum_delta
+        rating_avg = Coalesce(
+            ExpressionWrapper(
+                Cast(rating_sum, FloatField()) / NullIf(rating_count, Value(0)),
+                output_field=FloatField()),
+            Value(0.0))
+        Flower.objects.filter(pk=flower_id).update(
+            rating_count=rating_count, rating_sum=rating_sum, rating_avg=rating_avg)
+
+    @staticmethod
+    def review_created(review):
+        RatingService.apply_delta(review.flower_id, 1, review.ratings)
+
+    @staticmethod
+    def review_updated(review, old_flower_id, old_ratings):
+        if old_flower_id == review.flower_id and old_ratings == review.ratings:
+            return
+        if old_flower_id == review.flower_id:
+            RatingService.apply_delta(review.flower_id, 0, review.ratings - old_ratings)
+            return
+        RatingService.apply_delta(old_flower_id, -1, -old_ratings)
+        RatingService.apply_delta(review.flower_id, 1, review.ratings)
+
+    @staticmethod
+    def review_deleted(review):
+        RatingService.apply_delta(review.flower_id, -1, -review.ratings)
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """Recompute every flower's aggregates from scratch in batches."""
+        Flower.objects.exclude(pk__in=Review.objects.values('flower_id')).exclude(
+            rating_count=0).update(rating_count=0, rating_sum=0, rating_avg=0)
+
+        totals = Review.objects.values('flower_id').annotate(
+            count=Count('id'), total=Sum('ratings')).order_by('flower_id')
+        batch = []
+        updated = 0
+        for row in totals.iterator(chunk_size=batch_size):
+            average = (Decimal(row['total']) / row['count']).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP)
+            batch.append(Flower(
+                id=row['flower_id'], rating_count=row['count'],
+                rating_sum=row['total'], rating_avg=average))
+            if len(batch) == batch_size:
+                Flower.objects.bulk_update(batch, ['rating_count', 'rating_sum', 'rating_avg'])
+                updated += len(batch)
+                batch = []
+        Flower.objects.bulk_update(batch, ['rating_count', 'rating_sum', 'rating_avg'])
+        return updated + len(batch)
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from flower.models import Flower, Category, FlowerImage, Review
+from flower.search import index_flowers
+from flower.services import RatingService
+from api.cache import invalidate
+
+
+@receiver(post_save, sender=Flower)
+def index_saved_flower(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_flowers([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_flowers(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        index_flowers(instance.flowers.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Flower)
+def invalidate_flower_cache(sender, instance, **kwargs):
+    # categories embed a flower count
+    invalidate('flowers', f'flower:{instance.pk}', 'categories')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    # flower lists depend on category names through search and facets
+    invalidate('categories', 'flowers')
+
+
+@receiver([post_save, post_delete], sender=FlowerImage)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_flower_children_cache(sender, instance, **kwargs):
+    invalidate('flowers', f'flower:{instance.flower_id}')
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._rating_snapshot = (instance.flower_id, instance.ratings)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        RatingService.review_created(instance)
+    else:
+        old_flower_id, old_ratings = instance._rating_snapshot
+        RatingService.review_updated(instance, old_flower_id, old_ratings)
+    instance._rating_snapshot = (instance.flower_id, instance.ratings)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    RatingService.review_deleted(instance)
@@ -1,3 +1,661 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import LocalResponseCacheBackend, get_response_cache
+from flower import imaging
+from flower.facets import _facet_cache
+from flower.models import Category, Flower, FlowerImage, FlowerImageVariant, ImageUpload, Review
+from flower.paginations import DefaultPagination
+from flower.services import RatingService
+from flower.uploads import ChunkConflict, UploadService
+from flower.views import FlowerViewSet
+from users.models import User
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        get_response_cache().clear()
+        self.category = Category.objects.create(name='Roses')
+        self.client = APIClient()
+
+    def make_flower(self, name, price=10, stock=10, category=None, description=''):
+        return Flower.objects.create(
+            name=name, description=description, price=price, stock=stock, category=category or self.category)
+
+    def walk(self, url):
+        """Follow `next` links from `url`, returning every page."""
+        pages = []
+        while url:
+            page = self.client.get(url).json()
+            pages.append(page)
+            url = page['next']
+        return pages
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def test_cursor_pages_cover_equal_sort_keys_once(self):
+        # two full pages and a bit sharing one price, so page boundaries fall inside ties
+        flowers = [self.make_flower(f'Rose {index}', price=7) for index in range(12)]
+        cheap = self.make_flower('Daisy', price=3)
+
+        pages = self.walk('/api/v1/flowers/?pagination=cursor&ordering=price')
+        ids = [row['id'] for page in pages for row in page['results']]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(ids, [cheap.id] + [flower.id for flower in flowers])
+        self.assertNotIn('count', pages[0])
+
+        descending = self.walk('/api/v1/flowers/?pagination=cursor&ordering=-price')
+        ids = [row['id'] for page in descending for row in page['results']]
+        self.assertEqual(ids, [flower.id for flower in reversed(flowers)] + [cheap.id])
+
+    def test_every_ordering_field_has_a_keyset(self):
+        flowers = [self.make_flower(f'Rose {index}') for index in range(7)]
+        for index, flower in enumerate(flowers):
+            Flower.objects.filter(pk=flower.pk).update(rating_count=index % 3)
+        expected = sorted(flowers, key=lambda flower: (-(flowers.index(flower) % 3), -flower.id))
+
+        pages = self.walk('/api/v1/flowers/?pagination=cursor&ordering=-rating_count')
+        self.assertEqual([row['id'] for page in pages for row in page['results']], [flower.id for flower in expected])
+        self.assertTrue(all(f'-{field}' in DefaultPagination.keyset_orderings for field in FlowerViewSet.ordering_fields))
+
+    def test_previous_link_returns_the_same_page(self):
+        for index in range(8):
+            self.make_flower(f'Rose {index}', price=index % 2)
+        first = self.client.get('/api/v1/flowers/?pagination=cursor&ordering=price').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+        self.assertIsNone(first['previous'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/v1/flowers/?cursor=bogus').status_code, 404)
+        for ordering, cursor in [('-updated_at', {'o': '-updated_at', 'v': 5}),
+                                 ('-price', {'o': '-price', 'v': ['abc', 1]}),
+                                 ('-price', {'o': '-price', 'v': [1, {'id': 1}]}),
+                                 ('price', {'o': '-price', 'v': [1, 1]}),
+                                 ('price', ['price'])]:
+            token = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            response = self.client.get('/api/v1/flowers/', {'ordering': ordering, 'cursor': token})
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_page_numbers_still_work(self):
+        for index in range(6):
+            self.make_flower(f'Rose {index}')
+        page = self.client.get('/api/v1/flowers/?page=2').json()
+        self.assertEqual((page['count'], len(page['results'])), (6, 1))
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Garden')
+
+    def search(self, text):
+        return [row['name'] for row in self.client.get('/api/v1/flowers/', {'search': text}).json()['results']]
+
+    def test_ranked_stemmed_and_typo_tolerant(self):
+        self.make_flower('Red Rose', description='A classic')
+        self.make_flower('Tulip', description='Pairs well with roses')
+        self.make_flower('Lily')
+
+        # a name match outranks a description match
+        self.assertEqual(self.search('roses'), ['Red Rose', 'Tulip'])
+        self.assertEqual(self.search('tulpi'), ['Tulip'])
+        self.assertEqual(self.search('red roses'), ['Red Rose'])
+        self.assertEqual(self.search('orchid'), [])
+
+    def test_index_follows_renames(self):
+        flower = self.make_flower('Lily')
+        self.assertEqual(self.search('gardens'), ['Lily'])
+        self.category.name = 'Orchids'
+        self.category.save()
+        self.assertEqual(self.search('orchid'), ['Lily'])
+        self.assertEqual(self.search('garden'), [])
+
+        flower.name = 'Lotus'
+        flower.save()
+        self.assertEqual(self.search('lotus'), ['Lotus'])
+        self.assertEqual(self.search('lily'), [])
+
+
+class ResponseCacheTests(CatalogTestCase):
+    def get(self, url):
+        response = self.client.get(url)
+        return response['X-Cache'], response.json()
+
+    def test_writes_invalidate_list_and_detail(self):
+        flower = self.make_flower('Rose', price=10)
+        detail = f'/api/v1/flowers/{flower.id}/'
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'MISS')
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'HIT')
+        self.assertEqual(self.get(detail)[0], 'MISS')
+        self.assertEqual(self.get('/api/v1/category/')[0], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flower.price = 12
+            flower.save()
+        status, page = self.get('/api/v1/flowers/')
+        self.assertEqual((status, page['results'][0]['price']), ('MISS', 12.0))
+        status, data = self.get(detail)
+        self.assertEqual((status, data['price']), ('MISS', 12.0))
+        # the category count embeds flowers too
+        self.assertEqual(self.get('/api/v1/category/')[0], 'MISS')
+
+    def test_category_rename_invalidates_flower_search(self):
+        self.make_flower('Rose', category=Category.objects.create(name='Garden'))
+        url = '/api/v1/flowers/?search=meadow'
+        self.assertEqual(self.get(url), ('MISS', {'count': 0, 'next': None, 'previous': None, 'results': []}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.get(name='Garden')
+            category.name = 'Meadow'
+            category.save()
+        status, page = self.get(url)
+        self.assertEqual((status, [row['name'] for row in page['results']]), ('MISS', ['Rose']))
+
+    def test_other_processes_invalidate(self):
+        self.make_flower('Rose')
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'MISS')
+        # a second backend stands in for another worker or a management command
+        LocalResponseCacheBackend(ttl=60, max_bytes=1024).bump(['flowers'])
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'MISS')
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_rating_aggregates', stdout=io.StringIO())
+        self.assertEqual(self.get('/api/v1/flowers/')[0], 'MISS')
+
+
+class RatingAggregateTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rose, self.tulip = self.make_flower('Rose'), self.make_flower('Tulip')
+        self.users = [
+            User.objects.create_user(email=f'reviewer{index}@example.com', password='pass12345')
+            for index in range(3)
+        ]
+
+    def review(self, flower, user, ratings):
+        return Review.objects.create(flower=flower, user=user, ratings=ratings, comment='')
+
+    def assertRating(self, flower, count, total, average):
+        flower.refresh_from_db()
+        self.assertEqual((flower.rating_count, flower.rating_sum, flower.rating_avg),
+                         (count, total, Decimal(average)))
+
+    def test_deltas_on_create_update_and_delete(self):
+        first = self.review(self.rose, self.users[0], 5)
+        second = self.review(self.rose, self.users[1], 2)
+        self.assertRating(self.rose, 2, 7, '3.50')
+
+        second.ratings = 4
+        second.save()
+        self.assertRating(self.rose, 2, 9, '4.50')
+
+        # moving a review to another flower shifts both
+        second = Review.objects.get(pk=second.pk)
+        second.flower = self.tulip
+        second.save()
+        self.assertRating(self.rose, 1, 5, '5.00')
+        self.assertRating(self.tulip, 1, 4, '4.00')
+
+        first.delete()
+        self.assertRating(self.rose, 0, 0, '0.00')
+
+    def test_rebuild_matches_reviews(self):
+        self.review(self.rose, self.users[0], 5)
+        self.review(self.rose, self.users[1], 4)
+        self.review(self.rose, self.users[2], 4)
+        self.review(self.tulip, self.users[0], 1)
+        Flower.objects.update(rating_count=9, rating_sum=9, rating_avg=1)
+
+        self.assertEqual(RatingService.rebuild(batch_size=1), 2)
+        self.assertRating(self.rose, 3, 13, '4.33')
+        self.assertRating(self.tulip, 1, 1, '1.00')
+
+    def test_ordering_by_rating(self):
+        self.review(self.rose, self.users[0], 2)
+        self.review(self.tulip, self.users[0], 5)
+        names = [row['name'] for row in self.client.get('/api/v1/flowers/?ordering=-rating_avg').json()['results']]
+        self.assertEqual(names, ['Tulip', 'Rose'])
+
+
+class ReviewListTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rose = self.make_flower('Rose')
+        for index in range(7):
+            user = User.objects.create_user(email=f'reviewer{index}@example.com', password='pass12345')
+            Review.objects.create(flower=self.rose, user=user, ratings=index % 5 + 1, comment=f'Review {index}')
+        self.url = f'/api/v1/flowers/{self.rose.id}/reviews/'
+
+    def test_cursor_pages_newest_first_across_ties(self):
+        Review.objects.filter(comment__in=['Review 2', 'Review 3', 'Review 4']).update(
+            created_at=Review.objects.get(comment='Review 3').created_at)
+        pages = self.walk(f'{self.url}?page_size=2')
+        ids = [row['id'] for page in pages for row in page['results']]
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        with self.assertNumQueries(1):
+            small = self.client.get(f'{self.url}?page_size=2').json()
+        with self.assertNumQueries(1):
+            full = self.client.get(f'{self.url}?page_size=7').json()
+        self.assertEqual((len(small['results']), len(full['results'])), (2, 7))
+        self.assertEqual(full['results'][0]['user']['id'], Review.objects.latest('created_at', 'id').user_id)
+
+    def test_summary(self):
+        summary = self.client.get(f'{self.url}summary/?latest=3').json()
+        self.assertEqual(summary['count'], 7)
+        self.assertEqual(summary['histogram'], {'1': 2, '2': 2, '3': 1, '4': 1, '5': 1})
+        self.assertEqual(summary['average'], 2.57)
+        self.assertEqual([row['comment'] for row in summary['latest']], ['Review 6', 'Review 5', 'Review 4'])
+
+    def test_missing_flower(self):
+        self.assertEqual(self.client.get('/api/v1/flowers/0/reviews/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/flowers/0/reviews/summary/').status_code, 404)
+
+
+class FacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        _facet_cache.clear()
+        self.tulips = Category.objects.create(name='Tulips')
+        self.make_flower('Rose', price=50)
+        self.make_flower('Red Rose', price=150, stock=0)
+        self.make_flower('White Tulip', price=300, category=self.tulips)
+        self.make_flower('Yellow Tulip', price=1200, category=self.tulips)
+
+    def facets(self, **params):
+        return self.client.get('/api/v1/flowers/', params).json()['facets']
+
+    def test_counts_follow_the_filter(self):
+        facets = self.facets(facets='all')
+        self.assertEqual(
+            [(row['name'], row['count']) for row in facets['category']], [('Roses', 2), ('Tulips', 2)])
+        self.assertEqual([row['count'] for row in facets['price']], [1, 1, 1, 0, 1])
+        self.assertEqual(facets['stock'], {'in_stock': 3, 'out_of_stock': 1})
+
+        facets = self.facets(facets='category,stock', price__gt=100)
+        self.assertEqual(
+            [(row['name'], row['count']) for row in facets['category']], [('Roses', 1), ('Tulips', 2)])
+        self.assertEqual(facets['stock'], {'in_stock': 2, 'out_of_stock': 1})
+        self.assertNotIn('price', facets)
+
+        facets = self.facets(facets='price', search='tulip', price_buckets='0,1000')
+        self.assertEqual([(row['min'], row['count']) for row in facets['price']], [(0, 1), (1000, 1)])
+
+    def test_facets_cost_two_queries(self):
+        self.client.get('/api/v1/flowers/')
+        get_response_cache().clear()
+        # versions, count, page and images for the list, then the facet cache
+        # key's versions, one grouped and one aggregate query
+        with self.assertNumQueries(7):
+            self.client.get('/api/v1/flowers/', {'facets': 'all'})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/v1/flowers/', {'facets': 'colour'}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/v1/flowers/', {'facets': 'price', 'price_buckets': 'a,b'}).status_code, 400)
+
+
+class CatalogImportExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(self.staff)
+
+    def import_file(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(f"/api/v1/catalog/import/?{urlencode(params)}", {'file': upload}, format='multipart')
+
+    def export(self, file_type):
+        response = self.client.get('/api/v1/catalog/export/', {'type': file_type})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_import_upserts_and_reports_bad_rows(self):
+        rose = self.make_flower('Red Rose', price=5, description='Old')
+        response = self.import_file('catalog.csv', (
+            'name,category,description,price,stock\n'
+            'Red Rose,Roses,Fresh,12.50,4\n'
+            'Tulip,Tulips,Dutch,3,10\n'
+            'Lily,Lilies,White,-1,2\n'
+            'Tulip,Tulips,Dutch tulip,3.5,8\n'
+        ))
+        report = response.json()
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in report['errors']], [4])
+        self.assertIn('price', report['errors'][0]['errors'])
+
+        rose.refresh_from_db()
+        self.assertEqual((rose.description, rose.price, rose.stock), ('Fresh', Decimal('12.50'), 4))
+        tulip = Flower.objects.get(name='Tulip')
+        self.assertEqual((tulip.category.name, tulip.price, tulip.stock), ('Tulips', Decimal('3.50'), 8))
+        self.assertFalse(Flower.objects.filter(name='Lily').exists())
+        # imported rows are searchable straight away
+        self.assertEqual(self.client.get('/api/v1/flowers/', {'search': 'dutch'}).json()['count'], 1)
+
+    def test_ndjson_import_and_round_trip(self):
+        response = self.import_file('catalog', (
+            '{"name": "Tulip", "category": "Tulips", "description": "Dutch", "price": "3", "stock": 10}\n'
+            '\n'
+            'not json\n'
+        ), type='ndjson')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [3])
+
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual(rows, [{'name': 'Tulip', 'category': 'Tulips', 'description': 'Dutch', 'price': '3.00', 'stock': 10}])
+
+        exported = self.export('csv')
+        Flower.objects.all().delete()
+        self.assertEqual(self.import_file('again.csv', exported).json()['created'], 1)
+        self.assertEqual(self.export('csv'), exported)
+
+    def test_commands(self):
+        self.make_flower('Rose', price=9, description='Red')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.ndjson')
+            call_command('export_catalog', path, chunk_size=1)
+            Flower.objects.update(price=1)
+            call_command('import_catalog', path, stdout=io.StringIO())
+        self.assertEqual(Flower.objects.get().price, Decimal('9.00'))
+
+    def test_only_staff(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/v1/catalog/export/').status_code, 401)
+
+
+def make_image_bytes(size=(1600, 800), image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 60)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name, FLOWER_UPLOAD_DIR=self.media.name))
+        imaging._storage = None
+        self.addCleanup(setattr, imaging, '_storage', None)
+        self.rose = self.make_flower('Rose')
+
+    def test_variants_are_bounded_and_recorded(self):
+        flower_image = FlowerImage.objects.create(flower=self.rose, image='flowers/rose')
+        source = os.path.join(self.media.name, 'rose.jpg')
+        with open(source, 'wb') as output:
+            output.write(make_image_bytes())
+
+        imaging.generate_variants(flower_image.id, source)
+        sizes = {
+            (variant.name, variant.format): (variant.width, variant.height)
+            for variant in flower_image.variants.all()
+        }
+        self.assertEqual(sizes, {
+            (name, image_format): (bound, bound // 2)
+            for name, bound in imaging.VARIANT_SIZES
+            for image_format in (FlowerImageVariant.WEBP, FlowerImageVariant.JPEG)
+        })
+        for variant in flower_image.variants.all():
+            self.assertTrue(imaging.get_variant_storage().storage.exists(variant.path))
+
+        # running again replaces rows instead of adding new ones
+        imaging.generate_variants(flower_image.id, source)
+        self.assertEqual(flower_image.variants.count(), 6)
+
+        response = self.client.get(f'/api/v1/flowers/{self.rose.id}/').json()
+        self.assertTrue(response['thumbnail'].endswith(f'{flower_image.id}/thumb.jpeg'))
+
+    def test_spooled_file_is_removed_when_the_save_rolls_back(self):
+        staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(staff)
+        spooled = []
+
+        def spool(upload):
+            spooled.append(imaging.spool_upload(upload))
+            return spooled[-1]
+
+        upload = SimpleUploadedFile('rose.jpg', make_image_bytes(), content_type='image/jpeg')
+        with mock.patch('flower.views.spool_upload', spool), \
+                mock.patch('cloudinary.uploader.upload_resource', side_effect=OSError('storage is down')), \
+                self.assertRaises(OSError), transaction.atomic():
+            # the savepoint stands in for autocommit, which the test case's transaction replaces
+            self.client.post(f'/api/v1/flowers/{self.rose.id}/images/', {'image': upload}, format='multipart')
+        self.assertEqual(len(spooled), 1)
+        self.assertFalse(os.path.exists(spooled[0]))
+        self.assertFalse(FlowerImage.objects.exists())
+
+
+    def test_upload_runs_outside_a_transaction(self):
+        staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(staff)
+        outer = len(connection.atomic_blocks)
+        depths = []
+
+        def upload(file, **options):
+            depths.append(len(connection.atomic_blocks))
+            return CloudinaryResource('flowers/rose', format='jpg', version=1, type='upload', resource_type='image')
+
+        upload_file = SimpleUploadedFile('rose.jpg', make_image_bytes(), content_type='image/jpeg')
+        with mock.patch('cloudinary.uploader.upload_resource', side_effect=upload), \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                f'/api/v1/flowers/{self.rose.id}/images/', {'image': upload_file}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        # the test case's own transactions only
+        self.assertEqual(depths, [outer])
+        self.assertEqual(len(callbacks), 2)  # variants and cache invalidation
+
+class ResumableUploadTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(FLOWER_UPLOAD_DIR=directory.name))
+        self.staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(self.staff)
+        self.rose = self.make_flower('Rose')
+        self.content = make_image_bytes((64, 64), 'PNG')
+
+    def start(self, flower=None):
+        flower = flower or self.rose
+        response = self.client.post(
+            f'/api/v1/flowers/{flower.id}/uploads/', {'filename': 'rose.png', 'total_size': len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        return f"/api/v1/flowers/{flower.id}/uploads/{response.json()['id']}/", response.json()['id']
+
+    def put(self, url, offset, data, **headers):
+        return self.client.put(
+            f'{url}chunk/', data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers)
+
+    def upload(self, url):
+        half = len(self.content) // 2
+        self.assertEqual(self.put(url, 0, self.content[:half]).json()['offset'], half)
+        self.assertEqual(self.put(url, half, self.content[half:]).json()['offset'], len(self.content))
+
+    def test_offsets_conflicts_and_checksums(self):
+        url, _ = self.start()
+        half = len(self.content) // 2
+        self.assertEqual(self.put(url, 0, self.content[:half]).status_code, 200)
+
+        conflict = self.put(url, 0, self.content[:half])
+        self.assertEqual((conflict.status_code, conflict.json()), (409, {'offset': half}))
+        self.assertEqual(self.put(url, half, b'x', HTTP_CONTENT_SHA256='0' * 64).status_code, 400)
+        self.assertEqual(self.put(url, half, self.content[half:] + b'extra').status_code, 400)
+        self.assertEqual(self.client.get(url).json()['received'], half)
+
+        digest = hashlib.sha256(self.content[half:]).hexdigest()
+        self.assertEqual(self.put(url, half, self.content[half:], HTTP_CONTENT_SHA256=digest).status_code, 200)
+        self.assertEqual(self.client.get(url).json()['received'], len(self.content))
+
+    def test_writer_that_loses_the_race_conflicts(self):
+        _, upload_id = self.start()
+
+        class RacingStream(io.BytesIO):
+            def read(self, size=-1):
+                if not self.tell():
+                    # another request appends at offset 0 while this one is still reading
+                    UploadService.append_chunk(upload_id, 0, io.BytesIO(b'abc'))
+                return super().read(size)
+
+        with self.assertRaises(ChunkConflict) as raised:
+            UploadService.append_chunk(upload_id, 0, RacingStream(b'winner?'))
+        self.assertEqual(raised.exception.offset, 3)
+        with open(os.path.join(settings.FLOWER_UPLOAD_DIR, f'{upload_id}.part'), 'rb') as part:
+            self.assertEqual(part.read(), b'abc')
+        self.assertEqual(sorted(os.listdir(settings.FLOWER_UPLOAD_DIR)), [f'{upload_id}.part'])
+
+    def test_finalize(self):
+        url, upload_id = self.start()
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 400)
+        self.upload(url)
+
+        with mock.patch('cloudinary.uploader.upload_resource', side_effect=OSError('storage is down')), \
+                self.assertRaises(OSError):
+            self.client.post(f'{url}finalize/')
+        self.assertEqual(ImageUpload.objects.get(pk=upload_id).status, ImageUpload.IN_PROGRESS)
+
+        with mock.patch('cloudinary.uploader.upload_resource', return_value='flowers/rose') as upload_resource:
+            response = self.client.post(f'{url}finalize/')
+            again = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(upload_resource.call_count, 1)
+        self.assertEqual(again.json()['id'], response.json()['id'])
+        image = FlowerImage.objects.get()
+        self.assertEqual(image.content_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(ImageUpload.objects.get(pk=upload_id).image, image)
+
+        # the same bytes for another flower reuse the stored original
+        tulip = self.make_flower('Tulip')
+        url, _ = self.start(tulip)
+        self.upload(url)
+        with mock.patch('cloudinary.uploader.upload_resource') as upload_resource:
+            self.assertEqual(self.client.post(f'{url}finalize/').status_code, 201)
+        upload_resource.assert_not_called()
+        self.assertEqual(tulip.images.get().image.public_id, image.image.public_id)
+
+    def test_concurrent_finalize_is_refused(self):
+        url, upload_id = self.start()
+        self.upload(url)
+        ImageUpload.objects.filter(pk=upload_id).update(status=ImageUpload.FINALIZING)
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 400)
+        self.assertEqual(self.put(url, len(self.content), b'x').status_code, 400)
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rose = self.make_flower('Rose', price=7, description='A long description')
+        FlowerImage.objects.create(flower=self.rose, image='flowers/rose')
+
+    def test_only_requested_fields_are_rendered_and_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get('/api/v1/flowers/', {'fields': 'id,name,price_with_tax'}).json()
+        self.assertEqual(list(page['results'][0]), ['id', 'name', 'price_with_tax'])
+        self.assertEqual(page['results'][0]['name'], 'Rose')
+        # versions, count and page; no description column, no image prefetch
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('description', queries[2]['sql'])
+
+        detail = self.client.get(f'/api/v1/flowers/{self.rose.id}/', {'fields': 'id,thumbnail'}).json()
+        self.assertEqual(set(detail), {'id', 'thumbnail'})
+        self.assertIsNotNone(detail['thumbnail'])
+
+    def test_cursor_pagination_with_fields(self):
+        for index in range(6):
+            self.make_flower(f'Tulip {index}', price=7)
+        pages = self.walk('/api/v1/flowers/?pagination=cursor&ordering=price&fields=name')
+        names = [row['name'] for page in pages for row in page['results']]
+        self.assertEqual(len(names), 7)
+        self.assertEqual(set(pages[0]['results'][0]), {'name'})
+
+    def test_writes_ignore_fields(self):
+        staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.patch(f'/api/v1/flowers/{self.rose.id}/?fields=id', {'stock': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock'], 3)
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.stock, 3)
+
+
+class ValuesReaderTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(4):
+            flower = self.make_flower(f'Rose {index}', price=index + 0.5, description=f'Rose number {index}')
+            for number in range(index % 3):
+                image = FlowerImage.objects.create(flower=flower, image=f'flowers/rose-{index}-{number}')
+                FlowerImageVariant.objects.bulk_create([
+                    FlowerImageVariant(
+                        image=image, name=name, format=image_format, width=bound, height=bound,
+                        size=100, path=f'{image.id}/{name}.{image_format}')
+                    for name, bound in imaging.VARIANT_SIZES
+                    for image_format in (FlowerImageVariant.WEBP, FlowerImageVariant.JPEG)
+                ])
+
+    def test_reader_matches_the_serializer(self):
+        for url in ['/api/v1/flowers/', '/api/v1/flowers/?pagination=cursor&ordering=price',
+                    '/api/v1/flowers/?search=rose&page=1']:
+            get_response_cache().clear()
+            fast = self.client.get(url).content
+            get_response_cache().clear()
+            with override_settings(FAST_LIST_SERIALIZERS=False):
+                slow = self.client.get(url).content
+            self.assertEqual(fast, slow, url)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        # versions, count, page, images, variants
+        with self.assertNumQueries(5):
+            self.client.get('/api/v1/flowers/')
+        for index in range(4, 8):
+            FlowerImage.objects.create(flower=self.make_flower(f'Tulip {index}'), image=f'flowers/tulip-{index}')
+        get_response_cache().clear()
+        with self.assertNumQueries(5):
+            page = self.client.get('/api/v1/flowers/').json()
+        self.assertEqual(page['count'], 8)
+
+
+class SearchMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def test_existing_flowers_are_indexed(self):
+        get_response_cache().clear()
+        leaves = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        apps = self.migrate([('flower', '0004_flower_keyset_indexes')])
+        try:
+            category = apps.get_model('flower', 'Category').objects.create(name='Garden')
+            apps.get_model('flower', 'Flower').objects.create(
+                name='Red Roses', description='Fresh', price=5, stock=1, category=category)
+        finally:
+            self.migrate(leaves)
+
+        results = APIClient().get('/api/v1/flowers/', {'search': 'rose'}).json()['results']
+        self.assertEqual([row['name'] for row in results], ['Red Roses'])
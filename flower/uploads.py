@@ -0,0 +1,185 @@
+import hashlib
+import os
+import shutil
+from datetime import timedelta
+from uuid import uuid4
+
+from cloudinary import uploader
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from flower.imaging import schedule_variants
+from flower.models import FlowerImage, FlowerImageVariant, ImageUpload
+
+BUFFER_SIZE = 64 * 1024
+
+
+class ChunkConflict(Exception):
+    """The chunk does not start where the upload currently ends."""
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def get_upload_dir():
+    path = getattr(settings, 'FLOWER_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def upload_path(upload):
+    return os.path.join(get_upload_dir(), f'{upload.id}.part')
+
+
+class UploadService:
+    # a finalize that died mid-way can be taken over after this long
+    finalize_timeout = timedelta(minutes=10)
+
+    @staticmethod
+    def append_chunk(upload_id, offset, stream, expected_sha256=None):
+        """
+        Append a request body to the upload at `offset`, reading and
+        hashing it in fixed-size blocks so memory use does not depend on
+        the chunk size.
+
+        The body is staged to its own file before any lock is taken, so a
+        slow client holds neither a transaction nor a row lock. The offset
+        is then advanced with a compare-and-set UPDATE, and the staged
+        bytes are copied onto the partial file before that UPDATE commits.
+        """
+        upload = ImageUpload.objects.get(pk=upload_id)
+        UploadService.check_appendable(upload, offset)
+
+        staged = os.path.join(get_upload_dir(), f'{upload.id}.{uuid4().hex}.chunk')
+        try:
+            written = UploadService.stage_chunk(
+                stream, staged, upload.total_size - offset, expected_sha256)
+            if not written:
+                return upload
+            with transaction.atomic():
+                advanced = ImageUpload.objects.filter(
+                    pk=upload.pk, status=ImageUpload.IN_PROGRESS, received=offset,
+                ).update(received=offset + written, updated_at=timezone.now())
+                if not advanced:
+                    UploadService.check_appendable(ImageUpload.objects.get(pk=upload.pk), offset)
+                    raise ChunkConflict(offset)
+                # the UPDATE holds the row lock, so no other writer appends here
+                with open(upload_path(upload), 'ab') as destination, open(staged, 'rb') as source:
+                    destination.truncate(offset)
+                    shutil.copyfileobj(source, destination, BUFFER_SIZE)
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+        upload.received = offset + written
+        return upload
+
+    @staticmethod
+    def check_appendable(upload, offset):
+        if upload.status != ImageUpload.IN_PROGRESS:
+            raise ValidationError({"detail": "Upload is already finalized."})
+        if offset != upload.received:
+            raise ChunkConflict(upload.received)
+
+    @staticmethod
+    def stage_chunk(stream, path, limit, expected_sha256=None):
+        """Copy `stream` to `path`, refusing more than `limit` bytes or a checksum mismatch."""
+        digest = hashlib.sha256()
+        written = 0
+        with open(path, 'wb') as destination:
+            while True:
+                block = stream.read(BUFFER_SIZE) if stream is not None else b''
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise ValidationError({"detail": "Chunk goes past the declared size."})
+                digest.update(block)
+                destination.write(block)
+        if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+            raise ValidationError({"detail": "Chunk checksum does not match."})
+        return written
+
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for block in iter(lambda: source.read(BUFFER_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def finalize(upload_id):
+        """
+        Turn a fully received upload into a FlowerImage. Identical content
+        that was uploaded before is reused instead of being sent to storage
+        again.
+
+        The upload is claimed as `finalizing` in one short transaction, the
+        file is checked and sent to storage with no transaction open, and
+        the FlowerImage is recorded in a second short transaction.
+        """
+        upload = UploadService.claim_for_finalize(upload_id)
+        if upload.status == ImageUpload.COMPLETE:
+            return upload.image
+
+        path = upload_path(upload)
+        try:
+            content_hash = UploadService.file_digest(path)
+            existing = FlowerImage.objects.filter(content_hash=content_hash).order_by('id').first()
+            resource = None
+            if existing is None:
+                try:
+                    with Image.open(path) as picture:
+                        picture.verify()
+                except Exception:
+                    raise ValidationError({"detail": "Upload is not a valid image."})
+                resource = uploader.upload_resource(path, type='upload', resource_type='image')
+        except Exception:
+            # let the client retry finalize
+            ImageUpload.objects.filter(pk=upload.pk, status=ImageUpload.FINALIZING).update(
+                status=ImageUpload.IN_PROGRESS, updated_at=timezone.now())
+            raise
+
+        with transaction.atomic():
+            if existing and existing.flower_id == upload.flower_id:
+                image = existing
+            elif existing:
+                image = FlowerImage.objects.create(
+                    flower_id=upload.flower_id, image=existing.image, content_hash=content_hash)
+                FlowerImageVariant.objects.bulk_create([
+                    FlowerImageVariant(
+                        image=image, name=variant.name, format=variant.format, width=variant.width,
+                        height=variant.height, size=variant.size, path=variant.path)
+                    for variant in existing.variants.all()
+                ])
+            else:
+                image = FlowerImage.objects.create(
+                    flower_id=upload.flower_id, image=resource, content_hash=content_hash)
+
+            ImageUpload.objects.filter(pk=upload.pk).update(
+                status=ImageUpload.COMPLETE, image=image, updated_at=timezone.now())
+
+            if existing:
+                transaction.on_commit(lambda: os.remove(path))
+            else:
+                schedule_variants(image.id, path)
+            return image
+
+    @staticmethod
+    def claim_for_finalize(upload_id):
+        """Mark a complete upload `finalizing`, or return it as is when already complete."""
+        with transaction.atomic():
+            upload = ImageUpload.objects.select_for_update().get(pk=upload_id)
+            if upload.status == ImageUpload.COMPLETE:
+                return upload
+            if upload.status == ImageUpload.FINALIZING and (
+                    upload.updated_at > timezone.now() - UploadService.finalize_timeout):
+                raise ValidationError({"detail": "Upload is already being finalized."})
+            if upload.received != upload.total_size:
+                raise ValidationError({"detail": f"Upload is incomplete ({upload.received}/{upload.total_size} bytes)."})
+            upload.status = ImageUpload.FINALIZING
+            upload.save(update_fields=['status', 'updated_at'])
+            return upload
@@ -1,9 +1,14 @@
 from django.core.exceptions import ValidationError
 
+MAX_FILE_SIZE = 15
 
-def validate_file_size(file):
-    max_size = 15
-    max_size_in_bytes = max_size * 1024 * 1024
 
-    if file.size > max_size_in_bytes:
-        raise ValidationError(f"File can not be larger than {max_size}MB!")
\ No newline at end of file
+def validate_size(size):
+    max_size_in_bytes = MAX_FILE_SIZE * 1024 * 1024
+
+    if size > max_size_in_bytes:
+        raise ValidationError(f"File can not be larger than {MAX_FILE_SIZE}MB!")
+
+
+def validate_file_size(file):
+    validate_size(file.size)
\ No newline at end of file
@@ -1,35 +1,86 @@
-from rest_framework.viewsets import ModelViewSet
-from flower.models import Flower, Category, Review, FlowerImage
-from flower.serializers import FlowerSerializer, CategorySerializer, ReviewSerializer, FlowerImageSerializer
-from django.db.models import Count
+from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from flower.models import Flower, Category, Review, FlowerImage, ImageUpload
+from flower.serializers import FlowerSerializer, FlowerListReader, CategorySerializer, ReviewSerializer, FlowerImageSerializer, ReviewSummarySerializer, ImageUploadSerializer
+from django.db.models import Avg, Count, Q
 from rest_framework.exceptions import NotFound
 from django_filters.rest_framework import DjangoFilterBackend
-from flower.filters import FlowerFilter
-from rest_framework.filters import SearchFilter, OrderingFilter
-from flower.paginations import DefaultPagination
+from flower.filters import FlowerFilter, FlowerSearchFilter
+from flower.facets import get_facets
+from flower.imaging import spool_upload, schedule_variants
+from flower.uploads import UploadService, ChunkConflict
+from rest_framework.filters import OrderingFilter
+from flower.paginations import DefaultPagination, ReviewCursorPagination
 from api.permissions import IsAdminOrReadOnly
+from api.cache import CachedResponseMixin
+from api.fieldsets import SparseFieldsetViewMixin
+from api.readers import ValuesReaderListMixin
 from flower.permissions import IsReviewAuthorOrReadonly
 from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.parsers import MultiPartParser
+from rest_framework import status
+from django.http import StreamingHttpResponse
+import io
+import os
+from api.streaming import STREAM_READERS, STREAM_WRITERS, CONTENT_TYPES, guess_stream_format, streaming_content
+from flower.catalog import CatalogImporter, CATALOG_FIELDS, export_catalog_rows
 
-class FlowerViewSet(ModelViewSet):
+class FlowerViewSet(CachedResponseMixin, ValuesReaderListMixin, SparseFieldsetViewMixin, ModelViewSet):
 
     """
     API endpoint for managing flowers in the e-commerce store
      - Allows authenticated admin to create, update, and delete flowers
      - Allows users to browse and filter flowers
-     - Support searching by name, description, and category
-     - Support ordering by price and updated_at
+     - Support ranked, typo tolerant searching by name, description, and category
+     - Support ordering by price, updated_at, rating_avg and rating_count
+     - Support cursor pagination with `?pagination=cursor`
+     - Support `?facets=category,price,stock` counts for the current filter
+     - Support sparse fieldsets, e.g. `?fields=id,name,price,thumbnail`
     """
     serializer_class = FlowerSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    values_reader_class = FlowerListReader
+    filter_backends = [DjangoFilterBackend, FlowerSearchFilter, OrderingFilter]
     filterset_class = FlowerFilter
     pagination_class = DefaultPagination
-    search_fields = ['name', 'description']
-    ordering_fields = ['price', 'updated_at']
+    ordering_fields = ['price', 'updated_at', 'rating_avg', 'rating_count']
     permission_classes = [IsAdminOrReadOnly]
+    # pagination and ordering keys stay loaded whatever `?fields=` says
+    sparse_fieldset_always = ['id', 'price', 'updated_at', 'rating_avg', 'rating_count']
+    sparse_fieldset_sources = {
+        'price_with_tax': ['price'],
+        'images': [],
+        'thumbnail': [],
+        'srcset': [],
+    }
+    sparse_fieldset_relations = {
+        'images': lambda queryset: queryset.prefetch_related('images__variants'),
+        'thumbnail': lambda queryset: queryset.prefetch_related('images__variants'),
+        'srcset': lambda queryset: queryset.prefetch_related('images__variants'),
+    }
 
     def get_queryset(self):
-        return Flower.objects.prefetch_related('images').all()
+        return self.apply_sparse_fieldset(Flower.objects.all())
+
+    def filter_queryset(self, queryset):
+        # kept so facets reuse the list's filtered queryset
+        self.filtered_queryset = super().filter_queryset(queryset)
+        return self.filtered_queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        facets = get_facets(self.request, self.filtered_queryset)
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
+
+    def get_cache_namespaces(self):
+        if self.action == 'retrieve':
+            return ['catalog', f"flower:{self.kwargs.get('pk')}"]
+        return ['catalog', 'flowers']
 
     @swagger_auto_schema(
         operation_summary='Retrive a list of flowers'
@@ -53,17 +104,72 @@ class FlowerViewSet(ModelViewSet):
         """Only authenticated admin can create flower"""
         return super().create(request, *args, **kwargs)
 
-class FlowerImageViewSet(ModelViewSet):
+class FlowerImageViewSet(CachedResponseMixin, ModelViewSet):
     serializer_class = FlowerImageSerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
-        return FlowerImage.objects.filter(flower_id=self.kwargs.get('flower_pk'))
+        return FlowerImage.objects.prefetch_related('variants').filter(flower_id=self.kwargs.get('flower_pk'))
+
+    def get_cache_namespaces(self):
+        return ['catalog', f"flower:{self.kwargs.get('flower_pk')}"]
 
     def perform_create(self, serializer):
-        serializer.save(flower_id=self.kwargs.get('flower_pk'))
+        source_path = spool_upload(serializer.validated_data['image'])
+        try:
+            # CloudinaryField uploads during save(), so no transaction is held around it
+            flower_image = serializer.save(flower_id=self.kwargs.get('flower_pk'))
+        except Exception:
+            # the on_commit hook that owns the file is never queued
+            os.remove(source_path)
+            raise
+        schedule_variants(flower_image.id, source_path)
     
-class CategoryViewSet(ModelViewSet):
+class FlowerImageUploadViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    Resumable image uploads for admins
+     - POST with `filename` and `total_size` to start an upload
+     - PUT raw bytes to `chunk/` with an `Upload-Offset` header (and an
+       optional `Content-SHA256` of the chunk); a 409 carries the offset
+       to resume from
+     - GET the upload to read its current offset
+     - POST `finalize/` to attach the file to the flower as a FlowerImage
+    """
+    serializer_class = ImageUploadSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(flower_id=self.kwargs.get('flower_pk'))
+
+    def perform_create(self, serializer):
+        flower_id = self.kwargs.get('flower_pk')
+        if not Flower.objects.filter(id=flower_id).exists():
+            raise NotFound({"error": f"Flower with ID {flower_id} does not exist."})
+        serializer.save(flower_id=flower_id, user=self.request.user)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, flower_pk=None, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = UploadService.append_chunk(
+                upload.id, offset, request.stream, request.headers.get('Content-SHA256'))
+        except ChunkConflict as conflict:
+            return Response({"offset": conflict.offset}, status=status.HTTP_409_CONFLICT)
+        return Response({"offset": upload.received, "total_size": upload.total_size})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, flower_pk=None, pk=None):
+        upload = self.get_object()
+        image = UploadService.finalize(upload.id)
+        serializer = FlowerImageSerializer(image, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
     """
     - Only admin add, delete and update category 
     """
@@ -72,9 +178,19 @@ class CategoryViewSet(ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def get_cache_namespaces(self):
+        return ['catalog', 'categories']
+
 class ReviewViewSet(ModelViewSet):
+    """
+    - Reviews are cursor paginated, newest first
+    - `summary/` returns a rating histogram and the latest reviews
+    """
     serializer_class = ReviewSerializer
     permission_classes = [IsReviewAuthorOrReadonly]
+    pagination_class = ReviewCursorPagination
+    summary_latest_default = 5
+    summary_latest_max = 20
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -85,12 +201,87 @@ class ReviewViewSet(ModelViewSet):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Review.objects.none()
+        return Review.objects.select_related('user').filter(flower_id=self.kwargs.get('flower_pk'))
+
+    def ensure_flower_exists(self):
         flower_id = self.kwargs.get('flower_pk')
         if not Flower.objects.filter(id=flower_id).exists():
             raise NotFound({"error": f"Flower with ID {flower_id} does not exist."})
 
-        return Review.objects.filter(flower_id=flower_id)
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Only an empty first page can hide a missing flower, so the
+        # existence check is skipped on the common path.
+        if not response.data['results'] and not response.data['previous']:
+            self.ensure_flower_exists()
+        return response
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request, flower_pk=None):
+        """Rating histogram (one aggregate query) plus the latest `?latest=N` reviews"""
+        try:
+            latest = int(request.query_params.get('latest', self.summary_latest_default))
+        except ValueError:
+            latest = self.summary_latest_default
+        latest = max(0, min(latest, self.summary_latest_max))
+
+        queryset = self.get_queryset()
+        stats = queryset.aggregate(
+            count=Count('id'),
+            average=Avg('ratings'),
+            **{f'stars_{stars}': Count('id', filter=Q(ratings=stars)) for stars in range(1, 6)}
+        )
+        if not stats['count']:
+            self.ensure_flower_exists()
+
+        serializer = ReviewSummarySerializer({
+            'flower_id': flower_pk,
+            'count': stats['count'],
+            'average': stats['average'],
+            'histogram': {str(stars): stats[f'stars_{stars}'] for stars in range(1, 6)},
+            'latest': queryset.order_by('-created_at', '-id')[:latest] if latest else [],
+        })
+        return Response(serializer.data)
 
     def get_serializer_context(self):
         flower_id = self.kwargs.get('flower_pk')
-        return {'flower_id': flower_id}
\ No newline at end of file
+        return {'flower_id': flower_id}
+
+class CatalogImportView(APIView):
+    """
+    - Only admin can bulk import flowers from a CSV or NDJSON `file`
+    - Rows are upserted by category name and flower name
+    - Use `?type=csv|ndjson` when the file name has no extension
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": "A CSV or NDJSON file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_type = request.query_params.get('type') or guess_stream_format(upload.name)
+        if file_type not in STREAM_READERS:
+            return Response({"type": "Use csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        report = CatalogImporter().run(STREAM_READERS[file_type](lines))
+        return Response(report)
+
+class CatalogExportView(APIView):
+    """
+    - Only admin can export the whole catalog as CSV (default) or NDJSON
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        file_type = request.query_params.get('type', 'csv')
+        if file_type not in STREAM_WRITERS:
+            return Response({"type": "Use csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            streaming_content(request, STREAM_WRITERS[file_type](CATALOG_FIELDS, export_catalog_rows())),
+            content_type=CONTENT_TYPES[file_type])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{file_type}"'
+        return response
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from order.models import Cart, CartItem, Order, OrderItem
+from django.db import transaction
+from order.models import Cart, CartItem, Order, OrderItem, StockHold, IdempotencyKey, PaymentNotification
+from order.services import OrderService
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -9,5 +11,20 @@ class CartAdmin(admin.ModelAdmin):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'status']
 
+    # deletes go through OrderService so purchases and sales rollups stay in step
+    def delete_model(self, request, obj):
+        OrderService.delete_order(obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for order in queryset:
+                OrderService.delete_order(order)
+
+@admin.register(PaymentNotification)
+class PaymentNotificationAdmin(admin.ModelAdmin):
+    list_display = ['tran_id', 'order_id', 'received_at', 'processed_at', 'outcome']
+
 admin.site.register(CartItem)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(StockHold)
+admin.site.register(IdempotencyKey)
\ No newline at end of file
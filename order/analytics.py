@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from order.models import DailyCategorySales, DailyFlowerSales, Order, OrderItem
+
+# Orders in these statuses are paid for and count as sales
+SALE_STATUSES = {Order.READY_TO_SHIP, Order.SHIPPED, Order.DELIVERED}
+ROLLUPS = [
+    (DailyFlowerSales, 'flower', 'flower_id'),
+    (DailyCategorySales, 'category', 'flower__category_id'),
+]
+
+
+def is_sale(status):
+    return status in SALE_STATUSES
+
+
+def increment(model, key_field, rows):
+    """
+    Add `quantity` and `revenue` of each (date, key) row into the rollup in
+    one INSERT ... ON CONFLICT DO UPDATE statement.
+    """
+    if not rows:
+        return
+    meta = model._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    fields = [meta.get_field(name) for name in ('date', key_field, 'quantity', 'revenue')]
+    columns = [quote(field.column) for field in fields]
+    params = [
+        field.get_db_prep_value(row[index], connection)
+        for row in rows for index, field in enumerate(fields)
+    ]
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))} '
+        f'ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE SET '
+        f'{columns[2]} = {table}.{columns[2]} + EXCLUDED.{columns[2]}, '
+        f'{columns[3]} = {table}.{columns[3]} + EXCLUDED.{columns[3]}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_orders(order_ids, sign=1):
+    """Add (sign=1) or remove (sign=-1) the items of `order_ids` from every rollup."""
+    items = OrderItem.objects.filter(order_id__in=order_ids).annotate(date=TruncDate('order__created_at'))
+    for model, key_field, source in ROLLUPS:
+        rows = items.values('date', key=F(source)).annotate(
+            quantity=Sum('quantity'), revenue=Sum('total_price')).order_by('date', 'key')
+        increment(model, key_field, [
+            (row['date'], row['key'], sign * row['quantity'], sign * row['revenue'])
+            for row in rows
+        ])
+
+
+def record_status_change(order, previous, status):
+    """Call inside the transaction that moves `order` from `previous` to `status`."""
+    if is_sale(previous) != is_sale(status):
+        apply_orders([order.pk], 1 if is_sale(status) else -1)
+
+
+def day_ranges(since, batch_size):
+    """
+    Split order days from `since` on into consecutive [first, last] ranges
+    of about `batch_size` orders each. The first range starts at `since`
+    and the last one is open-ended (last is None), so together they cover
+    every rollup row from `since` on, including days with no orders left.
+    """
+    days = Order.objects.annotate(date=TruncDate('created_at'))
+    if since is not None:
+        days = days.filter(date__gte=since)
+    days = list(days.values('date').annotate(orders=Count('pk')).order_by('date'))
+
+    first, count = since, 0
+    for day in days:
+        if count >= batch_size:
+            yield first, day['date'] - timedelta(days=1)
+            first, count = day['date'], 0
+        count += day['orders']
+    yield first, None
+
+
+def rebuild_range(first, last, batch_size):
+    """
+    Recompute the rollups for order days in [first, last] in one
+    transaction and return how many orders were replayed. Every order of
+    those days is locked first, so status changes, which lock the order
+    row, wait for the range and then apply their change on top of it.
+    """
+    with transaction.atomic():
+        orders = Order.objects.annotate(date=TruncDate('created_at'))
+        rollups = [model.objects.all() for model, _, _ in ROLLUPS]
+        if first is not None:
+            orders = orders.filter(date__gte=first)
+            rollups = [rollup.filter(date__gte=first) for rollup in rollups]
+        if last is not None:
+            orders = orders.filter(date__lte=last)
+            rollups = [rollup.filter(date__lte=last) for rollup in rollups]
+
+        sales = [
+            pk for pk, status in orders.select_for_update().order_by('pk').values_list('pk', 'status')
+            if is_sale(status)
+        ]
+        for rollup in rollups:
+            rollup.delete()
+        for start in range(0, len(sales), batch_size):
+            apply_orders(sales[start:start + batch_size])
+        return len(sales)
+
+
+def rebuild(since=None, batch_size=500):
+    """
+    Recompute the rollups from order items, for order days from `since`
+    on or for all of them. Days are rebuilt in ranges of about
+    `batch_size` orders, each committed on its own, so no transaction
+    holds locks for the whole history; readers may see rebuilt and
+    not-yet-rebuilt days side by side, but never a half-built day.
+    """
+    return sum(rebuild_range(first, last, batch_size) for first, last in day_ranges(since, batch_size))
+
+
+def sales_report(start, end, group_by):
+    """Quantity and revenue per day, flower or category for order days in [start, end]."""
+    if group_by == 'flower':
+        rows = DailyFlowerSales.objects.filter(date__range=(start, end)).values(
+            'flower_id', name=F('flower__name'))
+    elif group_by == 'category':
+        rows = DailyCategorySales.objects.filter(date__range=(start, end)).values(
+            'category_id', name=F('category__name'))
+    else:
+        rows = DailyCategorySales.objects.filter(date__range=(start, end)).values('date')
+    rows = rows.annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+    if group_by == 'day':
+        return list(rows.order_by('date'))
+    return list(rows.order_by('-revenue', 'name'))
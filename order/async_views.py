@@ -0,0 +1,32 @@
+from api.async_views import AsyncReadView, aget_object_or_404
+from order.purchases import apurchased_flower_ids, has_ordered_data
+from order.serializers import HasOrderedQuerySerializer
+from order.views import CartViewSet
+
+
+class CartDetailView(AsyncReadView):
+    """
+    - Async version of GET `carts/<id>/`
+    - Only authenticated user can view Cart
+    """
+    requires_authentication = True
+
+    async def aget_data(self, request, pk):
+        view = CartViewSet(request=request, args=(), kwargs={'pk': pk}, action='retrieve', format_kwarg=None)
+        cart = await aget_object_or_404(view.get_queryset(), pk=pk)
+        return view.get_serializer(cart).data
+
+
+class HasOrderedView(AsyncReadView):
+    """
+    - Async version of GET `orders/has_ordered/` and `orders/has_ordered/<flower_id>/`
+    """
+    requires_authentication = True
+
+    async def aget_data(self, request, flower_id=None):
+        if flower_id is not None:
+            return {"has_ordered": flower_id in await apurchased_flower_ids(request.user.id, [flower_id])}
+        serializer = HasOrderedQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        flower_ids = serializer.validated_data.get('flower_ids')
+        return has_ordered_data(flower_ids, await apurchased_flower_ids(request.user.id, flower_ids))
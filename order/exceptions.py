@@ -0,0 +1,21 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class OutOfStockError(APIException):
+    """
+    400 response for order.services.OutOfStock. The lines are passed
+    through as-is; a ValidationError would stringify their quantities.
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'out_of_stock'
+
+    def __init__(self, error):
+        self.detail = {'detail': str(error), 'out_of_stock': error.lines}
+
+
+class PaymentGatewayError(APIException):
+    """503 response when the payment gateway timed out, failed or its circuit is open."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Payment gateway is unavailable, try again later.'
+    default_code = 'payment_gateway_unavailable'
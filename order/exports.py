@@ -0,0 +1,49 @@
+from django.db.models import Q
+
+from order.models import OrderItem
+
+ORDER_EXPORT_FIELDS = [
+    'order_id', 'created_at', 'status', 'user_id', 'user_email', 'order_total',
+    'item_id', 'flower_id', 'flower_name', 'category', 'quantity', 'unit_price', 'line_total',
+]
+
+
+def iter_order_chunks(orders, chunk_size=1000):
+    """
+    Yield lists of order dicts in (created_at, id) order. Each chunk is
+    fetched with a keyset predicate, so chunk N costs the same as chunk 1
+    and memory stays bounded by `chunk_size`.
+    """
+    orders = orders.order_by('created_at', 'id').values(
+        'id', 'created_at', 'status', 'user_id', 'user__email', 'total_price')
+    last = None
+    while True:
+        batch = orders
+        if last is not None:
+            batch = batch.filter(
+                Q(created_at__gt=last['created_at'])
+                | Q(created_at=last['created_at'], id__gt=last['id']))
+        chunk = list(batch[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def export_order_rows(orders, chunk_size=1000):
+    """One flat row per order item, in ORDER_EXPORT_FIELDS order; orders
+    without items get a single row with empty item columns."""
+    for chunk in iter_order_chunks(orders, chunk_size):
+        items = {}
+        rows = OrderItem.objects.filter(order_id__in=[order['id'] for order in chunk]).order_by(
+            'order_id', 'id').values_list(
+            'order_id', 'id', 'flower_id', 'flower__name', 'flower__category__name',
+            'quantity', 'price', 'total_price')
+        for order_id, *item in rows:
+            items.setdefault(order_id, []).append(item)
+
+        for order in chunk:
+            head = [order['id'], order['created_at'], order['status'], order['user_id'],
+                    order['user__email'], order['total_price']]
+            for item in items.get(order['id'], [[None] * 7]):
+                yield head + list(item)
@@ -0,0 +1,13 @@
+from django_filters.rest_framework import DateTimeFilter, FilterSet
+from order.models import Order
+
+class OrderFilter(FilterSet):
+    created_after = DateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = DateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = {
+            'status': ['exact', 'in'],
+            'user_id': ['exact'],
+        }
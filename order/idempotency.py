@@ -0,0 +1,147 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from api.renderers import FastJSONRenderer
+from order.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# seconds between checks of a key another request is still running
+POLL_INTERVAL = 0.1
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def digest(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    return digest(request.method, request.path, json.dumps(data, sort_keys=True, default=str))
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def replay(record):
+    response = HttpResponse(record.body, status=record.status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(key, fingerprint):
+    """
+    Commit a pending row for `key` in its own short transaction. Returns
+    the lease that marks this request as its owner, or the existing row.
+    """
+    now = timezone.now()
+    lease = now + get_lock_timeout()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=key, fingerprint=fingerprint, expires_at=now + get_ttl(), locked_until=lease)
+    except IntegrityError:
+        return None, IdempotencyKey.objects.filter(pk=key).first()
+    return lease, None
+
+
+def run_idempotent(request, scope, handler):
+    """
+    Run `handler()` at most once per Idempotency-Key.
+
+    The key is committed as pending before the handler runs, and the
+    handler runs outside any transaction of ours, so a slow payment gateway
+    never holds a row lock or a transaction open. A concurrent retry polls
+    the pending key for up to IDEMPOTENCY_WAIT seconds and replays the
+    stored response, or answers 409. Only successful (2xx) responses are
+    stored: on errors and 4xx/5xx responses the pending key is deleted, so
+    a retry runs again instead of replaying a failure such as a gateway
+    refusing to start a payment session. A request that dies while it
+    holds the key leaves it pending until IDEMPOTENCY_LOCK_TIMEOUT passes;
+    a retry then takes the key over and runs the handler again.
+    """
+    raw_key = request.headers.get(HEADER)
+    if raw_key is None:
+        return handler()
+    if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+        return Response({'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    key = digest(request.user.pk or 'anonymous', scope, raw_key)
+    fingerprint = request_fingerprint(request)
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT', 20)
+    while True:
+        lease, record = claim(key, fingerprint)
+        if lease is not None:
+            break
+        if record is None:
+            continue
+        now = timezone.now()
+        if record.expires_at <= now or (record.status_code is None and record.locked_until <= now):
+            # expired, or its request died mid-flight
+            IdempotencyKey.objects.filter(
+                pk=key, expires_at=record.expires_at, locked_until=record.locked_until).delete()
+            continue
+        if record.fingerprint != fingerprint:
+            return Response({'detail': f'{HEADER} was already used for a different request'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is not None:
+            return replay(record)
+        if time.monotonic() >= deadline:
+            return Response({'detail': f'A request with this {HEADER} is still in progress'},
+                            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        time.sleep(POLL_INTERVAL)
+
+    # the lease doubles as an owner token, so a request that lost its key to
+    # a takeover never overwrites the new owner's row
+    owned = IdempotencyKey.objects.filter(pk=key, locked_until=lease, status_code__isnull=True)
+    try:
+        response = handler()
+    except BaseException:
+        owned.delete()
+        raise
+    if not status.is_success(response.status_code):
+        owned.delete()
+        return response
+    owned.update(
+        status_code=response.status_code,
+        body=FastJSONRenderer().render(response.data).decode(),
+        locked_until=None)
+    return response
+
+
+def idempotent(scope):
+    """Decorator for view functions and viewset actions, see run_idempotent."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            return run_idempotent(request, scope, lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches of `batch_size`, returning how many."""
+    purged = 0
+    while True:
+        keys = list(IdempotencyKey.objects.filter(
+            expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=keys).delete()[0]
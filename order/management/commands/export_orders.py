@@ -0,0 +1,42 @@
+import gzip
+import sys
+from argparse import BooleanOptionalAction
+from django.core.management.base import BaseCommand, CommandError
+from api.streaming import STREAM_WRITERS, guess_stream_format
+from order.exports import ORDER_EXPORT_FIELDS, export_order_rows
+from order.filters import OrderFilter
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, one row per item, to a gzip-compressed CSV or NDJSON file ("-" for stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=sorted(STREAM_WRITERS))
+        parser.add_argument('--status', action='append', help='Repeat to export several statuses')
+        parser.add_argument('--created-after', help='YYYY-MM-DD or an ISO datetime')
+        parser.add_argument('--created-before', help='YYYY-MM-DD or an ISO datetime')
+        parser.add_argument('--compress', action=BooleanOptionalAction, default=True)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        filters = OrderFilter({
+            'status__in': ','.join(options['status'] or []),
+            'created_after': options['created_after'] or '',
+            'created_before': options['created_before'] or '',
+        }, queryset=Order.objects.all())
+        if not filters.is_valid():
+            raise CommandError(filters.errors.as_text())
+
+        path = options['path']
+        file_type = options['type'] or guess_stream_format(path.removesuffix('.gz'))
+        chunks = STREAM_WRITERS[file_type](
+            ORDER_EXPORT_FIELDS, export_order_rows(filters.qs, chunk_size=options['chunk_size']))
+
+        if path == '-':
+            sys.stdout.writelines(chunks)
+            return
+        opener = gzip.open if options['compress'] else open
+        with opener(path, 'wt', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from order.services import PaymentNotificationService
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply recorded payment success callbacks to their orders in batches; '
+        'run it from cron, or with --interval as a long-running worker'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep polling, sleeping this many seconds whenever the inbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = PaymentNotificationService.process_pending(batch_size=options['batch_size'])
+            if processed or options['interval'] is None:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} payment notifications'))
+            if options['interval'] is None:
+                return
+            if not processed:
+                time.sleep(options['interval'])
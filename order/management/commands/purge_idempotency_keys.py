@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from order.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys in batches; run it periodically from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        purged = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency keys'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from order.purchases import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user purchased flowers behind has_ordered from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} purchased flowers'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+from order.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='Only rebuild order days from this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        replayed = rebuild(since=options['since'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups from {replayed} orders'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from order.services import StockHoldService
+
+
+class Command(BaseCommand):
+    help = 'Release expired cart stock holds in batches; run it periodically from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = StockHoldService.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds'))
@@ -0,0 +1,78 @@
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    """Answers SSLCommerz session requests the way the real API does."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        options = self.server.options
+        length = int(self.headers.get('Content-Length') or 0)
+        data = parse_qs(self.rfile.read(length).decode())
+        if options['delay']:
+            time.sleep(options['delay'])
+
+        roll = random.random()
+        if roll < options['error_rate']:
+            return self.respond(502, {'status': 'ERROR'})
+        if roll < options['error_rate'] + options['fail_rate']:
+            return self.respond(200, {'status': 'FAILED', 'failedreason': 'Declined by fake gateway'})
+
+        sessionkey = uuid.uuid4().hex
+        host, port = self.server.server_address[:2]
+        self.respond(200, {
+            'status': 'SUCCESS',
+            'sessionkey': sessionkey,
+            'tran_id': data.get('tran_id', [''])[0],
+            'GatewayPageURL': f'http://{host}:{port}/pay/{sessionkey}',
+        })
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up waiting, e.g. its read timeout hit during --delay
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.options['verbosity'] > 1:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a local stand-in for the SSLCommerz session API. Set PAYMENT_GATEWAY_URL '
+        'to the printed URL to load test payment initiation offline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0, help='Seconds to wait before every answer')
+        parser.add_argument('--fail-rate', type=float, default=0, help='Share of sessions answered with status FAILED')
+        parser.add_argument('--error-rate', type=float, default=0, help='Share of requests answered with HTTP 502')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), FakeGatewayHandler)
+        server.daemon_threads = True
+        server.options = options
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f'Fake payment gateway on http://{host}:{port}/gwprocess/v4/api.php'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0009_flower_image_uploads'),
+        ('order', '0003_order_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('flower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='flower.flower')),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='order.cartitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['flower', 'expires_at'], name='stock_hold_flower_expiry_idx'), models.Index(fields=['expires_at'], name='stock_hold_expires_at_idx')],
+            },
+        ),
+    ]
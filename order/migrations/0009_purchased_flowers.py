@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def backfill(apps, schema_editor):
+    OrderItem = apps.get_model('order', 'OrderItem')
+    PurchasedFlower = apps.get_model('order', 'PurchasedFlower')
+    rows = OrderItem.objects.values('flower_id', user_id=F('order__user_id')).annotate(
+        orders=Count('order_id', distinct=True)).order_by()
+    PurchasedFlower.objects.bulk_create(
+        (PurchasedFlower(**row) for row in rows.iterator(chunk_size=1000)), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flower', '0009_flower_image_uploads'),
+        ('order', '0008_payment_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchasedFlower',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+                ('flower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to='flower.flower')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchased_flowers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'flower')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
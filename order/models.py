@@ -1,14 +1,37 @@
 from django.db import models
 from users.models import User
-from flower.models import Flower
+from flower.models import Flower, Category
 from uuid import uuid4
 from django.core.validators import MinValueValidator
 
+def line_total(prefix=''):
+    """quantity * flower price, multiplied by the database"""
+    return models.ExpressionWrapper(
+        models.F(f'{prefix}quantity') * models.F(f'{prefix}flower__price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2))
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate `items_total` and prefetch items carrying `line_total`."""
+        return self.annotate(
+            items_total=models.Sum(line_total('items__'))
+        ).prefetch_related(
+            models.Prefetch('items', queryset=CartItem.objects.with_totals())
+        )
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.select_related('flower').only(
+            'id', 'cart', 'quantity', 'flower__id', 'flower__name', 'flower__price'
+        ).annotate(line_total=line_total())
+
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart of {self.user.first_name}"
     
@@ -17,11 +40,29 @@ class CartItem(models.Model):
     flower = models.ForeignKey(Flower, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['cart', 'flower']]
 
     def __str__(self):
         return f"{self.quantity} x {self.flower.name}"
+
+class StockHold(models.Model):
+    """A cart line's soft reservation of flower stock, see order.services.StockHoldService."""
+    item = models.OneToOneField(CartItem, on_delete=models.CASCADE, related_name='hold')
+    flower = models.ForeignKey(Flower, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['flower', 'expires_at'], name='stock_hold_flower_expiry_idx'),
+            models.Index(fields=['expires_at'], name='stock_hold_expires_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.flower_id} until {self.expires_at}"
     
 class Order(models.Model):
     NOT_PAID = 'Not Paid'
@@ -43,6 +84,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_at_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.first_name} - {self.status}"
     
@@ -54,4 +102,89 @@ class OrderItem(models.Model):
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
 
     def __str__(self):
-        return f"{self.quantity} x {self.flower.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.flower.name}"
+
+class PaymentNotification(models.Model):
+    """
+    Append-only inbox of gateway success callbacks, one row per
+    transaction id, applied in batches by order.services.PaymentNotificationService.
+    """
+    APPLIED = 'applied'
+    IGNORED = 'ignored'
+    MISSING = 'missing'
+    FAILED = 'failed'
+    OUTCOME_CHOICES = [
+        (APPLIED, 'Applied'),
+        (IGNORED, 'Ignored'),
+        (MISSING, 'Order missing'),
+        (FAILED, 'Failed'),
+    ]
+    tran_id = models.CharField(max_length=64, unique=True)
+    order_id = models.UUIDField(null=True)
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True),
+                         name='payment_notification_todo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tran_id} ({self.outcome or 'pending'})"
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a request sent with an Idempotency-Key header, see order.idempotency."""
+    # sha256 of (user, scope, header value), so the row stays fixed-size
+    key = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    # null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True)
+    body = models.TextField(blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # lease of the running request; a retry takes a pending key over once it passes
+    locked_until = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return self.key
+
+class DailyFlowerSales(models.Model):
+    """Paid sales per order day and flower, maintained by order.analytics."""
+    date = models.DateField()
+    flower = models.ForeignKey(Flower, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [['date', 'flower']]
+
+    def __str__(self):
+        return f"{self.date} {self.flower_id}: {self.quantity}"
+
+class DailyCategorySales(models.Model):
+    """Paid sales per order day and category, maintained by order.analytics."""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [['date', 'category']]
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}: {self.quantity}"
+
+class PurchasedFlower(models.Model):
+    """A flower the user has ordered, maintained by order.purchases."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchased_flowers')
+    flower = models.ForeignKey(Flower, on_delete=models.CASCADE, related_name='purchases')
+    # how many of the user's orders contain the flower; canceled ones included
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['user', 'flower']]
+
+    def __str__(self):
+        return f"{self.user_id} ordered {self.flower_id}"
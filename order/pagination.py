@@ -1,4 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+from api.pagination import KeysetPagination
 
-class CustomPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+class CustomPagination(KeysetPagination):
+    page_size = 10
+    keyset_orderings = {
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+    }
+    default_keyset_ordering = '-created_at'
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+SANDBOX_URL = 'https://sandbox.sslcommerz.com/gwprocess/v4/api.php'
+LIVE_URL = 'https://securepay.sslcommerz.com/gwprocess/v4/api.php'
+
+DEFAULTS = {
+    'URL': None,
+    'SANDBOX': False,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'POOL_SIZE': 20,
+    'FAILURE_THRESHOLD': 5,
+    'RECOVERY_TIMEOUT': 30,
+}
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or did not answer with JSON."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit is open; the gateway is not called at all."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call fails fast with GatewayUnavailable. Once `recovery_timeout`
+    seconds have passed one trial call is let through (half-open): success
+    closes the circuit, failure opens it for another period.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.trial or self.clock() - self.opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.trial or self.clock() - self.opened_at < self.recovery_timeout:
+                raise GatewayUnavailable('Payment gateway is unavailable, try again later')
+            self.trial = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial = False
+
+    def call(self, func, *args, **kwargs):
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except GatewayError:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+class SSLCommerzGateway:
+    """
+    SSLCommerz session API over one pooled keep-alive requests.Session.
+
+    Calls have connect and read timeouts and go through a CircuitBreaker,
+    so a slow or failing gateway costs a worker at most the timeout, and
+    nothing at all while the circuit is open. One instance is shared by
+    every request, see get_gateway().
+    """
+    def __init__(self, store_id, store_pass, url, connect_timeout, read_timeout, pool_size=20, breaker=None):
+        self.store_id = store_id
+        self.store_pass = store_pass
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def create_session(self, post_body):
+        """
+        Start a payment session and return the gateway's JSON answer.
+        Raises GatewayError on timeouts, connection errors and 5xx
+        responses, GatewayUnavailable while the circuit is open.
+        """
+        data = dict(post_body, store_id=self.store_id, store_passwd=self.store_pass)
+        return self.breaker.call(self.post, data)
+
+    async def acreate_session(self, post_body):
+        """create_session for async views; the blocking call runs in a worker thread."""
+        return await sync_to_async(self.create_session, thread_sensitive=False)(post_body)
+
+    def post(self, data):
+        try:
+            response = self.session.post(self.url, data=data, timeout=self.timeout)
+        except requests.RequestException as error:
+            raise GatewayError(f'Payment gateway request failed: {error}') from error
+        if response.status_code >= 500:
+            raise GatewayError(f'Payment gateway answered {response.status_code}')
+        try:
+            return response.json()
+        except ValueError as error:
+            raise GatewayError('Payment gateway answered with invalid JSON') from error
+
+    def close(self):
+        self.session.close()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway built from settings.PAYMENT_GATEWAY."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                options = {**DEFAULTS, **getattr(settings, 'PAYMENT_GATEWAY', {})}
+                _gateway = SSLCommerzGateway(
+                    store_id=settings.STORE_ID,
+                    store_pass=settings.STORE_PASS,
+                    url=options['URL'] or (SANDBOX_URL if options['SANDBOX'] else LIVE_URL),
+                    connect_timeout=options['CONNECT_TIMEOUT'],
+                    read_timeout=options['READ_TIMEOUT'],
+                    pool_size=options['POOL_SIZE'],
+                    breaker=CircuitBreaker(options['FAILURE_THRESHOLD'], options['RECOVERY_TIMEOUT']),
+                )
+    return _gateway
+
+
+def reset_gateway():
+    """Drop the shared gateway, e.g. after PAYMENT_GATEWAY changed in tests."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is not None:
+            _gateway.close()
+        _gateway = None
+
+
+def payment_session_body(user, order_id, amount, items_num):
+    """The SSLCommerz session fields for paying `order_id`, without credentials."""
+    return {
+        'total_amount': amount,
+        'currency': "BDT",
+        'tran_id': f"txn_{order_id}",
+        'success_url': f"{settings.BACKEND_URL}/api/v1/payment/success/",
+        'fail_url': f"{settings.BACKEND_URL}/api/v1/payment/fail/",
+        'cancel_url': f"{settings.BACKEND_URL}/api/v1/payment/cancel/",
+        'emi_option': 0,
+        'cus_name': f"{user.first_name} {user.last_name}",
+        'cus_email': user.email,
+        'cus_phone': user.phone_num,
+        'cus_add1': user.address,
+        'cus_city': "Dhaka",
+        'cus_country': "Bangladesh",
+        'shipping_method': "NO",
+        'multi_card_name': "",
+        'num_of_item': items_num,
+        'product_name': "E-commerce products",
+        'product_category': "General",
+        'product_profile': "general",
+    }
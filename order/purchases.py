@@ -0,0 +1,68 @@
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from order.models import OrderItem, PurchasedFlower
+
+
+def add(user_id, flower_ids):
+    """Count one more order of `user_id` for each flower, in one INSERT ... ON CONFLICT DO UPDATE."""
+    flower_ids = sorted(set(flower_ids))
+    if not flower_ids:
+        return
+    meta = PurchasedFlower._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    user, flower, orders = (quote(meta.get_field(name).column) for name in ('user', 'flower', 'orders'))
+    user_value = meta.get_field('user').get_db_prep_value(user_id, connection)
+    sql = (
+        f'INSERT INTO {table} ({user}, {flower}, {orders}) '
+        f'VALUES {", ".join(["(%s, %s, 1)"] * len(flower_ids))} '
+        f'ON CONFLICT ({user}, {flower}) DO UPDATE SET {orders} = {table}.{orders} + 1'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for flower_id in flower_ids for value in (user_value, flower_id)])
+
+
+def remove(user_id, flower_ids):
+    """Undo add(), dropping the flowers no other order of the user contains."""
+    purchases = PurchasedFlower.objects.filter(user_id=user_id, flower_id__in=set(flower_ids))
+    purchases.update(orders=F('orders') - 1)
+    purchases.filter(orders__lte=0).delete()
+
+
+def order_flower_ids(order):
+    return list(OrderItem.objects.filter(order=order).values_list('flower_id', flat=True).distinct())
+
+
+def purchases_of(user_id, flower_ids=None):
+    purchases = PurchasedFlower.objects.filter(user_id=user_id)
+    if flower_ids is not None:
+        purchases = purchases.filter(flower_id__in=flower_ids)
+    return purchases.values_list('flower_id', flat=True)
+
+
+def purchased_flower_ids(user_id, flower_ids=None):
+    """The ids among `flower_ids`, or all ids, of the flowers `user_id` has ordered."""
+    return set(purchases_of(user_id, flower_ids))
+
+
+async def apurchased_flower_ids(user_id, flower_ids=None):
+    return {flower_id async for flower_id in purchases_of(user_id, flower_ids)}
+
+
+def has_ordered_data(flower_ids, purchased):
+    """The has_ordered response body for a batch lookup, or for all flowers when `flower_ids` is None."""
+    if flower_ids is None:
+        return {"flower_ids": sorted(purchased)}
+    return {"has_ordered": {flower_id: flower_id in purchased for flower_id in sorted(flower_ids)}}
+
+
+def rebuild(batch_size=1000):
+    """Recompute the table from order items in one transaction, returning the row count."""
+    rows = OrderItem.objects.values('flower_id', user_id=F('order__user_id')).annotate(
+        orders=Count('order_id', distinct=True)).order_by()
+    with transaction.atomic():
+        PurchasedFlower.objects.all().delete()
+        created = PurchasedFlower.objects.bulk_create(
+            (PurchasedFlower(**row) for row in rows.iterator(chunk_size=batch_size)), batch_size=batch_size)
+    return len(created)
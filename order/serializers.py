@@ -1,8 +1,16 @@
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from django.core.exceptions import ValidationError as DjangoValidationError
 from order.models import Cart, CartItem, Order, OrderItem
 from flower.models import Flower
-from order.services import OrderService
+from order.services import CartService, OrderService, OutOfStock, StockHoldService
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from order.exceptions import OutOfStockError
 from users.models import User
+from api.fieldsets import SparseFieldsMixin
+from api.readers import ValuesReader, decimal_value, datetime_value
 
 class EmptySerializer(serializers.Serializer):
     pass
@@ -12,25 +20,41 @@ class SimpleFlowerSerializer(serializers.ModelSerializer):
         model = Flower
         fields = ['id', 'name', 'price']
 
+def hold_stock(cart_item):
+    try:
+        StockHoldService.hold(cart_item)
+    except OutOfStock as e:
+        raise OutOfStockError(e)
+
+def validate_cart(context):
+    """Raise NotFound unless the cart in `context` exists and belongs to the requesting user."""
+    user = context['request'].user
+    try:
+        owned = Cart.objects.filter(pk=context['cart_id'], user_id=user.id).exists()
+    except DjangoValidationError:
+        owned = False
+    if not owned:
+        raise NotFound("Cart not found.")
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     flower_id = serializers.IntegerField()
     class Meta:
         model = CartItem
         fields = ['id', 'flower_id', 'quantity']
 
+    def to_internal_value(self, data):
+        # before the fields, so nobody learns anything about other carts
+        validate_cart(self.context)
+        return super().to_internal_value(data)
+
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         flower_id = self.validated_data['flower_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, flower_id=flower_id)
-            cart_item.quantity += quantity
-            self.instance = cart_item.save()
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data)
+        with transaction.atomic():
+            [self.instance] = CartService.upsert_items(cart_id, {flower_id: quantity})
+            hold_stock(self.instance)
 
         return self.instance
 
@@ -40,11 +64,62 @@ class AddCartItemSerializer(serializers.ModelSerializer):
                 f"Product with id {value} does not exists")
         return value
     
+class CartItemLineSerializer(serializers.Serializer):
+    flower_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class BatchCartItemSerializer(serializers.Serializer):
+    ADD = 'add'
+    SET = 'set'
+    MAX_LINES = 100
+
+    items = CartItemLineSerializer(many=True)
+    mode = serializers.ChoiceField(
+        choices=[ADD, SET], default=ADD,
+        help_text="`add` increments existing lines, `set` replaces their quantity")
+
+    def to_internal_value(self, data):
+        # before the lines, so nobody learns anything about other carts
+        validate_cart(self.context)
+        return super().to_internal_value(data)
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("At least one item is required")
+        if len(items) > self.MAX_LINES:
+            raise serializers.ValidationError(f"At most {self.MAX_LINES} items per request")
+
+        quantities = {}
+        for item in items:
+            quantities[item['flower_id']] = quantities.get(item['flower_id'], 0) + item['quantity']
+        missing = set(quantities) - set(
+            Flower.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f"Product with id {', '.join(map(str, sorted(missing)))} does not exists")
+        return quantities
+
+    def save(self, **kwargs):
+        with transaction.atomic():
+            items = CartService.upsert_items(
+                self.context['cart_id'], self.validated_data['items'],
+                increment=self.validated_data['mode'] == self.ADD)
+            for item in sorted(items, key=lambda item: item.flower_id):
+                hold_stock(item)
+        self.instance = items
+        return items
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            hold_stock(instance)
+        return instance
+
 class CartItemSerializer(serializers.ModelSerializer):
     flower = SimpleFlowerSerializer()
     total_price = serializers.SerializerMethodField(method_name='get_total_price')
@@ -53,6 +128,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'flower', 'quantity', 'total_price']
 
     def get_total_price(self, cart_item: CartItem):
+        if hasattr(cart_item, 'line_total'):
+            return cart_item.line_total
         return cart_item.quantity * cart_item.flower.price
 
 class CartSerializer(serializers.ModelSerializer):
@@ -64,6 +141,9 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['user']
 
     def get_total_price(self, cart: Cart):
+        if hasattr(cart, 'items_total'):
+            # an empty cart has always rendered as the integer 0
+            return cart.items_total if cart.items_total is not None else 0
         return sum(
             [item.flower.price * item.quantity for item in cart.items.all()])
 
@@ -87,6 +167,8 @@ class CreateOrderSerializer(serializers.Serializer):
         try:
             order = OrderService.create_order(user_id=user_id, cart_id=cart_id)
             return order
+        except OutOfStock as e:
+            raise OutOfStockError(e)
         except ValueError as e:
             raise serializers.ValidationError(str(e))
 
@@ -104,15 +186,85 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status']
 
+class SalesAnalyticsQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=['day', 'flower', 'category'], default='day')
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end")
+        return attrs
+
+class HasOrderedQuerySerializer(serializers.Serializer):
+    flower_ids = serializers.CharField(required=False)
+
+    def validate_flower_ids(self, value):
+        try:
+            flower_ids = {int(flower_id) for flower_id in value.split(',') if flower_id.strip()}
+        except ValueError:
+            raise serializers.ValidationError("flower_ids must be comma separated integers")
+        if len(flower_ids) > 500:
+            raise serializers.ValidationError("At most 500 flower ids per request")
+        return flower_ids
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User  
         fields = ['id', 'username', 'email', 'address', 'phone_num']
 
     
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     items = OrderItemSerializer(many=True)
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
\ No newline at end of file
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
+
+class OrderListReader(ValuesReader):
+    """OrderSerializer output for list pages, built from values() rows"""
+    columns = ['id', 'user_id', 'status', 'total_price', 'created_at']
+    user_fields = UserSerializer.Meta.fields
+
+    def get_users(self, user_ids):
+        columns = [field.name for field in User._meta.concrete_fields if field.name in self.user_fields]
+        users = User.objects.filter(pk__in=user_ids).values(*columns)
+        # `username` is not a column on our User model and always renders null
+        return {user['id']: {field: user.get(field) for field in self.user_fields} for user in users}
+
+    def get_items(self, order_ids):
+        items = {}
+        rows = OrderItem.objects.filter(order_id__in=order_ids).order_by('pk').values(
+            'id', 'order_id', 'flower_id', 'flower__name', 'flower__price', 'price', 'quantity', 'total_price')
+        for item in rows:
+            items.setdefault(item['order_id'], []).append({
+                'id': item['id'],
+                'flower': {
+                    'id': item['flower_id'],
+                    'name': item['flower__name'],
+                    'price': decimal_value(item['flower__price']),
+                },
+                'price': decimal_value(item['price']),
+                'quantity': item['quantity'],
+                'total_price': decimal_value(item['total_price']),
+            })
+        return items
+
+    def to_representation(self, rows):
+        if not rows:
+            return []
+        users = self.get_users({row['user_id'] for row in rows})
+        items = self.get_items([row['id'] for row in rows])
+        return [
+            {
+                'id': str(row['id']),
+                'user': users[row['user_id']],
+                'status': row['status'],
+                'total_price': decimal_value(row['total_price']),
+                'created_at': datetime_value(row['created_at']),
+                'items': items.get(row['id'], []),
+            }
+            for row in rows
+        ]
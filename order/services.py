@@ -1,16 +1,199 @@
-from order.models import Cart, CartItem, OrderItem, Order
-from django.db import transaction
+from datetime import timedelta
+from uuid import UUID
+from order.models import Cart, CartItem, OrderItem, Order, PaymentNotification, StockHold, line_total
+from flower.models import Flower
+from api.cache import invalidate
+from order import analytics, purchases
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
+
+class OutOfStock(ValueError):
+    """Raised with one entry per order line the stock cannot cover."""
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__('Not enough stock for: ' + ', '.join(
+            f"{line['name']} (requested {line['requested']}, available {line['available']})"
+            for line in lines))
+
+
+class StockHoldService:
+    """
+    Optional soft reservations (CART_STOCK_HOLDS): every cart line holds
+    its quantity for CART_STOCK_HOLD_TTL seconds, and the stock other
+    customers can add or buy is `stock` minus the active holds.
+    """
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'CART_STOCK_HOLDS', False)
+
+    @staticmethod
+    def active():
+        return StockHold.objects.filter(expires_at__gt=timezone.now())
+
+    @staticmethod
+    def held_subquery(cart_id=None):
+        """Quantity held on the outer flower row by carts other than `cart_id`."""
+        holds = StockHoldService.active().filter(flower_id=OuterRef('pk'))
+        if cart_id is not None:
+            holds = holds.exclude(item__cart_id=cart_id)
+        total = holds.order_by().values('flower_id').annotate(total=Sum('quantity')).values('total')
+        return Coalesce(Subquery(total), 0)
+
+    @staticmethod
+    def hold(item):
+        """Create or refresh the hold of a cart item, or raise OutOfStock."""
+        if not StockHoldService.enabled():
+            return None
+        with transaction.atomic():
+            # serialises holds on this flower; the sum below is one range
+            # scan of stock_hold_flower_expiry_idx
+            name, stock = Flower.objects.select_for_update().values_list(
+                'name', 'stock').get(pk=item.flower_id)
+            held = StockHoldService.active().filter(flower_id=item.flower_id).exclude(
+                item=item).aggregate(total=Coalesce(Sum('quantity'), 0))['total']
+            if item.quantity > stock - held:
+                raise OutOfStock([{'flower_id': item.flower_id, 'name': name,
+                                   'requested': item.quantity, 'available': max(stock - held, 0)}])
+
+            hold, _ = StockHold.objects.update_or_create(item=item, defaults={
+                'flower_id': item.flower_id,
+                'quantity': item.quantity,
+                'expires_at': timezone.now() + timedelta(
+                    seconds=getattr(settings, 'CART_STOCK_HOLD_TTL', 15 * 60)),
+            })
+            return hold
+
+    @staticmethod
+    def release_expired(batch_size=1000):
+        """Delete expired holds in batches of `batch_size`, returning how many."""
+        released = 0
+        while True:
+            ids = list(StockHold.objects.filter(
+                expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return released
+            released += StockHold.objects.filter(pk__in=ids).delete()[0]
+
+
+class StockService:
+    @staticmethod
+    def reserve(quantities, cart_id=None):
+        """
+        Take {flower_id: quantity} out of stock inside the caller's
+        transaction, or raise OutOfStock naming every line that cannot be
+        covered. With stock holds enabled, stock held by carts other than
+        `cart_id` is not available.
+
+        Each line is one conditional `UPDATE ... WHERE stock >= n`, so a
+        flower row is locked only for the rest of the transaction, and
+        lines are applied in flower id order so concurrent orders sharing
+        flowers never deadlock.
+        """
+        holds = StockHoldService.enabled()
+        short = {}
+        for flower_id in sorted(quantities):
+            quantity = quantities[flower_id]
+            if holds:
+                enough = Q(stock__gte=Value(quantity) + StockHoldService.held_subquery(cart_id))
+            else:
+                enough = Q(stock__gte=quantity)
+            updated = Flower.objects.filter(enough, pk=flower_id).update(
+                stock=F('stock') - quantity)
+            if not updated:
+                short[flower_id] = quantity
+
+        if short:
+            flowers = Flower.objects.filter(pk__in=short)
+            if holds:
+                flowers = flowers.annotate(held=StockHoldService.held_subquery(cart_id))
+            else:
+                flowers = flowers.annotate(held=Value(0))
+            raise OutOfStock([
+                {'flower_id': flower['id'], 'name': flower['name'],
+                 'requested': short[flower['id']], 'available': max(flower['stock'] - flower['held'], 0)}
+                for flower in sorted(flowers.values('id', 'name', 'stock', 'held'),
+                                     key=lambda flower: flower['id'])
+            ])
+        StockService.changed(quantities)
+
+    @staticmethod
+    def release(quantities):
+        """Put {flower_id: quantity} back into stock."""
+        for flower_id in sorted(quantities):
+            Flower.objects.filter(pk=flower_id).update(stock=F('stock') + quantities[flower_id])
+        StockService.changed(quantities)
+
+    @staticmethod
+    def changed(flower_ids):
+        # update() skips the post_save signal that normally invalidates these
+        invalidate('flowers', *[f'flower:{flower_id}' for flower_id in flower_ids])
+
+    @staticmethod
+    def order_quantities(order):
+        rows = OrderItem.objects.filter(order=order).values('flower_id').annotate(
+            total=Sum('quantity')).order_by()
+        return {row['flower_id']: row['total'] for row in rows}
+
+
+class CartService:
+    @staticmethod
+    def upsert_items(cart_id, quantities, increment=True):
+        """
+        Add {flower_id: quantity} to a cart in one statement:
+
+            INSERT ... ON CONFLICT (cart_id, flower_id)
+            DO UPDATE SET quantity = quantity + EXCLUDED.quantity
+
+        so concurrent adds of the same line never lose an increment. With
+        `increment=False` existing lines are set to the new quantity
+        instead. Returns the affected CartItems with their stored quantity.
+        """
+        meta = CartItem._meta
+        quote = connection.ops.quote_name
+        table = quote(meta.db_table)
+        cart_field, flower_field = meta.get_field('cart'), meta.get_field('flower')
+        cart, flower = quote(cart_field.column), quote(flower_field.column)
+        quantity = quote(meta.get_field('quantity').column)
+
+        # sorted so concurrent batches lock rows in the same order
+        rows = sorted(quantities.items())
+        cart_value = cart_field.get_db_prep_value(cart_id, connection)
+        params = [value for flower_id, amount in rows for value in (cart_value, flower_id, amount)]
+        new_quantity = f'{table}.{quantity} + EXCLUDED.{quantity}' if increment else f'EXCLUDED.{quantity}'
+        sql = (
+            f'INSERT INTO {table} ({cart}, {flower}, {quantity}) '
+            f'VALUES {", ".join(["(%s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT ({cart}, {flower}) DO UPDATE SET {quantity} = {new_quantity} '
+            f'RETURNING {quote(meta.pk.column)}, {flower}, {quantity}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            returned = cursor.fetchall()
+        return [
+            CartItem(pk=pk, cart_id=cart_id, flower_id=flower_id, quantity=amount)
+            for pk, flower_id, amount in returned
+        ]
+
+
 class OrderService:
     @staticmethod
     def create_order(user_id, cart_id):
         with transaction.atomic():
             cart = Cart.objects.get(pk=cart_id)
-            cart_items = cart.items.select_related('flower').all()
+            # prices and line totals come from the database, no Flower rows
+            cart_items = list(cart.items.annotate(
+                price=F('flower__price'), line_total=line_total()
+            ).values('flower_id', 'quantity', 'price', 'line_total'))
 
-            total_price = sum([item.flower.price *
-                               item.quantity for item in cart_items])
+            StockService.reserve(
+                {item['flower_id']: item['quantity'] for item in cart_items}, cart_id=cart.pk)
+
+            total_price = sum([item['line_total'] for item in cart_items])
 
             order = Order.objects.create(
                 user_id=user_id, total_price=total_price)
@@ -18,25 +201,53 @@ class OrderService:
             order_items = [
                 OrderItem(
                     order=order,
-                    flower=item.flower,
-                    price=item.flower.price,
-                    quantity=item.quantity,
-                    total_price=item.flower.price * item.quantity
+                    flower_id=item['flower_id'],
+                    price=item['price'],
+                    quantity=item['quantity'],
+                    total_price=item['line_total']
                 )
                 for item in cart_items
             ]
             OrderItem.objects.bulk_create(order_items)
+            purchases.add(user_id, [item['flower_id'] for item in cart_items])
 
             cart.delete()
 
             return order
-        
+
+    @staticmethod
+    def set_status(order, status):
+        """
+        Move an order to `status`, restocking its items when it gets
+        canceled and reserving them again if it is revived, and keeping the
+        sales rollups in step. The order row is locked so concurrent
+        transitions apply each change at most once.
+        """
+        with transaction.atomic():
+            previous = Order.objects.select_for_update().values_list(
+                'status', flat=True).get(pk=order.pk)
+            if previous != status:
+                if status == Order.CANCELED:
+                    StockService.release(StockService.order_quantities(order))
+                elif previous == Order.CANCELED:
+                    StockService.reserve(StockService.order_quantities(order))
+                analytics.record_status_change(order, previous, status)
+                Order.objects.filter(pk=order.pk).update(status=status, updated_at=timezone.now())
+        order.status = status
+        return order
+
+    @staticmethod
+    def delete_order(order):
+        with transaction.atomic():
+            if analytics.is_sale(order.status):
+                analytics.apply_orders([order.pk], -1)
+            purchases.remove(order.user_id, purchases.order_flower_ids(order))
+            order.delete()
+
     @staticmethod
     def cancel_order(order, user):
         if user.is_staff:
-            order.status = Order.CANCELED
-            order.save()
-            return order
+            return OrderService.set_status(order, Order.CANCELED)
 
         if order.user != user:
             raise PermissionDenied(
@@ -45,6 +256,115 @@ class OrderService:
         if order.status == Order.DELIVERED:
             raise ValidationError({"detail": "You can not cancel an order"})
 
-        order.status = Order.CANCELED
-        order.save()
-        return order
\ No newline at end of file
+        return OrderService.set_status(order, Order.CANCELED)
+
+
+class PaymentNotificationService:
+    """
+    Gateway success callbacks are only recorded when they arrive; a worker
+    (`manage.py process_payment_notifications`) applies them in batches.
+    """
+    @staticmethod
+    def record(tran_id, payload):
+        """
+        Store a callback unless its transaction id was seen before. A
+        duplicate costs one INSERT ... ON CONFLICT DO NOTHING on the
+        unique tran_id index.
+        """
+        tran_id = str(tran_id)[:PaymentNotification._meta.get_field('tran_id').max_length]
+        PaymentNotification.objects.bulk_create([PaymentNotification(
+            tran_id=tran_id,
+            order_id=PaymentNotificationService.parse_order_id(tran_id),
+            # QueryDict.items() yields the last value of each field
+            payload={key: value for key, value in payload.items()},
+        )], ignore_conflicts=True)
+
+    @staticmethod
+    def parse_order_id(tran_id):
+        # tran_ids are built as txn_<order id> by order.payments
+        try:
+            return UUID(tran_id.split('_', 1)[1])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def mark_paid(order_ids):
+        """
+        Move the unpaid orders among `order_ids` to READY_TO_SHIP with one
+        conditional UPDATE ... RETURNING, returning the ids it changed.
+        """
+        if not order_ids:
+            return set()
+        meta = Order._meta
+        quote = connection.ops.quote_name
+        pk, status = meta.pk, meta.get_field('status')
+        updated_at = meta.get_field('updated_at')
+        ids = [pk.get_db_prep_value(order_id, connection) for order_id in sorted(order_ids)]
+        sql = (
+            f'UPDATE {quote(meta.db_table)} SET {quote(status.column)} = %s, {quote(updated_at.column)} = %s '
+            f'WHERE {quote(pk.column)} IN ({", ".join(["%s"] * len(ids))}) AND {quote(status.column)} = %s '
+            f'RETURNING {quote(pk.column)}'
+        )
+        params = [Order.READY_TO_SHIP, updated_at.get_db_prep_value(timezone.now(), connection), *ids, Order.NOT_PAID]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {pk.to_python(row[0]) for row in cursor.fetchall()}
+
+    @staticmethod
+    def process_batch(batch_size=500):
+        """
+        Apply up to `batch_size` pending notifications in one transaction and
+        return how many were handled. Rows are claimed with SKIP LOCKED, so
+        several workers can run side by side.
+
+        Unpaid orders are paid in bulk; canceled orders go through
+        OrderService.set_status, which reserves their stock again. Orders
+        already paid, shipped or delivered are left alone.
+        """
+        with transaction.atomic():
+            pending = PaymentNotification.objects.filter(processed_at__isnull=True).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            notifications = list(pending.values_list('id', 'order_id')[:batch_size])
+            if not notifications:
+                return 0
+
+            order_ids = {order_id for _, order_id in notifications if order_id is not None}
+            paid = PaymentNotificationService.mark_paid(order_ids)
+            if paid:
+                analytics.apply_orders(paid, 1)
+
+            outcomes = {}
+            existing = dict(Order.objects.filter(pk__in=order_ids - paid).values_list('pk', 'status'))
+            for order_id in order_ids - paid:
+                if order_id not in existing:
+                    outcomes[order_id] = PaymentNotification.MISSING
+                elif existing[order_id] != Order.CANCELED:
+                    outcomes[order_id] = PaymentNotification.IGNORED
+                else:
+                    try:
+                        with transaction.atomic():
+                            OrderService.set_status(Order(pk=order_id), Order.READY_TO_SHIP)
+                        outcomes[order_id] = PaymentNotification.APPLIED
+                    except OutOfStock:
+                        outcomes[order_id] = PaymentNotification.FAILED
+
+            by_outcome = {}
+            for notification_id, order_id in notifications:
+                outcome = PaymentNotification.APPLIED if order_id in paid else outcomes.get(
+                    order_id, PaymentNotification.MISSING)
+                by_outcome.setdefault(outcome, []).append(notification_id)
+            now = timezone.now()
+            for outcome, ids in by_outcome.items():
+                PaymentNotification.objects.filter(pk__in=ids).update(processed_at=now, outcome=outcome)
+            return len(notifications)
+
+    @staticmethod
+    def process_pending(batch_size=500):
+        """Apply batches until no notification is pending, returning how many were handled."""
+        processed = 0
+        while True:
+            handled = PaymentNotificationService.process_batch(batch_size)
+            if not handled:
+                return processed
+            processed += handled
@@ -1,3 +1,758 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+from http.server import ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from flower.models import Category, Flower
+from order.management.commands.run_fake_gateway import FakeGatewayHandler
+from order.models import (
+    Cart, CartItem, DailyCategorySales, DailyFlowerSales, IdempotencyKey, Order, OrderItem, PaymentNotification,
+    PurchasedFlower, StockHold)
+from order.exports import export_order_rows
+from order.payments import CircuitBreaker, GatewayError, GatewayUnavailable, SSLCommerzGateway
+from order import analytics, purchases
+from order.services import CartService, OrderService, OutOfStock, PaymentNotificationService, StockHoldService
+from users.models import User
+
+
+def make_cart(user, *lines):
+    cart = Cart.objects.create(user=user)
+    for flower, quantity in lines:
+        CartItem.objects.create(cart=cart, flower=flower, quantity=quantity)
+    return cart
+
+
+class OrderStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Roses')
+        self.rose = Flower.objects.create(
+            name='Red Rose', description='', price=10, stock=5, category=category)
+        self.tulip = Flower.objects.create(
+            name='Tulip', description='', price=4, stock=1, category=category)
+
+    def test_create_order_decrements_stock(self):
+        cart = make_cart(self.user, (self.rose, 3), (self.tulip, 1))
+        OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+
+        self.rose.refresh_from_db()
+        self.tulip.refresh_from_db()
+        self.assertEqual((self.rose.stock, self.tulip.stock), (2, 0))
+
+    def test_out_of_stock_names_lines_and_rolls_back(self):
+        cart = make_cart(self.user, (self.rose, 2), (self.tulip, 3))
+        with self.assertRaises(OutOfStock) as raised:
+            OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+
+        self.assertEqual(raised.exception.lines, [
+            {'flower_id': self.tulip.id, 'name': 'Tulip', 'requested': 3, 'available': 1}])
+        self.assertIn('Tulip', str(raised.exception))
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=cart.id).exists())
+
+    def test_cancel_restocks_once(self):
+        cart = make_cart(self.user, (self.rose, 4))
+        order = OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+
+        OrderService.cancel_order(order, self.user)
+        OrderService.cancel_order(order, self.user)
+
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.stock, 5)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.CANCELED)
+
+
+@override_settings(CART_STOCK_HOLDS=True, CART_STOCK_HOLD_TTL=600)
+class StockHoldTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Roses')
+        self.rose = Flower.objects.create(name='Rose', description='', price=10, stock=5, category=category)
+        self.buyer, self.other = [
+            User.objects.create_user(email=f'{name}@example.com', password='pass12345')
+            for name in ('buyer', 'other')
+        ]
+
+    def hold(self, user, quantity):
+        cart = Cart.objects.filter(user=user).first() or Cart.objects.create(user=user)
+        item, _ = CartItem.objects.update_or_create(cart=cart, flower=self.rose, defaults={'quantity': quantity})
+        return StockHoldService.hold(item)
+
+    def test_other_carts_holds_exhaust_stock(self):
+        self.hold(self.other, 4)
+        with self.assertRaises(OutOfStock) as raised:
+            self.hold(self.buyer, 2)
+        self.assertEqual(raised.exception.lines[0]['available'], 1)
+        self.assertIsNotNone(self.hold(self.buyer, 1))
+        # raising one's own hold only counts the other carts
+        self.assertEqual(self.hold(self.other, 4).quantity, 4)
+
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        response = client.patch(
+            f'/api/v1/carts/{self.buyer.cart.id}/items/{self.buyer.cart.items.get().id}/', {'quantity': 3})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['out_of_stock'][0]['available'], 1)
+
+    def test_expired_holds_do_not_count(self):
+        self.hold(self.other, 5)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.hold(self.buyer, 5).quantity, 5)
+
+        self.assertEqual(StockHoldService.release_expired(batch_size=1), 1)
+        self.assertEqual(list(StockHold.objects.values_list('item__cart__user', flat=True)), [self.buyer.id])
+
+    def test_reserve_ignores_the_buyers_own_holds(self):
+        self.hold(self.buyer, 3)
+        self.hold(self.other, 2)
+        order = OrderService.create_order(user_id=self.buyer.id, cart_id=self.buyer.cart.id)
+        self.rose.refresh_from_db()
+        self.assertEqual((order.total_price, self.rose.stock), (30, 2))
+
+        # 2 left, all held by the other cart
+        cart = make_cart(self.buyer, (self.rose, 1))
+        with self.assertRaises(OutOfStock) as raised:
+            OrderService.create_order(user_id=self.buyer.id, cart_id=cart.id)
+        self.assertEqual(raised.exception.lines[0]['available'], 0)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Roses')
+        self.rose, self.tulip = [
+            Flower.objects.create(name=name, description='', price=10, stock=10, category=category)
+            for name in ('Rose', 'Tulip')
+        ]
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, cart_id, items, mode='add'):
+        return self.client.post(f'/api/v1/carts/{cart_id}/items/batch/', {'items': items, 'mode': mode}, format='json')
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('flower_id', 'quantity'))
+
+    def test_add_increments_and_set_replaces(self):
+        response = self.batch(self.cart.id, [
+            {'flower_id': self.rose.id, 'quantity': 2}, {'flower_id': self.rose.id, 'quantity': 1}])
+        self.assertEqual([(row['flower']['id'], row['quantity']) for row in response.json()], [(self.rose.id, 3)])
+
+        self.batch(self.cart.id, [{'flower_id': self.rose.id, 'quantity': 2}, {'flower_id': self.tulip.id, 'quantity': 1}])
+        self.assertEqual(self.quantities(), {self.rose.id: 5, self.tulip.id: 1})
+
+        response = self.batch(self.cart.id, [{'flower_id': self.rose.id, 'quantity': 1}], mode='set')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.rose.id: 1, self.tulip.id: 1})
+
+    def test_unknown_foreign_or_malformed_carts(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        foreign = Cart.objects.create(user=other)
+        line = [{'flower_id': self.rose.id, 'quantity': 1}]
+        for cart_id in [foreign.id, '00000000-0000-0000-0000-000000000000', 'not-a-uuid']:
+            self.assertEqual(self.batch(cart_id, line).status_code, 404, cart_id)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.batch(self.cart.id, [{'flower_id': 0, 'quantity': 1}]).status_code, 400)
+
+    def test_single_add_checks_the_cart(self):
+        other = User.objects.create_user(email='other@example.com', password='pass12345')
+        foreign = Cart.objects.create(user=other)
+        for cart_id in [foreign.id, '00000000-0000-0000-0000-000000000000', 'not-a-uuid']:
+            response = self.client.post(
+                f'/api/v1/carts/{cart_id}/items/', {'flower_id': self.rose.id, 'quantity': 1}, format='json')
+            self.assertEqual(response.status_code, 404, cart_id)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(StockHold.objects.exists())
+
+        response = self.client.post(
+            f'/api/v1/carts/{self.cart.id}/items/', {'flower_id': self.rose.id, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.quantities(), {self.rose.id: 2})
+
+
+class TotalsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Roses')
+        self.flowers = [
+            Flower.objects.create(name=f'Rose {index}', description='', price=price, stock=100, category=category)
+            for index, price in enumerate(['10.25', '3.10', '0.99', '149.95'])
+        ]
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_database_totals_match_python(self):
+        cart = make_cart(self.user, *zip(self.flowers, [3, 7, 11, 2]))
+        expected = sum(item.flower.price * item.quantity for item in cart.items.select_related('flower'))
+
+        annotated = Cart.objects.with_totals().get(pk=cart.pk)
+        self.assertEqual(annotated.items_total, expected)
+        for item in annotated.items.all():
+            self.assertEqual(item.line_total, item.flower.price * item.quantity)
+
+        # cart, items; line totals need no flower queries of their own
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/v1/carts/{cart.id}/').json()
+        self.assertEqual(Decimal(str(response['total_price'])), expected)
+        self.assertEqual(
+            sorted(Decimal(str(item['total_price'])) for item in response['items']),
+            sorted(item.flower.price * item.quantity for item in cart.items.select_related('flower')))
+
+        order = OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+        self.assertEqual(order.total_price, expected)
+        self.assertEqual(sum(item.total_price for item in order.items.all()), expected)
+
+    def test_empty_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        self.assertEqual(self.client.get(f'/api/v1/carts/{cart.id}/').json()['total_price'], 0)
+
+
+class HasOrderedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Roses')
+        self.rose, self.tulip, self.lily = [
+            Flower.objects.create(name=name, description='', price=10, stock=10, category=category)
+            for name in ('Rose', 'Tulip', 'Lily')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *flowers):
+        cart = make_cart(self.user, *[(flower, 1) for flower in flowers])
+        return OrderService.create_order(user_id=self.user.id, cart_id=cart.id)
+
+    def has_ordered(self, *flowers):
+        ids = ','.join(str(flower.id) for flower in flowers)
+        return self.client.get('/api/v1/orders/has_ordered/', {'flower_ids': ids}).json()['has_ordered']
+
+    def test_batch_lookup(self):
+        first = self.order(self.rose, self.tulip)
+        self.order(self.rose)
+        OrderService.cancel_order(first, self.user)
+
+        with self.assertNumQueries(1):
+            answer = self.has_ordered(self.rose, self.tulip, self.lily)
+        self.assertEqual(answer, {str(self.rose.id): True, str(self.tulip.id): True, str(self.lily.id): False})
+        everything = self.client.get('/api/v1/orders/has_ordered/').json()
+        self.assertEqual(everything, {'flower_ids': sorted([self.rose.id, self.tulip.id])})
+        single = self.client.get(f'/api/v1/orders/has_ordered/{self.tulip.id}/').json()
+        self.assertEqual(single, {'has_ordered': True})
+
+    def test_deleting_orders_removes_purchases(self):
+        first = self.order(self.rose, self.tulip)
+        second = self.order(self.rose)
+        OrderService.delete_order(first)
+        self.assertEqual(self.has_ordered(self.rose, self.tulip), {str(self.rose.id): True, str(self.tulip.id): False})
+        OrderService.delete_order(second)
+        self.assertFalse(PurchasedFlower.objects.exists())
+
+    def test_admin_deletes_remove_purchases(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='pass12345')
+        self.client.force_login(admin)
+        first = self.order(self.rose, self.tulip)
+        second = self.order(self.rose)
+        third = self.order(self.lily)
+        OrderService.set_status(second, Order.READY_TO_SHIP)
+
+        response = self.client.post(f'/admin/order/order/{first.id}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.has_ordered(self.rose, self.tulip), {str(self.rose.id): True, str(self.tulip.id): False})
+
+        response = self.client.post('/admin/order/order/', {
+            'action': 'delete_selected', '_selected_action': [second.id, third.id], 'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(PurchasedFlower.objects.exists())
+        self.assertFalse(DailyFlowerSales.objects.exclude(quantity=0).exists())
+
+    def test_rebuild(self):
+        self.order(self.rose, self.tulip)
+        self.order(self.rose)
+        PurchasedFlower.objects.all().delete()
+        self.assertEqual(purchases.rebuild(), 2)
+        self.assertEqual(dict(PurchasedFlower.objects.values_list('flower_id', 'orders')),
+                         {self.rose.id: 2, self.tulip.id: 1})
+
+    def test_invalid_ids(self):
+        response = self.client.get('/api/v1/orders/has_ordered/', {'flower_ids': '1,x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StaffOrderListTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Roses')
+        self.flowers = [
+            Flower.objects.create(name=f'Rose {index}', description='', price=10, stock=100, category=category)
+            for index in range(3)
+        ]
+        self.staff = User.objects.create_user(email='staff@example.com', password='pass12345', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def create_orders(self, count, status=Order.NOT_PAID):
+        for _ in range(count):
+            user = User.objects.create_user(
+                email=f'buyer{User.objects.count()}@example.com', password='pass12345')
+            order = Order.objects.create(user=user, total_price=30, status=status)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, flower=flower, price=10, quantity=1, total_price=10)
+                for flower in self.flowers
+            ])
+
+    def assert_constant_queries(self, url, queries):
+        self.create_orders(2)
+        with self.assertNumQueries(queries):
+            small = self.client.get(url)
+        self.create_orders(8)
+        with self.assertNumQueries(queries):
+            full = self.client.get(url)
+        self.assertEqual(len(small.json()['results']), 2)
+        self.assertEqual(len(full.json()['results']), 10)
+
+    def test_list_query_count_is_constant(self):
+        # count, page, users, items with flowers
+        self.assert_constant_queries('/api/v1/orders/', 4)
+
+    def test_sparse_list_query_count_is_constant(self):
+        # count, page joined to users, items joined to flowers
+        self.assert_constant_queries('/api/v1/orders/?fields=id,user,items', 3)
+
+    def test_reader_matches_the_serializer(self):
+        self.create_orders(3)
+        for url in ['/api/v1/orders/', '/api/v1/orders/?pagination=cursor']:
+            fast = self.client.get(url).content
+            with override_settings(FAST_LIST_SERIALIZERS=False):
+                self.assertEqual(self.client.get(url).content, fast, url)
+
+    def test_filters(self):
+        self.create_orders(2)
+        self.create_orders(1, status=Order.SHIPPED)
+        shipped = self.client.get('/api/v1/orders/', {'status': Order.SHIPPED}).json()
+        self.assertEqual(shipped['count'], 1)
+        both = self.client.get('/api/v1/orders/', {'status__in': f'{Order.SHIPPED},{Order.NOT_PAID}'}).json()
+        self.assertEqual(both['count'], 3)
+        user = Order.objects.filter(status=Order.SHIPPED).get().user_id
+        self.assertEqual(self.client.get('/api/v1/orders/', {'user_id': user}).json()['count'], 1)
+        self.assertEqual(self.client.get('/api/v1/orders/', {'created_after': '2000-01-01'}).json()['count'], 3)
+        self.assertEqual(self.client.get('/api/v1/orders/', {'created_before': '2000-01-01'}).json()['count'], 0)
+
+    def test_export_covers_every_filtered_item(self):
+        self.create_orders(4)
+        self.create_orders(3, status=Order.SHIPPED)
+        empty = Order.objects.create(user=self.staff, total_price=0, status=Order.NOT_PAID)
+        # one shared timestamp, so every chunk boundary falls on the id tie-break
+        Order.objects.update(created_at=timezone.now())
+        expected = {
+            (str(order_id), str(item_id))
+            for order_id, item_id in OrderItem.objects.filter(order__status=Order.NOT_PAID).values_list('order_id', 'id')
+        } | {(str(empty.id), '')}
+
+        for chunk_size in (1, 2, 1000):
+            rows = list(export_order_rows(Order.objects.filter(status=Order.NOT_PAID), chunk_size=chunk_size))
+            keys = [(str(row[0]), '' if row[6] is None else str(row[6])) for row in rows]
+            self.assertEqual(len(keys), len(expected), chunk_size)
+            self.assertEqual(set(keys), expected, chunk_size)
+
+        with mock.patch('order.views.export_order_rows', partial(export_order_rows, chunk_size=2)):
+            csv_response = self.client.get('/api/v1/orders/export/', {'type': 'csv', 'status': Order.NOT_PAID})
+            ndjson_response = self.client.get('/api/v1/orders/export/', {'type': 'ndjson', 'status': Order.NOT_PAID})
+
+        lines = b''.join(csv_response.streaming_content).decode().splitlines()
+        records = list(csv.DictReader(lines))
+        self.assertEqual(len(records), len(expected))
+        self.assertEqual({(record['order_id'], record['item_id']) for record in records}, expected)
+
+        lines = b''.join(ndjson_response.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), len(expected))
+        self.assertEqual(
+            {(record['order_id'], '' if record['item_id'] is None else str(record['item_id'])) for record in records},
+            expected)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        roses, tulips = Category.objects.create(name='Roses'), Category.objects.create(name='Tulips')
+        self.rose = Flower.objects.create(name='Red Rose', description='', price=10, stock=50, category=roses)
+        self.white = Flower.objects.create(name='White Rose', description='', price=7, stock=50, category=roses)
+        self.tulip = Flower.objects.create(name='Tulip', description='', price=4, stock=50, category=tulips)
+
+    def order(self, days_ago, *lines):
+        order = OrderService.create_order(user_id=self.user.id, cart_id=make_cart(self.user, *lines).id)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        return order
+
+    def expected(self):
+        flowers, categories = {}, {}
+        items = OrderItem.objects.filter(order__status__in=analytics.SALE_STATUSES).select_related('order', 'flower')
+        for item in items:
+            date = timezone.localtime(item.order.created_at).date()
+            for totals, key in ((flowers, (date, item.flower_id)), (categories, (date, item.flower.category_id))):
+                quantity, revenue = totals.get(key, (0, Decimal('0')))
+                totals[key] = (quantity + item.quantity, revenue + item.total_price)
+        return flowers, categories
+
+    def rollups(self):
+        return tuple(
+            {(row.date, getattr(row, key)): (row.quantity, row.revenue) for row in model.objects.exclude(quantity=0)}
+            for model, key in ((DailyFlowerSales, 'flower_id'), (DailyCategorySales, 'category_id')))
+
+    def assertRollupsMatch(self):
+        self.assertEqual(self.rollups(), self.expected())
+
+    def test_rollups_follow_order_changes_and_rebuild(self):
+        old = self.order(3, (self.rose, 2), (self.tulip, 1))
+        same_day = self.order(3, (self.white, 4))
+        recent = self.order(1, (self.rose, 1), (self.white, 1), (self.tulip, 5))
+        unpaid = self.order(0, (self.tulip, 3))
+        self.assertRollupsMatch()
+        self.assertFalse(DailyFlowerSales.objects.exists())
+
+        PaymentNotificationService.record(f'txn_{old.id}', {})
+        PaymentNotificationService.process_pending()
+        OrderService.set_status(same_day, Order.READY_TO_SHIP)
+        OrderService.set_status(recent, Order.SHIPPED)
+        self.assertRollupsMatch()
+        self.assertEqual(DailyCategorySales.objects.get(
+            date=timezone.localtime(old.created_at).date(), category=self.rose.category).quantity, 6)
+
+        OrderService.cancel_order(recent, self.user)
+        OrderService.cancel_order(unpaid, self.user)
+        self.assertRollupsMatch()
+
+        OrderService.set_status(recent, Order.READY_TO_SHIP)
+        OrderService.set_status(unpaid, Order.NOT_PAID)
+        self.assertRollupsMatch()
+
+        # drift the tables, including a row for a day without orders
+        DailyFlowerSales.objects.filter(flower=self.rose).delete()
+        DailyCategorySales.objects.update(quantity=99)
+        DailyFlowerSales.objects.create(
+            date=timezone.localdate() - timedelta(days=10), flower=self.tulip, quantity=1, revenue=4)
+        self.assertEqual(analytics.rebuild(batch_size=1), 3)
+        self.assertRollupsMatch()
+
+        DailyFlowerSales.objects.filter(date=timezone.localtime(recent.created_at).date()).delete()
+        self.assertEqual(analytics.rebuild(since=timezone.localdate() - timedelta(days=2)), 1)
+        self.assertRollupsMatch()
+
+    def test_day_ranges_cover_every_day(self):
+        for days_ago in (5, 5, 4, 2, 0):
+            self.order(days_ago, (self.rose, 1))
+        today = timezone.localdate()
+        self.assertEqual(list(analytics.day_ranges(None, 2)), [
+            (None, today - timedelta(days=5)),
+            (today - timedelta(days=4), today - timedelta(days=1)),
+            (today, None),
+        ])
+        self.assertEqual(list(analytics.day_ranges(today - timedelta(days=3), 10)), [(today - timedelta(days=3), None)])
+
+
+class PaymentNotificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Roses')
+        self.rose = Flower.objects.create(
+            name='Red Rose', description='', price=10, stock=5, category=category)
+        self.client = APIClient()
+
+    def order(self, quantity=1):
+        return OrderService.create_order(user_id=self.user.id, cart_id=make_cart(self.user, (self.rose, quantity)).id)
+
+    def callback(self, tran_id):
+        return self.client.post('/api/v1/payment/success/', {'tran_id': tran_id})
+
+    def test_duplicate_callbacks_apply_once(self):
+        order = self.order()
+        for _ in range(3):
+            self.assertEqual(self.callback(f'txn_{order.id}').status_code, 302)
+        self.assertEqual(PaymentNotification.objects.count(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.NOT_PAID)
+
+        self.assertEqual(PaymentNotificationService.process_pending(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.READY_TO_SHIP)
+        self.assertEqual(PaymentNotification.objects.get().outcome, PaymentNotification.APPLIED)
+        self.assertEqual(PaymentNotificationService.process_pending(), 0)
+
+    def test_unknown_and_shipped_orders(self):
+        shipped = self.order()
+        OrderService.set_status(shipped, Order.SHIPPED)
+        canceled = self.order(2)
+        OrderService.cancel_order(canceled, self.user)
+        for tran_id in (f'txn_{shipped.id}', f'txn_{canceled.id}', 'txn_00000000-0000-0000-0000-000000000000', 'bogus'):
+            self.assertEqual(self.callback(tran_id).status_code, 302)
+
+        self.assertEqual(PaymentNotificationService.process_pending(batch_size=2), 4)
+        outcomes = dict(PaymentNotification.objects.values_list('tran_id', 'outcome'))
+        self.assertEqual(outcomes, {
+            f'txn_{shipped.id}': PaymentNotification.IGNORED,
+            f'txn_{canceled.id}': PaymentNotification.APPLIED,
+            'txn_00000000-0000-0000-0000-000000000000': PaymentNotification.MISSING,
+            'bogus': PaymentNotification.MISSING,
+        })
+        shipped.refresh_from_db()
+        canceled.refresh_from_db()
+        self.assertEqual((shipped.status, canceled.status), (Order.SHIPPED, Order.READY_TO_SHIP))
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.stock, 2)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        category = Category.objects.create(name='Roses')
+        self.rose = Flower.objects.create(name='Red Rose', description='', price=10, stock=5, category=category)
+        self.cart = make_cart(self.user, (self.rose, 2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, key, cart_id=None):
+        return self.client.post(
+            '/api/v1/orders/', {'cart_id': str(cart_id or self.cart.id)}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_duplicate_retry_replays(self):
+        first = self.create('order-1')
+        retry = self.create('order-1')
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.stock, 3)
+
+    def test_fingerprint_mismatch(self):
+        self.create('order-1')
+        other = make_cart(self.user, (self.rose, 1))
+        response = self.create('order-1', cart_id=other.id)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(Cart.objects.filter(pk=other.id).exists())
+
+    def test_failures_are_not_stored(self):
+        gateway = mock.Mock()
+        gateway.create_session.side_effect = [
+            {'status': 'FAILED'}, {'status': 'SUCCESS', 'GatewayPageURL': 'https://pay.example.com/1'}]
+        body = {'amount': '20.00', 'orderId': 'abc', 'itemsNum': 2}
+
+        with mock.patch('order.views.get_gateway', return_value=gateway):
+            failed = self.client.post('/api/v1/payment/initiate/', body, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+            self.assertEqual(failed.status_code, 400)
+            self.assertFalse(IdempotencyKey.objects.exists())
+
+            retry = self.client.post('/api/v1/payment/initiate/', body, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(retry.json(), {'payment_url': 'https://pay.example.com/1'})
+        self.assertEqual(gateway.create_session.call_count, 2)
+
+    def test_gateway_call_runs_outside_a_transaction(self):
+        outer = len(connection.atomic_blocks)
+        depths = []
+
+        def create_session(body):
+            depths.append(len(connection.atomic_blocks))
+            self.assertEqual(IdempotencyKey.objects.get().status_code, None)
+            return {'status': 'SUCCESS', 'GatewayPageURL': 'https://pay.example.com/1'}
+
+        gateway = mock.Mock(create_session=mock.Mock(side_effect=create_session))
+        with mock.patch('order.views.get_gateway', return_value=gateway):
+            response = self.client.post('/api/v1/payment/initiate/', {'amount': '20.00'}, format='json',
+                                        HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(response.status_code, 200)
+        # the test case's own transactions only
+        self.assertEqual(depths, [outer])
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_pending_keys(self):
+        self.create('order-1')
+        # a request still running under the key
+        IdempotencyKey.objects.update(status_code=None, body='', locked_until=timezone.now() + timedelta(minutes=1))
+        response = self.create('order-1')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        # its lease ran out, so the retry takes the key over
+        IdempotencyKey.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        response = self.create('order-1', cart_id=make_cart(self.user, (self.rose, 1)).id)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    def start_gateway(self, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGatewayHandler)
+        server.options = {'delay': 0, 'fail_rate': 0, 'error_rate': 0, 'verbosity': 0, **options}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address[:2]
+        gateway = SSLCommerzGateway(
+            'store', 'secret', f'http://{host}:{port}/gwprocess/v4/api.php',
+            connect_timeout=1, read_timeout=0.2, breaker=CircuitBreaker(failure_threshold=2))
+        self.addCleanup(gateway.close)
+        return gateway
+
+    def test_create_session(self):
+        response = self.start_gateway().create_session({'tran_id': 'txn_7'})
+        self.assertEqual(response['status'], 'SUCCESS')
+        self.assertEqual(response['tran_id'], 'txn_7')
+
+    def test_breaker_opens_after_failures(self):
+        gateway = self.start_gateway(error_rate=1)
+        for _ in range(2):
+            with self.assertRaises(GatewayError):
+                gateway.create_session({})
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(GatewayUnavailable):
+            gateway.create_session({})
+
+    def test_slow_gateway_times_out(self):
+        with self.assertRaises(GatewayError):
+            self.start_gateway(delay=0.5).create_session({})
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_half_open_trial(self):
+        now = [0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+
+        now[0] = 10
+        breaker.before_call()
+        # only one trial call while half-open
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class OrderStockConcurrencyTests(TransactionTestCase):
+    buyers = 20
+    stock = 7
+
+    def test_concurrent_orders_never_oversell(self):
+        category = Category.objects.create(name='Roses')
+        flower = Flower.objects.create(
+            name='Red Rose', description='', price=10, stock=self.stock, category=category)
+        carts = []
+        for index in range(self.buyers):
+            user = User.objects.create_user(email=f'buyer{index}@example.com', password='pass12345')
+            carts.append((user.id, make_cart(user, (flower, 1)).id))
+
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy(user_id, cart_id):
+            try:
+                barrier.wait()
+                OrderService.create_order(user_id=user_id, cart_id=cart_id)
+                results.append('ok')
+            except OutOfStock:
+                results.append('out')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=cart) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        flower.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('out'), self.buyers - self.stock)
+        self.assertEqual(flower.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(flower=flower).count(), self.stock)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CartBatchConcurrencyTests(TransactionTestCase):
+    clients = 10
+
+    def test_concurrent_adds_never_lose_an_increment(self):
+        category = Category.objects.create(name='Roses')
+        flower = Flower.objects.create(name='Red Rose', description='', price=10, stock=100, category=category)
+        user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        cart = Cart.objects.create(user=user)
+        barrier = threading.Barrier(self.clients)
+
+        def add():
+            try:
+                barrier.wait()
+                CartService.upsert_items(cart.id, {flower.id: 2})
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(CartItem.objects.get(cart=cart, flower=flower).quantity, 2 * self.clients)
+
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_retry_waits_and_replays(self):
+        category = Category.objects.create(name='Roses')
+        flower = Flower.objects.create(name='Red Rose', description='', price=10, stock=5, category=category)
+        user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        cart = make_cart(user, (flower, 2))
+        barrier = threading.Barrier(2)
+        responses = []
+        create_order = OrderService.create_order
+
+        def slow_create_order(**kwargs):
+            # keep the key pending long enough for the retry to wait on it
+            time.sleep(0.5)
+            return create_order(**kwargs)
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                responses.append(client.post(
+                    '/api/v1/orders/', {'cart_id': str(cart.id)}, format='json', HTTP_IDEMPOTENCY_KEY='order-1'))
+            finally:
+                connection.close()
+
+        with mock.patch.object(OrderService, 'create_order', side_effect=slow_create_order):
+            threads = [threading.Thread(target=post) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(sorted(response.get('Idempotent-Replayed', '') for response in responses), ['', 'true'])
+        self.assertEqual(responses[0].json(), responses[1].json())
+        self.assertEqual(Order.objects.count(), 1)
+        flower.refresh_from_db()
+        self.assertEqual(flower.stock, 3)
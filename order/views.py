@@ -2,18 +2,30 @@ from django.shortcuts import render
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from order.models import Cart, CartItem, Order, OrderItem
-from order.serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderSerializer, EmptySerializer
+from order.filters import OrderFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Prefetch
+from order.serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, BatchCartItemSerializer, UpdateCartItemSerializer, OrderSerializer, OrderListReader, CreateOrderSerializer, SalesAnalyticsQuerySerializer, HasOrderedQuerySerializer, UpdateOrderSerializer, EmptySerializer
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from order.services import OrderService
+from order.services import OrderService, OutOfStock, PaymentNotificationService
+from order.exceptions import OutOfStockError, PaymentGatewayError
+from order.payments import GatewayError, get_gateway, payment_session_body
+from order.idempotency import idempotent
+from order.analytics import sales_report
+from order.purchases import has_ordered_data, purchased_flower_ids
+from order.exports import ORDER_EXPORT_FIELDS, export_order_rows
+from api.streaming import STREAM_WRITERS, CONTENT_TYPES, streaming_content
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from sslcommerz_lib import SSLCOMMERZ 
 from django.conf import settings as main_settings
 from django.shortcuts import HttpResponseRedirect
 from rest_framework.views import APIView
 from order.pagination import CustomPagination
+from api.fieldsets import SparseFieldsetViewMixin
+from api.readers import ValuesReaderListMixin
 
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     """
@@ -28,10 +40,10 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Cart.objects.none()
-        return Cart.objects.prefetch_related('items__flower').filter(user=self.request.user)
+        return Cart.objects.with_totals().filter(user=self.request.user)
     
     def create(self, request, *args, **kwargs):
-        existing_cart = Cart.objects.prefetch_related('items__flower').filter(user=request.user).first()
+        existing_cart = Cart.objects.with_totals().filter(user=request.user).first()
 
         if existing_cart:
             serializer = self.get_serializer(existing_cart)
@@ -40,10 +52,23 @@ class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, Gener
 
 
 class CartItemViewSet(ModelViewSet):
+    """
+    - POST `batch/` adds or updates many lines in one statement
+    """
     http_method_names = ['get', 'post', 'patch', 'delete']
     serializer_class = CartItemSerializer
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request, cart_pk=None):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        items = self.get_queryset().filter(pk__in=[item.pk for item in items]).order_by('pk')
+        return Response(CartItemSerializer(items, many=True).data, status=status.HTTP_200_OK)
+
     def get_serializer_class(self):
+        if self.action == 'batch':
+            return BatchCartItemSerializer
         if self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -51,18 +76,62 @@ class CartItemViewSet(ModelViewSet):
         return CartItemSerializer
     
     def get_serializer_context(self):
-        return {'cart_id':self.kwargs.get('cart_pk')}
+        return {'cart_id':self.kwargs.get('cart_pk'), 'request': self.request}
 
     def get_queryset(self):
-        return CartItem.objects.select_related('flower').filter(cart_id=self.kwargs.get('cart_pk'))
+        return CartItem.objects.with_totals().filter(cart_id=self.kwargs.get('cart_pk'))
     
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(ValuesReaderListMixin, SparseFieldsetViewMixin, ModelViewSet):
     """
     - Only authenticated user can create order
+    - Retries sending the same `Idempotency-Key` header replay the first result
+    - Filter by `status`, `status__in`, `user_id`, `created_after` and `created_before`
+    - A page costs the same number of queries whatever its size
+    - Admin can stream the filtered orders from `export/?type=csv|ndjson`
+    - `has_ordered/?flower_ids=1,2,3` tells which flowers the user has ordered in one request
+    - Support sparse fieldsets, e.g. `?fields=id,status,total_price,created_at`
     """
     http_method_names = ['get', 'post', 'delete', 'patch', 'head', 'options']
 
     pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
+    values_reader_class = OrderListReader
+    sparse_fieldset_always = ['id', 'user', 'created_at']
+    sparse_fieldset_relations = {
+        'user': lambda queryset: queryset.select_related('user'),
+        'items': lambda queryset: queryset.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('flower'))),
+    }
+
+    @idempotent('orders.create')
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered orders, one row per item, as CSV (default) or NDJSON"""
+        file_type = request.query_params.get('type', 'csv')
+        if file_type not in STREAM_WRITERS:
+            return Response({"type": "Use csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = self.filter_queryset(Order.objects.all())
+        response = StreamingHttpResponse(
+            streaming_content(request, STREAM_WRITERS[file_type](ORDER_EXPORT_FIELDS, export_order_rows(orders))),
+            content_type=CONTENT_TYPES[file_type])
+        response['Content-Disposition'] = f'attachment; filename="orders.{file_type}"'
+        return response
+
+    def perform_destroy(self, instance):
+        OrderService.delete_order(instance)
+
+    @action(detail=False, methods=['get'])
+    def has_ordered(self, request):
+        """Which of `?flower_ids=1,2,3` the user has ordered, or every flower they have ordered"""
+        serializer = HasOrderedQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        flower_ids = serializer.validated_data.get('flower_ids')
+        return Response(has_ordered_data(flower_ids, purchased_flower_ids(request.user.id, flower_ids)))
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -76,11 +145,14 @@ class OrderViewSet(ModelViewSet):
         serializer = UpdateOrderSerializer(
             order, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            OrderService.set_status(order, serializer.validated_data['status'])
+        except OutOfStock as e:
+            raise OutOfStockError(e)
         return Response({'status': f'Order status updated to {request.data['status']}'})
 
     def get_permissions(self):
-        if self.action in ['update_status', 'destroy']:
+        if self.action in ['update_status', 'destroy', 'export']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
@@ -96,48 +168,29 @@ class OrderViewSet(ModelViewSet):
     def get_serializer_context(self):
         if getattr(self, 'swagger_fake_view', False):
             return super().get_serializer_context()
-        return {'user_id':self.request.user.id, 'user': self.request.user}
+        return {'user_id':self.request.user.id, 'user': self.request.user, 'request': self.request}
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Order.objects.prefetch_related('items__flower').all()
+            return self.apply_sparse_fieldset(Order.objects.all())
         if getattr(self, 'swagger_fake_view', False):
             return Order.objects.none()
-        return Order.objects.prefetch_related('items__flower').filter(user=self.request.user)
+        return self.apply_sparse_fieldset(Order.objects.filter(user=self.request.user))
 
 @api_view(['POST'])
+@idempotent('payments.initiate')
 def initiate_payment(request):
     user = request.user
     amount = request.data.get("amount")
     order_id = request.data.get("orderId")
     items_num = request.data.get("itemsNum")
 
-    settings = { 'store_id': main_settings.STORE_ID, 'store_pass': main_settings.STORE_PASS, 'issandbox': False }
-    sslcz = SSLCOMMERZ(settings)
-    post_body = {}
-    post_body['total_amount'] = amount
-    post_body['currency'] = "BDT"
-    post_body['tran_id'] = f"txn_{order_id}"
-    post_body['success_url'] = f"{main_settings.BACKEND_URL}/api/v1/payment/success/"
-    post_body['fail_url'] = f"{main_settings.BACKEND_URL}/api/v1/payment/fail/"
-    post_body['cancel_url'] = f"{main_settings.BACKEND_URL}/api/v1/payment/cancel/"
-    post_body['emi_option'] = 0
-    post_body['cus_name'] = f"{user.first_name} {user.last_name}"
-    post_body['cus_email'] = user.email
-    post_body['cus_phone'] = user.phone_num
-    post_body['cus_add1'] = user.address
-    post_body['cus_city'] = "Dhaka"
-    post_body['cus_country'] = "Bangladesh"
-    post_body['shipping_method'] = "NO"
-    post_body['multi_card_name'] = ""
-    post_body['num_of_item'] = items_num
-    post_body['product_name'] = "E-commerce products"
-    post_body['product_category'] = "General"
-    post_body['product_profile'] = "general"
-
-
-    response = sslcz.createSession(post_body)
-    
+    try:
+        response = get_gateway().create_session(
+            payment_session_body(user, order_id, amount, items_num))
+    except GatewayError as error:
+        raise PaymentGatewayError() from error
+
     if response.get('status') == 'SUCCESS':
         return Response({"payment_url" : response['GatewayPageURL']})
     
@@ -145,10 +198,10 @@ def initiate_payment(request):
 
 @api_view(['POST'])
 def payment_success(request):
-    order_id = request.data.get("tran_id").split("_")[1]
-    order = Order.objects.get(id=order_id)
-    order.status = "Ready to ship"
-    order.save()
+    # recorded only; process_payment_notifications applies it to the order
+    tran_id = request.data.get("tran_id")
+    if tran_id:
+        PaymentNotificationService.record(tran_id, request.data)
     return HttpResponseRedirect(f"{main_settings.FRONTEND_URL}/dashboard/orders/")
 
 @api_view(['POST'])
@@ -164,6 +217,31 @@ class HasOrderedProduct(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, flower_id):
-        user = request.user
-        has_ordered = OrderItem.objects.filter(order__user = user, flower_id=flower_id).exists()
-        return Response({"has_ordered":has_ordered})
\ No newline at end of file
+        has_ordered = flower_id in purchased_flower_ids(request.user.id, [flower_id])
+        return Response({"has_ordered":has_ordered})
+
+
+class SalesAnalyticsView(APIView):
+    """
+    - Only admin can view sales analytics
+    - Quantity and revenue of paid orders between `start` and `end`
+      (default: the last 30 days), grouped by `day`, `flower` or `category`
+    - Answered from the daily rollup tables, never from raw order items
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = SalesAnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        results = sales_report(params['start'], params['end'], params['group_by'])
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'group_by': params['group_by'],
+            'totals': {
+                'quantity': sum(row['quantity'] for row in results),
+                'revenue': sum(row['revenue'] for row in results),
+            },
+            'results': results,
+        })
@@ -2,6 +2,12 @@
 ASGI config for phul_bazar project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with several uvicorn workers, e.g.
+
+    uvicorn phul_bazar.asgi:application --workers 4 --lifespan off
+
+The async read endpoints under /api/v1/async/ only pay off here; sync views
+still work, each one running in a thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +18,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'phul_bazar.settings')
+# settings drop sync-only middleware under ASGI
+os.environ.setdefault('DJANGO_ASGI', 'True')
 
 application = get_asgi_application()
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'drf_yasg',
     'django_filters',
     "corsheaders",
@@ -56,6 +57,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# WhiteNoise is sync-only and would push every async view back onto a
+# thread, so under ASGI /static/ is served by the proxy instead
+if config('DJANGO_ASGI', default=False, cast=bool):
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = 'phul_bazar.urls'
 
 TEMPLATES = [
@@ -171,13 +177,56 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
+# Serve flower/order list pages from values() rows instead of ModelSerializer
+FAST_LIST_SERIALIZERS = config('FAST_LIST_SERIALIZERS', default=True, cast=bool)
+
+RESPONSE_CACHE = {
+    'BACKEND': config('RESPONSE_CACHE_BACKEND', default='api.cache.LocalResponseCacheBackend'),
+    'TTL': config('RESPONSE_CACHE_TTL', default=60, cast=int),
+    'MAX_BYTES': config('RESPONSE_CACHE_MAX_BYTES', default=32 * 1024 * 1024, cast=int),
+}
+
+FLOWER_IMAGE_VARIANT_STORAGE = config(
+    'FLOWER_IMAGE_VARIANT_STORAGE', default='flower.imaging.LocalVariantStorage')
+FLOWER_IMAGE_VARIANT_WORKERS = config('FLOWER_IMAGE_VARIANT_WORKERS', default=2, cast=int)
+FLOWER_UPLOAD_DIR = config('FLOWER_UPLOAD_DIR', default=str(BASE_DIR / 'uploads'))
+
+# Soft-reserve stock for cart lines, see order.services.StockHoldService
+CART_STOCK_HOLDS = config('CART_STOCK_HOLDS', default=False, cast=bool)
+CART_STOCK_HOLD_TTL = config('CART_STOCK_HOLD_TTL', default=15 * 60, cast=int)
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+# how long a request may hold its key before a retry takes it over, and how long a retry waits for it
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)
+IDEMPOTENCY_WAIT = config('IDEMPOTENCY_WAIT', default=20, cast=int)
+
+# Background jobs, see api.jobs
+JOBS = {
+    'WORKER_THREADS': config('JOB_WORKER_THREADS', default=4, cast=int),
+    'MAX_ATTEMPTS': config('JOB_MAX_ATTEMPTS', default=5, cast=int),
+    'RETRY_BACKOFF': config('JOB_RETRY_BACKOFF', default=30, cast=int),
+    'RETRY_BACKOFF_MAX': config('JOB_RETRY_BACKOFF_MAX', default=60 * 60, cast=int),
+    'LOCK_TIMEOUT': config('JOB_LOCK_TIMEOUT', default=10 * 60, cast=int),
+}
+
 SIMPLE_JWT = {
    'AUTH_HEADER_TYPES': ('JWT',),
    'ACCESS_TOKEN_LIFETIME':timedelta(days=5),
+   'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
+}
+
+# Users resolved from JWTs are cached in-process, see users.authentication
+JWT_USER_CACHE = {
+    'MAX_SIZE': config('JWT_USER_CACHE_SIZE', default=10000, cast=int),
+    'TTL': config('JWT_USER_CACHE_TTL', default=60, cast=int),
+    'REVOCATION_REFRESH': config('JWT_REVOCATION_REFRESH', default=5, cast=int),
 }
 
 DJOSER = {
@@ -192,6 +241,15 @@ DJOSER = {
         'current_user':'users.serializers.UserSerializer',
         'user': 'users.serializers.UserSerializer'
     },
+    # rendered in the request, sent by `manage.py run_jobs`
+    'EMAIL': {
+        'activation': 'users.email.ActivationEmail',
+        'confirmation': 'users.email.ConfirmationEmail',
+        'password_reset': 'users.email.PasswordResetEmail',
+        'password_changed_confirmation': 'users.email.PasswordChangedConfirmationEmail',
+        'username_changed_confirmation': 'users.email.UsernameChangedConfirmationEmail',
+        'username_reset': 'users.email.UsernameResetEmail',
+    },
 }
 
 SWAGGER_SETTINGS = {
@@ -216,4 +274,15 @@ BACKEND_URL = config("BACKEND_URL")
 FRONTEND_URL = config("FRONTEND_URL")
 
 STORE_ID = config("STORE_ID")
-STORE_PASS = config("STORE_PASS")
\ No newline at end of file
+STORE_PASS = config("STORE_PASS")
+
+# See order.payments; point PAYMENT_GATEWAY_URL at `manage.py run_fake_gateway` to test offline
+PAYMENT_GATEWAY = {
+    'URL': config('PAYMENT_GATEWAY_URL', default=None),
+    'SANDBOX': config('PAYMENT_GATEWAY_SANDBOX', default=False, cast=bool),
+    'CONNECT_TIMEOUT': config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('PAYMENT_GATEWAY_READ_TIMEOUT', default=10, cast=float),
+    'POOL_SIZE': config('PAYMENT_GATEWAY_POOL_SIZE', default=20, cast=int),
+    'FAILURE_THRESHOLD': config('PAYMENT_GATEWAY_FAILURE_THRESHOLD', default=5, cast=int),
+    'RECOVERY_TIMEOUT': config('PAYMENT_GATEWAY_RECOVERY_TIMEOUT', default=30, cast=float),
+}
\ No newline at end of file
@@ -0,0 +1,181 @@
+import copy
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from api.cache import LRUCache
+from users.models import RevokedToken, UserCacheEviction
+
+
+def cache_setting(name, default):
+    return getattr(settings, 'JWT_USER_CACHE', {}).get(name, default)
+
+
+user_cache = LRUCache(max_size=cache_setting('MAX_SIZE', 10000), ttl=cache_setting('TTL', 60))
+
+
+class RevocationSet:
+    """
+    In-process copy of the RevokedToken table, so every request checks
+    revocation with two dict lookups instead of a query.
+
+    Rows revoked in other processes are picked up at most `refresh_interval`
+    seconds later, by one indexed query on revoked_at. Revocations made in
+    this process apply immediately. The same refresh drops cached users
+    evicted elsewhere (UserCacheEviction), e.g. after a privilege change.
+    """
+    # rows committed late still fall inside the next refresh window
+    overlap = timedelta(seconds=60)
+
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.jtis = {}
+        self.users = {}
+        self.loaded_at = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def is_revoked(self, token):
+        self.maybe_refresh()
+        return self.contains(token)
+
+    async def ais_revoked(self, token):
+        # the refresh query runs in a thread at most every refresh_interval
+        if self.refresh_due():
+            await sync_to_async(self.maybe_refresh)()
+        return self.contains(token)
+
+    def contains(self, token):
+        if token.get(api_settings.JTI_CLAIM) in self.jtis:
+            return True
+        revoked_at = self.users.get(token.get(api_settings.USER_ID_CLAIM))
+        return revoked_at is not None and token.get('iat', 0) <= revoked_at[0]
+
+    def refresh_due(self):
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.refresh_interval
+
+    def maybe_refresh(self):
+        if not self.refresh_due():
+            return
+        with self.lock:
+            if not self.refresh_due():
+                return
+            self.refresh()
+            self.checked_at = time.monotonic()
+
+    def refresh(self):
+        now = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=now)
+        if self.loaded_at is not None:
+            rows = rows.filter(revoked_at__gte=self.loaded_at - self.overlap)
+        for row in rows.values('jti', 'user_id', 'revoked_at', 'expires_at'):
+            self.add(row['jti'], row['user_id'], row['revoked_at'], row['expires_at'])
+        # nothing is cached before the first load, so only later evictions matter
+        if self.loaded_at is not None:
+            evicted = UserCacheEviction.objects.filter(evicted_at__gte=self.loaded_at - self.overlap)
+            for user_id in evicted.values_list('user_id', flat=True):
+                user_cache.delete(user_id)
+        self.loaded_at = now
+        self.prune(now)
+
+    def add(self, jti, user_id, revoked_at, expires_at):
+        if jti is not None:
+            self.jtis[jti] = expires_at
+        if user_id is not None:
+            current = self.users.get(user_id)
+            if current is None or current[0] < revoked_at.timestamp():
+                self.users[user_id] = (revoked_at.timestamp(), expires_at)
+            user_cache.delete(user_id)
+
+    def prune(self, now):
+        self.jtis = {jti: expires_at for jti, expires_at in self.jtis.items() if expires_at > now}
+        self.users = {user_id: entry for user_id, entry in self.users.items() if entry[1] > now}
+
+    def clear(self):
+        with self.lock:
+            self.jtis, self.users = {}, {}
+            self.loaded_at = self.checked_at = None
+
+
+revocations = RevocationSet(refresh_interval=cache_setting('REVOCATION_REFRESH', 5))
+
+
+def token_expiry(token):
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+def revoke_token(token):
+    """Reject `token` (an access or refresh token) from now on."""
+    revoked_at = timezone.now()
+    RevokedToken.objects.get_or_create(jti=token[api_settings.JTI_CLAIM], defaults={
+        'revoked_at': revoked_at, 'expires_at': token_expiry(token)})
+    revocations.add(token[api_settings.JTI_CLAIM], None, revoked_at, token_expiry(token))
+
+
+def revoke_user(user_id):
+    """Reject every token issued to `user_id` so far, e.g. on a ban."""
+    revoked_at = timezone.now()
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    RevokedToken.objects.create(user_id=user_id, revoked_at=revoked_at, expires_at=revoked_at + lifetime)
+    revocations.add(None, user_id, revoked_at, revoked_at + lifetime)
+
+
+def evict_user(user_id):
+    """Drop the cached copy of `user_id` here now and in every other process on its next refresh."""
+    UserCacheEviction.objects.update_or_create(user_id=user_id, defaults={'evicted_at': timezone.now()})
+    user_cache.delete(user_id)
+
+
+def purge_expired():
+    """Delete revocations whose tokens have all expired, returning how many."""
+    return RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that checks the revocation set and resolves users
+    from a bounded in-process LRU cache (JWT_USER_CACHE), so a request
+    with a valid token costs no query.
+
+    Cached users are dropped when the User is saved or deleted here, and
+    everywhere once a revocation or eviction for them is loaded, which
+    covers deactivation and changes to is_staff or is_superuser; other
+    changes made in another process show up after at most TTL seconds.
+    """
+    def get_user(self, validated_token):
+        if revocations.is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        # a copy, so one request changing request.user never leaks into another
+        return copy.copy(user)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; only cache misses leave the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if await revocations.ais_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            user_cache.set(user_id, user)
+        return copy.copy(user), validated_token
@@ -0,0 +1,39 @@
+from djoser import email
+
+from api.jobs import queue_email
+
+
+class QueuedEmailMixin:
+    """Render the email in the request, then leave sending to the job worker."""
+    def send(self, to, fail_silently=False, **kwargs):
+        self.render()
+        self.to = to
+        self.cc = kwargs.pop("cc", [])
+        self.bcc = kwargs.pop("bcc", [])
+        self.reply_to = kwargs.pop("reply_to", [])
+        self.from_email = kwargs.pop("from_email", None)
+        queue_email(self)
+
+
+class ActivationEmail(QueuedEmailMixin, email.ActivationEmail):
+    pass
+
+
+class ConfirmationEmail(QueuedEmailMixin, email.ConfirmationEmail):
+    pass
+
+
+class PasswordResetEmail(QueuedEmailMixin, email.PasswordResetEmail):
+    pass
+
+
+class PasswordChangedConfirmationEmail(QueuedEmailMixin, email.PasswordChangedConfirmationEmail):
+    pass
+
+
+class UsernameChangedConfirmationEmail(QueuedEmailMixin, email.UsernameChangedConfirmationEmail):
+    pass
+
+
+class UsernameResetEmail(QueuedEmailMixin, email.UsernameResetEmail):
+    pass
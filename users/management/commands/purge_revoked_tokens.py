@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.authentication import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete token revocations whose tokens have expired; run it periodically from cron'
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired token revocations'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCacheEviction',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('evicted_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
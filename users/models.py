@@ -22,3 +22,28 @@ class Contact(models.Model):
     phone_number = models.CharField(max_length=11)
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT (`jti`) or, with `user` set, every token of that user
+    issued up to `revoked_at`. Read by users.authentication.
+    """
+    jti = models.CharField(max_length=255, unique=True, null=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='+')
+    revoked_at = models.DateTimeField(db_index=True)
+    # once every token it covers has expired the row can go, see purge_revoked_tokens
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti or f"tokens of {self.user_id}"
+
+class UserCacheEviction(models.Model):
+    """
+    The last time `user` changed in a way every process must see before its
+    cached copy expires, e.g. is_staff. Read by users.authentication.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    evicted_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"user {self.user_id} at {self.evicted_at}"
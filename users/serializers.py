@@ -1,6 +1,11 @@
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer, UserSerializer as BaseUserSerializer
 from users.models import Contact
+from users.authentication import revocations, revoke_token
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 
 class UserCreateSerializer(BaseUserCreateSerializer):
     class Meta(BaseUserCreateSerializer.Meta):
@@ -26,3 +31,26 @@ class ContactSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Phone number must be exactly 11 digits.")
         return number
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Refuses refresh tokens revoked by logout or by deactivating the user."""
+    def validate(self, attrs):
+        if revocations.is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken("Token has been revoked")
+        return super().validate(attrs)
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            refresh = RefreshToken(value)
+        except TokenError as error:
+            raise serializers.ValidationError(str(error))
+        if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(self.context['request'].user.pk):
+            raise serializers.ValidationError("Token belongs to another user")
+        return refresh
+
+    def save(self, access_token):
+        revoke_token(access_token)
+        if 'refresh' in self.validated_data:
+            revoke_token(self.validated_data['refresh'])
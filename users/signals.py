@@ -0,0 +1,38 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from users.authentication import evict_user, revoke_user, user_cache
+from users.models import User
+
+
+# fields every process must stop trusting from its user cache as soon as they change
+PRIVILEGE_FIELDS = ['is_staff', 'is_superuser']
+
+
+def privileges(instance):
+    # read from __dict__ so users loaded with only() do not query for them
+    return {name: instance.__dict__.get(name) for name in PRIVILEGE_FIELDS}
+
+
+@receiver(post_init, sender=User)
+def remember_access(sender, instance, **kwargs):
+    instance._was_active = instance.__dict__.get('is_active')
+    instance._had_privileges = privileges(instance)
+
+
+@receiver([post_save, post_delete], sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    user_cache.delete(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def revoke_deactivated_user(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and instance._was_active and not instance.is_active:
+        revoke_user(instance.pk)
+    instance._was_active = instance.is_active
+
+
+@receiver(post_save, sender=User)
+def evict_changed_privileges(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and instance._had_privileges != privileges(instance):
+        evict_user(instance.pk)
+    instance._had_privileges = privileges(instance)
@@ -1,3 +1,63 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from users.authentication import revocations, user_cache
+from users.models import RevokedToken, User, UserCacheEviction
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        revocations.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='pass12345')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {self.refresh.access_token}')
+
+    def me(self):
+        return self.client.get('/api/v1/auth/users/me/')
+
+    def test_user_is_cached(self):
+        self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().json()['email'], 'buyer@example.com')
+
+        User.objects.filter(pk=self.user.pk).get().save()
+        with self.assertNumQueries(1):
+            self.me()
+
+    def test_logout_revokes_tokens(self):
+        response = self.client.post('/api/v1/auth/logout/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me().status_code, 401)
+        refreshed = APIClient().post('/api/v1/auth/jwt/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(refreshed.status_code, 401)
+
+    def test_deactivation_revokes_tokens_in_other_processes(self):
+        self.assertEqual(self.me().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertTrue(RevokedToken.objects.filter(user=self.user).exists())
+
+        # another process only sees the table, and still has the user active
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        revocations.clear()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_privilege_changes_evict_in_other_processes(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/orders/export/').status_code, 200)
+        stale = user_cache.get(self.user.pk)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_staff = False
+        user.save()
+        self.assertTrue(UserCacheEviction.objects.filter(user=self.user).exists())
+
+        # another process still has the staff copy cached until its next refresh
+        user_cache.set(self.user.pk, stale)
+        revocations.checked_at = None
+        self.assertEqual(self.client.get('/api/v1/orders/export/').status_code, 403)
+        self.assertEqual(self.me().status_code, 200)
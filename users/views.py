@@ -1,11 +1,13 @@
 from rest_framework.viewsets import ModelViewSet
-from users.serializers import ContactSerializer
+from users.serializers import ContactSerializer, LogoutSerializer
 from users.models import Contact
 from rest_framework import status
-from django.core.mail import send_mail
+from api.jobs import queue_mail
 from django.conf import settings
 from rest_framework.response import Response
 from users.pagination import CustomPagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 
 
 class ContactViewSet(ModelViewSet):
@@ -23,21 +25,32 @@ class ContactViewSet(ModelViewSet):
             user_email = serializer.data['email']
             user_msg = serializer.data['comment']
 
-            send_mail(
+            queue_mail(
                 subject='Welcome to Our Phul Bazar!',
                 message='Thank you for reaching out! We will get back to you shortly.',
                 from_email=settings.EMAIL_HOST_USER,
                 recipient_list=[user_email],
-                fail_silently=False,
             )
 
-            send_mail(
+            queue_mail(
                 subject="Customer send message",
                 message=f"{user_email} send you message\n\n{user_msg}",
                 from_email=user_email,
                 recipient_list=[settings.EMAIL_HOST_USER],
-                fail_silently=False,
             )
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class LogoutView(APIView):
+    """
+    - Revokes the access token of the request, and the `refresh` token
+      when one is posted, for every server process
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save(access_token=request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)